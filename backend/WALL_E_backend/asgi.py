@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'WALL_E_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importés après l'initialisation de Django (modèles et réglages requis)
+from simulation.scheduler import lifespan_application  # noqa: E402
+from simulation.streaming import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # HTTP -> Django ; WebSocket -> diffusion des trames de simulation (/ws/simulations/<id>/) ;
+    # lifespan -> démarrage / arrêt du planificateur des simulations
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -79,6 +79,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'WALL_E_backend.wsgi.application'
+ASGI_APPLICATION = 'WALL_E_backend.asgi.application'
 
 
 # Database
@@ -88,6 +89,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL : les lectures ne bloquent plus les écritures de progression des simulations
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -140,5 +146,71 @@ REST_FRAMEWORK = {
         'DEFAULT_RENDERER_CLASSES': [
             'rest_framework.renderers.JSONRenderer',
             'rest_framework.renderers.BrowsableAPIRenderer',
+            # Encodage binaire compact de l'état (Accept: application/x-walle-state)
+            'simulation.renderers.BinaryStateRenderer',
         ]
 }
+
+# Stockage de la grille du moteur : 'list' (grille de chaînes), 'numpy' (couches uint8/bool) ou 'chunked'
+SIMULATION_STORAGE = os.environ.get('SIMULATION_STORAGE', 'list')
+
+# Taille de grille et nombre de robots maximaux acceptés à la création d'une simulation
+SIMULATION_MAX_GRID_SIZE = int(os.environ.get('SIMULATION_MAX_GRID_SIZE', 4096))
+SIMULATION_MAX_ROBOTS = int(os.environ.get('SIMULATION_MAX_ROBOTS', 1000))
+
+# Nombre maximal de cases (ou de blocs agrégés) renvoyées en JSON : fenêtres de state (bbox/downsample) et
+# réponses en grille complète (state, step, advance, coverage, distance_field), refusées au-delà
+SIMULATION_MAX_VIEWPORT_CELLS = int(os.environ.get('SIMULATION_MAX_VIEWPORT_CELLS', 1 << 20))
+
+# À partir de cette taille de grille, le moteur utilise le monde par blocs creux ('chunked')
+SIMULATION_CHUNKED_FROM = int(os.environ.get('SIMULATION_CHUNKED_FROM', 256))
+
+# Mode de pas : 'sequential' (robot par robot), 'batch' (vectorisé, nécessite le stockage numpy) ou 'cooperative'
+# (planification coopérative avec réservations espace-temps, meilleur débit quand la base est encombrée)
+SIMULATION_STEP_MODE = os.environ.get('SIMULATION_STEP_MODE', 'sequential')
+
+# Instrumentation des tours (temps par phase, compteurs A*) activée pour chaque nouveau moteur
+SIMULATION_PROFILING = os.environ.get('SIMULATION_PROFILING', '0') == '1'
+
+# Registre des moteurs en mémoire (un par simulation) : éviction LRU, TTL d'inactivité et budget mémoire
+SIMULATION_REGISTRY = {
+    'MAX_ENGINES': int(os.environ.get('SIMULATION_MAX_ENGINES', 64)),
+    'IDLE_TTL': float(os.environ.get('SIMULATION_IDLE_TTL', 1800)),
+    'MEMORY_BUDGET': int(os.environ.get('SIMULATION_MEMORY_BUDGET', 512 * 1024 * 1024)),
+}
+
+# Fréquence par défaut (tours par seconde) de la diffusion WebSocket des simulations
+SIMULATION_STREAM_TICK_RATE = float(os.environ.get('SIMULATION_STREAM_TICK_RATE', 10))
+
+# Écriture de la progression (tours, état) en base : au premier tour, à la fin et tous les N tours. Le snapshot
+# du moteur est, lui, enregistré à chaque tour (tout worker peut reprendre la simulation)
+SIMULATION_FLUSH_EVERY = int(os.environ.get('SIMULATION_FLUSH_EVERY', 20))
+
+# Stockage partagé des snapshots des moteurs (plusieurs workers) : 'database', 'file' (PATH), 'redis' (URL) ou
+# 'memory' (aucune persistance, un seul processus). 'local' (clé-valeur en mémoire du processus) sert aux tests
+SIMULATION_STATE_STORE = {
+    'BACKEND': os.environ.get('SIMULATION_STATE_STORE', 'database'),
+    'PATH': os.environ.get('SIMULATION_STATE_PATH', os.path.join(BASE_DIR, 'simulation_states')),
+    'URL': os.environ.get('SIMULATION_STATE_URL', 'redis://localhost:6379/0'),
+}
+
+# Planificateur des simulations en tâche de fond (resume / pause / speed) : dans la boucle du serveur ASGI
+# (IN_PROCESS, un seul processus serveur) ou dans des processus dédiés (manage.py run_scheduler, IN_PROCESS=0)
+SIMULATION_SCHEDULER = {
+    'IN_PROCESS': os.environ.get('SIMULATION_SCHEDULER_IN_PROCESS', '1') == '1',
+    'WORKERS': int(os.environ.get('SIMULATION_SCHEDULER_WORKERS', 4)),
+    'POLL_INTERVAL': float(os.environ.get('SIMULATION_SCHEDULER_POLL_INTERVAL', 1.0)),
+    'MAX_TICK_RATE': float(os.environ.get('SIMULATION_SCHEDULER_MAX_TICK_RATE', 1000)),
+    # Tranche de ce processus (identifiant modulo SHARDS) : avec plusieurs processus ASGI, chacun reçoit un SHARD
+    # distinct ; seule la tranche d'une simulation la fait avancer pour ses spectateurs WebSocket
+    'SHARD': int(os.environ.get('SIMULATION_SCHEDULER_SHARD', 0)),
+    'SHARDS': int(os.environ.get('SIMULATION_SCHEDULER_SHARDS', 1)),
+}
+
+# Enregistrement des parties : journal binaire par simulation (images complètes toutes les KEYFRAME_EVERY trames),
+# relu par /api/simulations/<id>/frames/?from=&to=
+SIMULATION_REPLAY = {
+    'ENABLED': os.environ.get('SIMULATION_REPLAY', '0') == '1',
+    'PATH': os.environ.get('SIMULATION_REPLAY_PATH', os.path.join(BASE_DIR, 'simulation_replays')),
+    'KEYFRAME_EVERY': int(os.environ.get('SIMULATION_REPLAY_KEYFRAME_EVERY', 128)),
+}
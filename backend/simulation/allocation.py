@@ -0,0 +1,63 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+Position = Tuple[int, int]
+
+
+class TrashAllocator:
+    # Attribution centralisée des déchets : au plus un robot par déchet, au plus un déchet par robot.
+    # Les réservations vivent jusqu'au ramassage (événement), pas de recalcul global à chaque tour
+
+    def __init__(self):
+        self.target_of: Dict[int, Position] = {}
+        self.claimant_of: Dict[Position, int] = {}
+        # Robots qui ont vu chaque déchet (pour les prévenir au ramassage sans parcourir toute la flotte)
+        self.watchers: Dict[Position, Set[int]] = {}
+        self.assignments = 0
+
+    def __len__(self) -> int:
+        return len(self.target_of)
+
+    def target(self, robot_id: int) -> Optional[Position]:
+        return self.target_of.get(robot_id)
+
+    def claim(self, robot_id: int, position: Position):
+        self.release_robot(robot_id)
+        self.target_of[robot_id] = position
+        self.claimant_of[position] = robot_id
+        self.assignments += 1
+
+    def release_robot(self, robot_id: int):
+        position = self.target_of.pop(robot_id, None)
+        if position is not None:
+            del self.claimant_of[position]
+
+    def observe(self, robot_id: int, positions: Iterable[Position]):
+        for position in positions:
+            self.watchers.setdefault(position, set()).add(robot_id)
+
+    def release_trash(self, position: Position) -> Set[int]:
+        # Déchet ramassé : libère son éventuel réservataire et renvoie les robots qui le connaissaient
+        claimant = self.claimant_of.pop(position, None)
+        if claimant is not None:
+            del self.target_of[claimant]
+        return self.watchers.pop(position, set())
+
+    def assign(self, candidates: Iterable[Tuple[int, int, int, Sequence[Position]]]) -> int:
+        # Appariement glouton par distance : toutes les paires (robot libre, déchet visible non réservé)
+        # sont triées par distance de Manhattan (puis id du robot, puis position) et acceptées dans l'ordre.
+        # Les déchets visibles viennent de la perception du tour (requêtes sur l'index spatial)
+        pairs: List[Tuple[int, int, Position]] = []
+        for robot_id, x, y, visible in candidates:
+            for position in visible:
+                if position in self.claimant_of:
+                    continue
+                pairs.append((abs(position[0] - x) + abs(position[1] - y), robot_id, position))
+        pairs.sort()
+
+        assigned = 0
+        for _, robot_id, position in pairs:
+            if robot_id in self.target_of or position in self.claimant_of:
+                continue
+            self.claim(robot_id, position)
+            assigned += 1
+        return assigned
@@ -0,0 +1,345 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .world import EMPTY, BASE, ROBOT, TRASH, ROBOT_TRASH
+
+# Même ordre que Robot.decide_action : (0, 1), (1, 0), (0, -1), (-1, 0)
+DIRECTIONS = np.array([(0, 1), (1, 0), (0, -1), (-1, 0)], dtype=np.int32)
+RANDOM_WALK_LENGTH = 10
+
+
+def _window_offsets(radius: int) -> np.ndarray:
+    # Décalages du champ de vision triés par distance de Manhattan (le premier trouvé est le plus proche)
+    offsets = [(i, j) for i in range(-radius, radius + 1) for j in range(-radius, radius + 1)]
+    offsets.sort(key=lambda o: abs(o[0]) + abs(o[1]))
+    return np.array(offsets, dtype=np.int32)
+
+
+class BatchFleet:
+    # État de la flotte en struct-of-arrays, avancé d'un tour entier en opérations vectorisées
+
+    def __init__(self, robots, grid_size: int, base_position: Tuple[int, int], rng: np.random.Generator,
+                 vision_radius: int = 5):
+        self.grid_size = grid_size
+        self.base_x, self.base_y = base_position
+        self.rng = rng
+        self.ids = np.array([robot.id for robot in robots], dtype=np.int32)
+        self.xs = np.array([robot.x for robot in robots], dtype=np.int32)
+        self.ys = np.array([robot.y for robot in robots], dtype=np.int32)
+        self.carrying = np.array([robot.carrying_trash for robot in robots], dtype=np.bool_)
+        self.dir_x = np.zeros(len(robots), dtype=np.int32)
+        self.dir_y = np.zeros(len(robots), dtype=np.int32)
+        self.steps_in_direction = np.zeros(len(robots), dtype=np.int32)
+        self.offsets = _window_offsets(vision_radius)
+        # Abords de la base (la base et ses voisines) : un robot vide n'y entre pas en errant, il en sort
+        zone = [(self.base_x + dx, self.base_y + dy) for dx, dy in ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1))]
+        zone = [(x, y) for x, y in zone if 0 <= x < grid_size and 0 <= y < grid_size]
+        self.zone_x = np.array([x for x, _ in zone], dtype=np.int32)
+        self.zone_y = np.array([y for _, y in zone], dtype=np.int32)
+        # Cases et robots modifiés lors du dernier tour (pour les deltas du moteur)
+        self.changed_cells: List[Tuple[int, int]] = []
+        self.changed_robots: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _is_free(self, occupancy: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        inside = (xs >= 0) & (xs < self.grid_size) & (ys >= 0) & (ys < self.grid_size)
+        free = inside.copy()
+        free[inside] = ~occupancy[xs[inside], ys[inside]]
+        return free
+
+    def _nearest_visible_trash(self, world, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Perception + attribution : appariement glouton par distance (décalages triés par distance de
+        # Manhattan, puis id du robot). Un déchet déjà attribué ce tour-ci est ignoré par les suivants
+        found = np.zeros(len(self), dtype=np.bool_)
+        target_x = np.zeros(len(self), dtype=np.int32)
+        target_y = np.zeros(len(self), dtype=np.int32)
+        claimed = np.zeros(self.grid_size * self.grid_size, dtype=np.bool_)
+        pending = np.flatnonzero(candidates)
+        for ox, oy in self.offsets:
+            if pending.size == 0:
+                break
+            xs = self.xs[pending] + ox
+            ys = self.ys[pending] + oy
+            inside = (xs >= 0) & (xs < self.grid_size) & (ys >= 0) & (ys < self.grid_size)
+            hit = inside.copy()
+            hit[inside] = world.trash[xs[inside], ys[inside]] & ~world.occupancy[xs[inside], ys[inside]]
+            hit_positions = np.flatnonzero(hit)
+            if hit_positions.size == 0:
+                continue
+            flat = xs[hit_positions] * self.grid_size + ys[hit_positions]
+            # pending est trié par id : np.unique garde le premier (plus petit id) pour chaque déchet
+            unclaimed = ~claimed[flat]
+            _, first = np.unique(flat[unclaimed], return_index=True)
+            winners = hit_positions[np.flatnonzero(unclaimed)[first]]
+            claimed[xs[winners] * self.grid_size + ys[winners]] = True
+            winner_index = pending[winners]
+            found[winner_index] = True
+            target_x[winner_index] = xs[winners]
+            target_y[winner_index] = ys[winners]
+            keep = np.ones(pending.size, dtype=np.bool_)
+            keep[winners] = False
+            pending = pending[keep]
+        return found, target_x, target_y
+
+    def _greedy_moves(self, occupancy: np.ndarray, robots: np.ndarray, goal_x: np.ndarray,
+                      goal_y: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # D'abord l'axe x puis l'axe y (approche gloutonne d'un déchet visible)
+        dx = np.sign(goal_x - self.xs[robots]).astype(np.int32)
+        dy = np.sign(goal_y - self.ys[robots]).astype(np.int32)
+        can_x = (dx != 0) & self._is_free(occupancy, self.xs[robots] + dx, self.ys[robots])
+        can_y = (dy != 0) & self._is_free(occupancy, self.xs[robots], self.ys[robots] + dy)
+        move_x = np.where(can_x, dx, 0)
+        move_y = np.where(~can_x & can_y, dy, 0)
+        return can_x | can_y, move_x, move_y
+
+    def _descend_moves(self, occupancy: np.ndarray, robots: np.ndarray, field: np.ndarray,
+                       away: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Chaque robot prend le voisin libre de plus petite distance à la base (s'il rapproche) ; away : celui de
+        # plus grande distance (s'il éloigne)
+        xs, ys = self.xs[robots], self.ys[robots]
+        best = field[xs, ys].copy()
+        move_x = np.zeros(robots.size, dtype=np.int32)
+        move_y = np.zeros(robots.size, dtype=np.int32)
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx, ny = xs + dx, ys + dy
+            free = self._is_free(occupancy, nx, ny)
+            value = np.full(robots.size, -1, dtype=field.dtype)
+            value[free] = field[nx[free], ny[free]]
+            better = free & (value >= 0) & ((value > best) if away else (value < best))
+            best[better] = value[better]
+            move_x[better] = dx
+            move_y[better] = dy
+        return (move_x != 0) | (move_y != 0), move_x, move_y
+
+    def _explored_neighbours(self, explored: np.ndarray, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        # (n, 4) : la case voisine dans chaque direction est-elle déjà explorée (hors grille : oui) ?
+        seen = np.ones((xs.size, 4), dtype=np.bool_)
+        for k, (dx, dy) in enumerate(DIRECTIONS):
+            nx, ny = xs + dx, ys + dy
+            inside = (nx >= 0) & (nx < self.grid_size) & (ny >= 0) & (ny < self.grid_size)
+            seen[inside, k] = explored[nx[inside], ny[inside]]
+        return seen
+
+    def _random_walk(self, occupancy: np.ndarray, robots: np.ndarray,
+                     explored: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        xs, ys = self.xs[robots], self.ys[robots]
+        renew = (self.steps_in_direction[robots] <= 0) | ((self.dir_x[robots] == 0) & (self.dir_y[robots] == 0))
+        renew_index = np.flatnonzero(renew)
+        if renew_index.size:
+            # Une permutation aléatoire des 4 directions par robot, on garde la première libre ;
+            # les directions menant à une case inexplorée passent devant les autres
+            keys = self.rng.random((renew_index.size, 4))
+            if explored is not None:
+                keys += self._explored_neighbours(explored, xs[renew_index], ys[renew_index])
+            order = np.argsort(keys, axis=1)
+            candidates = DIRECTIONS[order]
+            free = np.stack([
+                self._is_free(occupancy, xs[renew_index] + candidates[:, k, 0], ys[renew_index] + candidates[:, k, 1])
+                for k in range(4)
+            ], axis=1)
+            has_free = free.any(axis=1)
+            first = np.argmax(free, axis=1)
+            chosen = candidates[np.arange(renew_index.size), first]
+            updated = robots[renew_index[has_free]]
+            self.dir_x[updated] = chosen[has_free, 0]
+            self.dir_y[updated] = chosen[has_free, 1]
+            self.steps_in_direction[updated] = RANDOM_WALK_LENGTH
+
+        dx, dy = self.dir_x[robots], self.dir_y[robots]
+        ok = ((dx != 0) | (dy != 0)) & self._is_free(occupancy, xs + dx, ys + dy)
+        self.steps_in_direction[robots[ok]] -= 1
+        # Si bloqué, on repart d'une nouvelle direction au prochain tour
+        blocked = robots[~ok]
+        self.dir_x[blocked] = 0
+        self.dir_y[blocked] = 0
+        self.steps_in_direction[blocked] = 0
+        return ok, np.where(ok, dx, 0), np.where(ok, dy, 0)
+
+    def step(self, world, base_field, explored: Optional[np.ndarray] = None,
+             profiler=None) -> Tuple[int, List[Tuple[int, int]]]:
+        # profiler (TickProfiler optionnel) : la descente du champ de distances compte comme du pathfinding
+        if profiler is not None:
+            started = time.perf_counter()
+        count = len(self)
+        # Les obstacles statiques bloquent les déplacements comme les robots
+        occupancy = world.occupancy | world.walls if world.walls.any() else world.occupancy
+        at_base = (self.xs == self.base_x) & (self.ys == self.base_y)
+        on_trash = world.trash[self.xs, self.ys]
+        field = np.frombuffer(base_field.distances, dtype=np.int32).reshape(self.grid_size, self.grid_size)
+        distance = field[self.xs, self.ys]
+        # Cases interdites aux robots vides : la base pour l'approche d'un déchet, ses abords en plus pour l'errance
+        # (sinon ils s'y agglutinent et les robots chargés ne peuvent plus déposer)
+        chase_blocked = occupancy.copy()
+        chase_blocked[self.base_x, self.base_y] = True
+        wander_blocked = occupancy.copy()
+        wander_blocked[self.zone_x, self.zone_y] = True
+
+        deposit = self.carrying & at_base
+        pickup = ~self.carrying & on_trash
+        move_dx = np.zeros(count, dtype=np.int32)
+        move_dy = np.zeros(count, dtype=np.int32)
+        moving = np.zeros(count, dtype=np.bool_)
+
+        # Retour à la base pour les robots chargés
+        homing = np.flatnonzero(self.carrying & ~at_base)
+        if homing.size:
+            ok, mx, my = self._descend_moves(occupancy, homing, field)
+            moving[homing[ok]] = True
+            move_dx[homing] = mx
+            move_dy[homing] = my
+        # Les robots vides sur la base ou à côté s'en éloignent (sauf pour ramasser un déchet sous eux)
+        leaving = ~self.carrying & ~on_trash & (distance >= 0) & (distance <= 1)
+        clearing = np.flatnonzero(leaving)
+        if clearing.size:
+            ok, mx, my = self._descend_moves(occupancy, clearing, field, away=True)
+            moving[clearing[ok]] = True
+            move_dx[clearing] = mx
+            move_dy[clearing] = my
+        if profiler is not None:
+            started = self._lap(profiler, "pathfinding", started)
+
+        # Perception puis déplacement vers le déchet visible le plus proche
+        seeking = ~self.carrying & ~on_trash & ~leaving
+        found, target_x, target_y = self._nearest_visible_trash(world, seeking)
+        if profiler is not None:
+            started = self._lap(profiler, "perception", started)
+        chasing = np.flatnonzero(found)
+        if chasing.size:
+            ok, mx, my = self._greedy_moves(chase_blocked, chasing, target_x[chasing], target_y[chasing])
+            moving[chasing[ok]] = True
+            move_dx[chasing] = mx
+            move_dy[chasing] = my
+
+        # Marche aléatoire pour tous les autres (y compris les robots vides bloqués) ; un robot chargé bloqué
+        # attend que sa file avance, ou qu'un robot vide lui cède sa case (voir _yield_to_carriers)
+        wandering = np.flatnonzero(~deposit & ~pickup & ~moving & ~(self.carrying & (distance >= 0)))
+        if wandering.size:
+            ok, mx, my = self._random_walk(wander_blocked, wandering, explored)
+            moving[wandering[ok]] = True
+            move_dx[wandering] = mx
+            move_dy[wandering] = my
+        if profiler is not None:
+            started = self._lap(profiler, "decision", started)
+
+        # Résolution déterministe des conflits : pour une même case cible, un robot vide qui quitte les abords
+        # de la base passe en premier (sinon les robots chargés qui l'attendent l'y bloquent indéfiniment), puis
+        # les robots chargés, puis le plus petit id
+        movers = np.flatnonzero(moving)
+        if movers.size:
+            target_x = self.xs[movers] + move_dx[movers]
+            target_y = self.ys[movers] + move_dy[movers]
+            flat = target_x * self.grid_size + target_y
+            order = np.lexsort((self.ids[movers], ~self.carrying[movers], ~leaving[movers], flat))
+            winners_sorted = np.ones(order.size, dtype=np.bool_)
+            winners_sorted[1:] = flat[order][1:] != flat[order][:-1]
+            movers = movers[order[winners_sorted]]
+        movers = self._yield_to_carriers(movers, ~pickup, field, distance, move_dx, move_dy)
+
+        self.changed_cells = []
+        self._apply_moves(world, movers, move_dx, move_dy)
+        if explored is not None:
+            explored[self.xs[movers], self.ys[movers]] = True
+
+        # Ramassage
+        picked = np.flatnonzero(pickup)
+        picked_positions = []
+        if picked.size:
+            px, py = self.xs[picked], self.ys[picked]
+            self.carrying[picked] = True
+            world.trash[px, py] = False
+            world.cells[px, py] = ROBOT
+            picked_positions = list(zip(px.tolist(), py.tolist()))
+            self.changed_cells.extend(picked_positions)
+
+        # Dépôt à la base
+        deposited = int(np.count_nonzero(deposit))
+        self.carrying[deposit] = False
+        self.changed_robots = np.flatnonzero(deposit | pickup).tolist() + movers.tolist()
+        if profiler is not None:
+            self._lap(profiler, "movement", started)
+            profiler.count("moves", int(movers.size))
+            profiler.count("pickups", int(picked.size))
+            profiler.count("deposits", deposited)
+            # Robots qui ni ne bougent, ni ne ramassent, ni ne déposent ce tour-ci
+            profiler.count("blocked_moves", count - int(movers.size) - int(picked.size) - deposited)
+        return deposited, picked_positions
+
+    def _yield_to_carriers(self, movers: np.ndarray, idle: np.ndarray, field: np.ndarray, distance: np.ndarray,
+                           move_dx: np.ndarray, move_dy: np.ndarray) -> np.ndarray:
+        # Un robot vide immobile cède sa case à un robot chargé bloqué pour qui elle rapproche de la base : les
+        # deux échangent leurs places (cases occupées en début de tour, aucun autre robot n'y entre). Sans cela,
+        # les robots vides encerclent la base et plus aucun dépôt n'a lieu
+        moved = np.zeros(len(self), dtype=np.bool_)
+        moved[movers] = True
+        empties = np.flatnonzero(idle & ~self.carrying & ~moved)
+        carriers = np.flatnonzero(self.carrying & ~moved & (distance > 0))
+        if empties.size == 0 or carriers.size == 0:
+            return movers
+        size = self.grid_size
+        owner = np.full(size * size, -1, dtype=np.int64)
+        owner[self.xs[empties] * size + self.ys[empties]] = empties
+        swaps = []
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            if carriers.size == 0:
+                break
+            nx, ny = self.xs[carriers] + dx, self.ys[carriers] + dy
+            inside = np.flatnonzero((nx >= 0) & (nx < size) & (ny >= 0) & (ny < size))
+            occupant = owner[nx[inside] * size + ny[inside]]
+            closer = (occupant >= 0) & (field[nx[inside], ny[inside]] < distance[carriers[inside]])
+            hit, occupant = inside[closer], occupant[closer]
+            if hit.size == 0:
+                continue
+            # Un robot vide ne cède sa case qu'une fois (au robot chargé de plus petit indice)
+            _, first = np.unique(occupant, return_index=True)
+            hit, occupant = hit[first], occupant[first]
+            chosen = carriers[hit]
+            move_dx[chosen], move_dy[chosen] = dx, dy
+            move_dx[occupant], move_dy[occupant] = -dx, -dy
+            owner[self.xs[occupant] * size + self.ys[occupant]] = -1
+            swaps.extend((chosen, occupant))
+            keep = np.ones(carriers.size, dtype=np.bool_)
+            keep[hit] = False
+            carriers = carriers[keep]
+        if not swaps:
+            return movers
+        return np.concatenate([movers, *swaps])
+
+    @staticmethod
+    def _lap(profiler, phase: str, started: float) -> float:
+        now = time.perf_counter()
+        profiler.add(phase, now - started)
+        return now
+
+    def _apply_moves(self, world, movers: np.ndarray, move_dx: np.ndarray, move_dy: np.ndarray):
+        if movers.size == 0:
+            return
+        old_x, old_y = self.xs[movers], self.ys[movers]
+        new_x, new_y = old_x + move_dx[movers], old_y + move_dy[movers]
+
+        world.occupancy[old_x, old_y] = False
+        world.cells[old_x, old_y] = np.where(world.trash[old_x, old_y], TRASH, EMPTY)
+        if not world.occupancy[self.base_x, self.base_y]:
+            world.cells[self.base_x, self.base_y] = BASE
+        world.occupancy[new_x, new_y] = True
+        world.cells[new_x, new_y] = np.where(world.trash[new_x, new_y], ROBOT_TRASH, ROBOT)
+
+        self.xs[movers] = new_x
+        self.ys[movers] = new_y
+        self.changed_cells.extend(zip(old_x.tolist(), old_y.tolist()))
+        self.changed_cells.extend(zip(new_x.tolist(), new_y.tolist()))
+
+    def robot_records(self) -> List[Dict]:
+        return [
+            {"id": robot_id, "x": x, "y": y, "carrying_trash": carrying}
+            for robot_id, x, y, carrying in zip(self.ids.tolist(), self.xs.tolist(), self.ys.tolist(),
+                                                self.carrying.tolist())
+        ]
+
+    def sync_to(self, robots):
+        # Recopie l'état vectorisé dans les objets Robot (pour les usages hors mode batch)
+        for robot, x, y, carrying in zip(robots, self.xs.tolist(), self.ys.tolist(), self.carrying.tolist()):
+            robot.x, robot.y, robot.carrying_trash = x, y, carrying
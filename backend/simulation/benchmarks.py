@@ -0,0 +1,244 @@
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from itertools import product
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .pathfinding import Position, a_star
+from .simulation_engine import Robot, SimulationEngine
+
+
+def timing_stats(samples: List[float]) -> Dict:
+    # Durées en millisecondes
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def _time_calls(function: Callable, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def environment() -> Dict:
+    # Contexte des mesures, pour comparer deux fichiers de résultats entre commits
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def bench_engine(grid_sizes: Iterable[int], robot_counts: Iterable[int], densities: Iterable[float],
+                 vision_radii: Iterable[int], steps: int, seed: int = 0, storage: str = "list",
+                 step_mode: str = "sequential", walls: Iterable[Position] = ()) -> List[Dict]:
+    # Tours par seconde de SimulationEngine.step pour chaque combinaison (densité = déchets / cases) ;
+    # walls : carte d'obstacles statiques, tronquée à chaque taille de grille
+    walls = list(walls)
+    results = []
+    for grid_size, num_robots, density, vision_radius in product(grid_sizes, robot_counts, densities,
+                                                                 vision_radii):
+        grid_walls = [(x, y) for x, y in walls if x < grid_size and y < grid_size and (x, y) != (0, 0)]
+        cells = grid_size * grid_size - len(grid_walls)
+        num_trash = max(1, min(int(density * cells), cells - num_robots - 1))
+        if num_robots + num_trash + 1 > cells:
+            continue
+        started = time.perf_counter()
+        engine = SimulationEngine(grid_size, num_robots, num_trash, (0, 0), storage=storage,
+                                  step_mode=step_mode, vision_radius=vision_radius, seed=seed, walls=grid_walls)
+        setup = time.perf_counter() - started
+
+        samples = []
+        for _ in range(steps):
+            started = time.perf_counter()
+            finished = engine.step()
+            samples.append(time.perf_counter() - started)
+            if finished:
+                break
+        total = sum(samples)
+        results.append({
+            "grid_size": grid_size,
+            "num_robots": num_robots,
+            "num_trash": num_trash,
+            "trash_density": density,
+            "vision_radius": vision_radius,
+            "storage": storage,
+            "step_mode": step_mode,
+            "walls": len(grid_walls),
+            "setup_ms": setup * 1000,
+            "steps": len(samples),
+            "steps_per_second": len(samples) / total if total else None,
+            "step": timing_stats(samples),
+        })
+    return results
+
+
+def cluttered_obstacles(grid_size: int, clutter: float, rng: random.Random, keep=()) -> set:
+    # Obstacles dynamiques (positions de robots) tirés au hasard, sans toucher aux cases à garder libres
+    keep = set(keep)
+    cells = [(x, y) for x in range(grid_size) for y in range(grid_size) if (x, y) not in keep]
+    return set(rng.sample(cells, int(clutter * len(cells))))
+
+
+def bench_pathfinding(grid_sizes: Iterable[int], clutter_levels: Iterable[float], queries: int,
+                      seed: int = 0) -> List[Dict]:
+    # Microbenchmark de a_star (interface historique sur grille de chaînes) entre paires aléatoires
+    results = []
+    for grid_size, clutter in product(grid_sizes, clutter_levels):
+        rng = random.Random(seed)
+        grid = [["." for _ in range(grid_size)] for _ in range(grid_size)]
+        grid[0][0] = "B"
+        obstacles = cluttered_obstacles(grid_size, clutter, rng, keep=[(0, 0)])
+        free = [(x, y) for x in range(grid_size) for y in range(grid_size)
+                if (x, y) not in obstacles and (x, y) != (0, 0)]
+        pairs = [tuple(rng.sample(free, 2)) for _ in range(queries)]
+
+        samples = []
+        found = 0
+        lengths = []
+        for start, goal in pairs:
+            started = time.perf_counter()
+            path = a_star(start, goal, grid, obstacles, (0, 0))
+            samples.append(time.perf_counter() - started)
+            if path:
+                found += 1
+                lengths.append(len(path))
+        results.append({
+            "grid_size": grid_size,
+            "clutter": clutter,
+            "queries": queries,
+            "found": found,
+            "mean_path_length": statistics.mean(lengths) if lengths else None,
+            "queries_per_second": len(samples) / sum(samples) if sum(samples) else None,
+            "query": timing_stats(samples),
+        })
+    return results
+
+
+def bench_perception(grid_sizes: Iterable[int], vision_radii: Iterable[int], repeat: int,
+                     seed: int = 0) -> List[Dict]:
+    # Balayage complet de la fenêtre (see_around) face à la requête sur l'index spatial (perceive)
+    results = []
+    for grid_size, vision_radius in product(grid_sizes, vision_radii):
+        engine = SimulationEngine(grid_size, 1, max(1, grid_size * grid_size // 10), (0, 0),
+                                  vision_radius=vision_radius, seed=seed)
+        robot: Robot = engine.robots[0]
+        positions = engine._robot_positions()
+        results.append({
+            "grid_size": grid_size,
+            "vision_radius": vision_radius,
+            "see_around": timing_stats(_time_calls(lambda: robot.see_around(engine.grid), repeat)),
+            "perceive": timing_stats(_time_calls(lambda: robot.perceive(engine.trash_index, positions), repeat)),
+        })
+    return results
+
+
+def bench_api(client, num_robots: Iterable[int], requests: int, num_trash: int = 20) -> List[Dict]:
+    # Latence de bout en bout et taille des réponses à travers le client de test Django
+    results = []
+    for robots in num_robots:
+        response = client.post("/api/simulations/create_simulation/",
+                               {"num_robots": robots, "num_trash": num_trash, "base_x": 0, "base_y": 0, "seed": 0},
+                               content_type="application/json")
+        simulation_id = response.json()["id"]
+        version = client.get(f"/api/simulations/{simulation_id}/state/").json()["version"]
+
+        variants = {
+            "step": lambda: client.post(f"/api/simulations/{simulation_id}/step/"),
+            "step_delta": lambda: client.post(f"/api/simulations/{simulation_id}/step/?since={version}"),
+            "step_binary": lambda: client.post(f"/api/simulations/{simulation_id}/step/",
+                                               HTTP_ACCEPT="application/x-walle-state"),
+            "state": lambda: client.get(f"/api/simulations/{simulation_id}/state/"),
+            "state_binary": lambda: client.get(f"/api/simulations/{simulation_id}/state/",
+                                               HTTP_ACCEPT="application/x-walle-state"),
+        }
+        for name, call in variants.items():
+            samples = []
+            sizes = []
+            statuses = set()
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = call()
+                samples.append(time.perf_counter() - started)
+                sizes.append(len(response.content))
+                statuses.add(response.status_code)
+                if name == "step_delta":
+                    version = response.json().get("version", version)
+            results.append({
+                "endpoint": name,
+                "num_robots": robots,
+                "num_trash": num_trash,
+                "statuses": sorted(statuses),
+                "mean_payload_bytes": statistics.mean(sizes),
+                "max_payload_bytes": max(sizes),
+                "latency": timing_stats(samples),
+            })
+        client.delete(f"/api/simulations/{simulation_id}/")
+    return results
+
+
+# Métriques comparées entre deux fichiers : (section, clés d'identification, chemin de la métrique, plus = mieux)
+COMPARED_METRICS = {
+    "engine": (("grid_size", "num_robots", "trash_density", "vision_radius", "storage", "step_mode"),
+               ("steps_per_second",), True),
+    "pathfinding": (("grid_size", "clutter"), ("query", "mean_ms"), False),
+    "perception": (("grid_size", "vision_radius"), ("perceive", "mean_ms"), False),
+    "api": (("endpoint", "num_robots"), ("latency", "median_ms"), False),
+}
+
+
+def _metric(entry: Dict, path) -> Optional[float]:
+    for key in path:
+        if not isinstance(entry, dict) or key not in entry:
+            return None
+        entry = entry[key]
+    return entry
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.1) -> List[Dict]:
+    # Écart relatif par mesure commune aux deux rapports ; regression = dégradation au-delà du seuil
+    rows = []
+    for section, (keys, path, higher_is_better) in COMPARED_METRICS.items():
+        previous = {tuple(entry.get(key) for key in keys): entry for entry in baseline.get(section, [])}
+        for entry in current.get(section, []):
+            identity = tuple(entry.get(key) for key in keys)
+            if identity not in previous:
+                continue
+            old, new = _metric(previous[identity], path), _metric(entry, path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            rows.append({
+                "section": section,
+                "case": dict(zip(keys, identity)),
+                "metric": ".".join(path),
+                "baseline": old,
+                "current": new,
+                "change": change,
+                "regression": worse > threshold,
+            })
+    return rows
@@ -0,0 +1,121 @@
+import json
+import struct
+from typing import Dict
+
+import numpy as np
+
+from .world import CELL_CODES
+
+# En-tête commun (little-endian, 24 octets) :
+#   magic "WALE", version du format, type de trame, drapeaux,
+#   version de l'état, taille de grille, déchets restants, tours écoulés (-1 si inconnu)
+HEADER = struct.Struct('<4sBBHIIii')
+MAGIC = b'WALE'
+FORMAT_VERSION = 1
+
+KIND_KEYFRAME = 0
+KIND_DELTA = 1
+KIND_JSON = 0xFF
+
+FLAG_FINISHED = 1
+FLAG_RLE = 2
+
+COUNT = struct.Struct('<I')
+
+
+def _header(kind: int, flags: int, data: Dict) -> bytes:
+    turns_elapsed = data.get("turns_elapsed")
+    return HEADER.pack(MAGIC, FORMAT_VERSION, kind, flags, data.get("version", 0), data.get("grid_size", 0),
+                       data.get("trash_remaining", 0), -1 if turns_elapsed is None else turns_elapsed)
+
+
+def _flags(data: Dict) -> int:
+    return FLAG_FINISHED if data.get("is_finished") else 0
+
+
+def run_length_encode(cells: np.ndarray):
+    # Plages de codes identiques sur la grille aplatie (ordre ligne par ligne) : (longueurs uint32, codes uint8)
+    flat = np.ascontiguousarray(cells).reshape(-1)
+    if flat.size == 0:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint8)
+    starts = np.concatenate(([0], np.flatnonzero(flat[1:] != flat[:-1]) + 1))
+    lengths = np.diff(np.concatenate((starts, [flat.size]))).astype(np.uint32)
+    return lengths, flat[starts]
+
+
+def encode_keyframe(data: Dict, rle: bool = True) -> bytes:
+    # Corps : robots int32[n * 4], puis cases (RLE : longueurs uint32 puis codes uint8 ; brut : uint8[taille²]).
+    # Les blocs d'entiers restent alignés sur 4 octets pour être lus en Int32Array/Uint32Array côté client
+    robots = np.ascontiguousarray(data["robots"], dtype=np.int32)
+    parts = [_header(KIND_KEYFRAME, _flags(data) | (FLAG_RLE if rle else 0), data),
+             COUNT.pack(len(robots)), robots.tobytes()]
+    if rle:
+        lengths, codes = run_length_encode(data["cells"])
+        parts += [COUNT.pack(len(lengths)), lengths.tobytes(), codes.tobytes()]
+    else:
+        parts.append(np.ascontiguousarray(data["cells"], dtype=np.uint8).tobytes())
+    return b''.join(parts)
+
+
+def encode_delta(data: Dict) -> bytes:
+    # Corps : robots modifiés int32[n * 4], puis cases modifiées : positions int32[m * 2], codes uint8[m]
+    robots = np.ascontiguousarray(data["robots"], dtype=np.int32)
+    positions = np.ascontiguousarray(data["cell_positions"], dtype=np.int32)
+    codes = np.ascontiguousarray(data["cell_codes"], dtype=np.uint8)
+    return b''.join([
+        _header(KIND_DELTA, _flags(data), data),
+        COUNT.pack(len(robots)), robots.tobytes(),
+        COUNT.pack(len(codes)), positions.tobytes(), codes.tobytes(),
+    ])
+
+
+def encode_json(data) -> bytes:
+    # Toute autre réponse (erreurs, métadonnées) : en-tête + JSON
+    return _header(KIND_JSON, 0, {}) + json.dumps(data).encode('utf-8')
+
+
+def packed_from_grid_state(grid_state: Dict) -> Dict:
+    # Chemin lent : conversion d'un état déjà matérialisé en chaînes
+    return {
+        **grid_state,
+        "grid_size": len(grid_state["grid"]),
+        "cells": np.array([[CELL_CODES[value] for value in row] for row in grid_state["grid"]], dtype=np.uint8),
+        "robots": np.array([(r["id"], r["x"], r["y"], r["carrying_trash"]) for r in grid_state["robots"]],
+                           dtype=np.int32).reshape(-1, 4),
+    }
+
+
+def decode_frame(frame: bytes) -> Dict:
+    # Inverse de encode_keyframe / encode_delta (relecture des parties enregistrées)
+    _, _, kind, flags, version, grid_size, trash_remaining, turns_elapsed = HEADER.unpack_from(frame, 0)
+    if kind not in (KIND_KEYFRAME, KIND_DELTA):
+        raise ValueError(f"Type de trame inattendu : {kind}")
+    offset = HEADER.size
+    (robot_count,) = COUNT.unpack_from(frame, offset)
+    offset += COUNT.size
+    robots = np.frombuffer(frame, dtype=np.int32, count=robot_count * 4, offset=offset).reshape(-1, 4)
+    offset += robot_count * 16
+    data = {
+        "kind": kind,
+        "version": version,
+        "grid_size": grid_size,
+        "trash_remaining": trash_remaining,
+        "turns_elapsed": turns_elapsed,
+        "is_finished": bool(flags & FLAG_FINISHED),
+        "robots": robots,
+    }
+    if kind == KIND_DELTA:
+        (count,) = COUNT.unpack_from(frame, offset)
+        offset += COUNT.size
+        data["cell_positions"] = np.frombuffer(frame, dtype=np.int32, count=count * 2, offset=offset).reshape(-1, 2)
+        data["cell_codes"] = np.frombuffer(frame, dtype=np.uint8, count=count, offset=offset + count * 8)
+    elif flags & FLAG_RLE:
+        (count,) = COUNT.unpack_from(frame, offset)
+        offset += COUNT.size
+        lengths = np.frombuffer(frame, dtype=np.uint32, count=count, offset=offset)
+        codes = np.frombuffer(frame, dtype=np.uint8, count=count, offset=offset + count * 4)
+        data["cells"] = np.repeat(codes, lengths).reshape(grid_size, grid_size)
+    else:
+        data["cells"] = np.frombuffer(frame, dtype=np.uint8, count=grid_size * grid_size,
+                                      offset=offset).reshape(grid_size, grid_size)
+    return data
@@ -0,0 +1,277 @@
+from heapq import heappush, heappop
+from typing import Callable, Dict, List, Optional, Tuple
+
+Position = Tuple[int, int]
+
+# Horizon de planification (tours) : chaque robot réserve au plus ses WINDOW prochaines cases
+WINDOW = 8
+# Tours d'attente consécutifs avant qu'un robot bloqué soit examiné par la détection d'interblocage
+DEADLOCK_TURNS = 3
+# Un robot qui attend gagne un rang de priorité tous les AGING_TURNS tours (pas de famine)
+AGING_TURNS = 4
+# Tours pendant lesquels le robot désigné pour céder le passage s'écarte au lieu de suivre son but
+YIELD_TURNS = 2
+# Nœuds développés au plus par recherche espace-temps (au-delà, robot coincé dans la foule : il attend)
+MAX_EXPANSIONS = 96
+# Les robots vides à cette distance de la base (ou moins) sont prioritaires pour s'en éloigner
+LEAVE_RADIUS = 2
+# Cases explorées au plus pour trouver une chaîne de robots à pousser vers une case libre
+PUSH_LIMIT = 256
+
+# Rangs de priorité (le plus petit planifie en premier)
+RANK_YIELDING = -100
+RANK_LEAVING_BASE = 0
+RANK_CARRYING = 1
+RANK_TARGET = 2
+RANK_EXPLORING = 3
+
+
+class ReservationTable:
+    # Table espace-temps partagée : (case, tour) -> robot, et (origine, destination, tour) -> robot pour les
+    # déplacements (deux robots ne peuvent pas échanger leurs cases face à face). Les tours sont absolus
+
+    def __init__(self):
+        self.cells: Dict[Tuple[Position, int], int] = {}
+        self.moves: Dict[Tuple[Position, Position, int], int] = {}
+        # Clés réservées par robot, pour tout rendre d'un coup avant de replanifier
+        self.owned: Dict[int, List[Tuple]] = {}
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def clear(self):
+        self.cells.clear()
+        self.moves.clear()
+        self.owned.clear()
+
+    def can_move(self, robot_id: int, origin: Position, target: Position, time: int) -> bool:
+        # Déplacement (ou attente si origin == target) entre time et time + 1
+        holder = self.cells.get((target, time + 1))
+        if holder is not None and holder != robot_id:
+            return False
+        crossing = self.moves.get((target, origin, time))
+        return crossing is None or crossing == robot_id
+
+    def reserve_cell(self, robot_id: int, position: Position, time: int):
+        key = (position, time)
+        self.cells[key] = robot_id
+        self.owned.setdefault(robot_id, []).append(key)
+
+    def reserve_move(self, robot_id: int, origin: Position, target: Position, time: int):
+        self.reserve_cell(robot_id, target, time + 1)
+        if origin != target:
+            key = (origin, target, time)
+            self.moves[key] = robot_id
+            self.owned[robot_id].append(key)
+
+    def reserve_path(self, robot_id: int, start: Position, path: List[Position], time: int):
+        # path : positions aux tours time + 1, time + 2, ...
+        current = start
+        for offset, position in enumerate(path):
+            self.reserve_move(robot_id, current, position, time + offset)
+            current = position
+
+    def release(self, robot_id: int):
+        for key in self.owned.pop(robot_id, ()):
+            table = self.cells if len(key) == 2 else self.moves
+            if table.get(key) == robot_id:
+                del table[key]
+
+
+class ReservedCells:
+    # Vue « case prise au tour time » (réservée par un robot, ou obstacle statique) pour les décisions
+    # gloutonnes de Robot.decide_action, qui n'attendent qu'un test d'appartenance. La case actuelle du robot
+    # qui décide (current) compte comme prise, comme dans les positions des robots du mode séquentiel. La base
+    # aussi : seuls les robots chargés y entrent, par un plan (sinon les robots vides s'y relaient en errant)
+    __slots__ = ("table", "time", "walls", "base", "current")
+
+    def __init__(self, table: ReservationTable, time: int, walls, base: Position):
+        self.table = table
+        self.time = time
+        self.walls = walls
+        self.base = base
+        self.current: Optional[Position] = None
+
+    def __contains__(self, position: Position) -> bool:
+        return position == self.current or position == self.base or (position, self.time) in self.table.cells \
+            or position in self.walls
+
+
+class CooperativePlanner:
+    # Planification coopérative fenêtrée (WHCA*) : les robots planifient l'un après l'autre par ordre de
+    # priorité, chacun par un A* espace-temps qui évite les réservations des précédents, puis réserve son
+    # chemin sur l'horizon. Replanifié à chaque tour ; les attentes prolongées sont surveillées pour détecter
+    # les interblocages (graphe d'attente), résolus en faisant s'écarter le robot le moins prioritaire
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self.table = ReservationTable()
+        # Tours d'attente consécutifs par robot, et robots en train de céder le passage -> tours restants
+        self.waits: Dict[int, int] = {}
+        self.yielding: Dict[int, int] = {}
+        # Dernier plan de chaque robot : (but, tour de calcul, positions aux tours suivants)
+        self.plans: Dict[int, Tuple[Position, int, List[Position]]] = {}
+        self.searches = 0
+        self.expansions = 0
+        self.deadlocks = 0
+
+    def priority(self, robot_id: int, rank: int, distance: int) -> Tuple[int, int, int]:
+        # L'attente fait monter un robot jusqu'au rang des robots chargés, jamais devant ceux qui dégagent la
+        # base (sinon la foule joue avant eux et ne peut plus être poussée)
+        if robot_id in self.yielding:
+            rank = RANK_YIELDING
+        elif rank > RANK_CARRYING:
+            rank = max(RANK_CARRYING, rank - self.waits.get(robot_id, 0) // AGING_TURNS)
+        return rank, distance, robot_id
+
+    def plan(self, robot_id: int, start: Position, goal: Position, time: int,
+             passable: Callable[[int, int], bool], heuristic: Callable[[int, int], int]) -> Optional[List[Position]]:
+        # A* dans l'espace (case, tour) limité à l'horizon ; heuristic : distance estimée au but (< 0 : case
+        # sans issue). Chaque transition coûte un tour, donc le coût d'un état est son décalage dans le temps
+        # et le premier passage sur un état est le meilleur. Renvoie les positions aux tours suivants
+        # (attentes comprises), jusqu'au but ou à l'horizon ; None si aucun plan sans conflit (ou trop coûteux)
+        self.searches += 1
+        cells = self.table.cells
+        moves = self.table.moves
+        window = self.window
+        start_h = heuristic(*start)
+        if start_h < 0:
+            return None
+        parents: Dict[Tuple[Position, int], Optional[Tuple[Position, int]]] = {(start, 0): None}
+        frontier = [(start_h, start_h, 0, start)]
+        reached = None
+        expansions = 0
+        while frontier and expansions < MAX_EXPANSIONS:
+            _, _, offset, position = heappop(frontier)
+            expansions += 1
+            if position == goal or offset == window:
+                reached = (position, offset)
+                break
+            x, y = position
+            arrival = time + offset + 1
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1), (x, y)):
+                neighbor = (nx, ny)
+                state = (neighbor, offset + 1)
+                if state in parents:
+                    continue
+                if neighbor != position and not passable(nx, ny):
+                    continue
+                # Même test que ReservationTable.can_move, en ligne (boucle la plus chaude du mode)
+                holder = cells.get((neighbor, arrival))
+                if holder is not None and holder != robot_id:
+                    continue
+                crossing = moves.get((neighbor, position, arrival - 1))
+                if crossing is not None and crossing != robot_id:
+                    continue
+                h = heuristic(nx, ny)
+                if h < 0:
+                    continue
+                parents[state] = (position, offset)
+                heappush(frontier, (offset + 1 + h, h, offset + 1, neighbor))
+        self.expansions += expansions
+        if reached is None:
+            return None
+
+        path = []
+        state = reached
+        while state[1] > 0:
+            path.append(state[0])
+            state = parents[state]
+        path.reverse()
+        self.plans[robot_id] = (goal, time, path)
+        return path
+
+    def reuse(self, robot_id: int, start: Position, goal: Position, time: int) -> Optional[List[Position]]:
+        # Suite du plan d'un tour précédent (WHCA* ne replanifie qu'à mi-horizon) : gardée si le robot l'a suivie,
+        # si le but n'a pas changé, s'il en reste au moins la moitié de l'horizon (ou le but) et si elle ne croise
+        # aucune réservation des robots plus prioritaires de ce tour
+        previous = self.plans.get(robot_id)
+        if previous is None:
+            return None
+        previous_goal, made, path = previous
+        elapsed = time - made
+        if previous_goal != goal or elapsed <= 0 or elapsed > len(path) or path[elapsed - 1] != start:
+            return None
+        remaining = path[elapsed:]
+        if len(remaining) < self.window // 2 and (not remaining or remaining[-1] != goal):
+            return None
+        current = start
+        for offset, position in enumerate(remaining):
+            if not self.table.can_move(robot_id, current, position, time + offset):
+                return None
+            current = position
+        return remaining
+
+    def boxed(self, robot_id: int, start: Position, time: int, passable: Callable[[int, int], bool]) -> bool:
+        # Aucune case voisine accessible au tour suivant
+        x, y = start
+        return not any(passable(nx, ny) and self.table.can_move(robot_id, start, (nx, ny), time)
+                       for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)))
+
+    def side_step(self, robot_id: int, start: Position, time: int, passable: Callable[[int, int], bool],
+                  away: Callable[[int, int], int]) -> Optional[Position]:
+        # Case voisine libre au tour suivant, la plus éloignée selon away (s'écarter de la congestion)
+        x, y = start
+        options = [(nx, ny) for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1))
+                   if passable(nx, ny) and self.table.can_move(robot_id, start, (nx, ny), time)]
+        if not options:
+            return None
+        return max(options, key=lambda position: away(*position))
+
+    def record(self, robot_id: int, progressed: bool):
+        # Fin de tour d'un robot : progrès (déplacement, ramassage, dépôt) ou attente
+        if progressed:
+            self.waits.pop(robot_id, None)
+        else:
+            self.waits[robot_id] = self.waits.get(robot_id, 0) + 1
+        remaining = self.yielding.get(robot_id)
+        if remaining is not None:
+            if remaining <= 1:
+                del self.yielding[robot_id]
+            else:
+                self.yielding[robot_id] = remaining - 1
+
+    def stalled(self, robot_id: int) -> bool:
+        return self.waits.get(robot_id, 0) >= DEADLOCK_TURNS
+
+    def find_deadlocks(self, wanted: Dict[int, Optional[Position]],
+                       occupant: Dict[Position, int]) -> List[List[int]]:
+        # Graphe d'attente : un robot bloqué attend l'occupant de la case qu'il veut (wanted, None pour un robot
+        # sans but). Interblocage : une chaîne de robots bloqués qui se referme sur elle-même, ou qui aboutit à
+        # un robot bloqué sans but (encerclé, typiquement sur la base)
+        groups = []
+        visited = set()
+        for robot_id in wanted:
+            if robot_id in visited or not self.stalled(robot_id):
+                continue
+            chain: List[int] = []
+            position_in_chain: Dict[int, int] = {}
+            current: Optional[int] = robot_id
+            while current is not None and current not in visited:
+                if current in position_in_chain:
+                    groups.append(chain[position_in_chain[current]:])
+                    break
+                if not self.stalled(current):
+                    break
+                position_in_chain[current] = len(chain)
+                chain.append(current)
+                cell = wanted.get(current)
+                if cell is None:
+                    if len(chain) > 1:
+                        groups.append(chain)
+                    break
+                current = occupant.get(cell)
+            visited.update(chain)
+        return groups
+
+    def resolve(self, group: List[int], keys: Dict[int, Tuple], can_yield: Callable[[int], bool]) -> Optional[int]:
+        # Le robot le moins prioritaire du groupe qui a une case où s'écarter cède le passage
+        candidates = [robot_id for robot_id in group if can_yield(robot_id)]
+        if not candidates:
+            return None
+        victim = max(candidates, key=lambda robot_id: keys.get(robot_id, (RANK_EXPLORING, 0, robot_id)))
+        self.yielding[victim] = YIELD_TURNS
+        for robot_id in group:
+            self.waits.pop(robot_id, None)
+        self.deadlocks += 1
+        return victim
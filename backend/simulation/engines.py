@@ -0,0 +1,155 @@
+import hmac
+import logging
+import os
+from typing import Callable, Optional, TypeVar
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .models import Simulation
+from .registry import RegistryEntry, get_registry
+from .replay import delete_replay
+from .simulation_engine import SimulationEngine
+from .state_store import StaleStateError, get_state_store
+
+T = TypeVar('T')
+
+logger = logging.getLogger(__name__)
+
+# Nombre de tentatives quand un autre processus a fait avancer la même simulation entre-temps
+MAX_CONFLICT_RETRIES = 5
+
+
+def flush_interval() -> int:
+    return max(1, int(getattr(settings, 'SIMULATION_FLUSH_EVERY', 20)))
+
+
+def replay_path(simulation_id: int) -> Optional[str]:
+    # Journal de la partie (SIMULATION_REPLAY), None si l'enregistrement est désactivé
+    config = getattr(settings, 'SIMULATION_REPLAY', {})
+    if not config.get('ENABLED'):
+        return None
+    return os.path.join(config.get('PATH', os.path.join(settings.BASE_DIR, 'simulation_replays')),
+                        f'{int(simulation_id)}.replay')
+
+
+# Les snapshots sont dépicklés au chargement : chaque blob est précédé d'une signature HMAC-SHA256 (clé dérivée
+# de SECRET_KEY), vérifiée avant pickle.loads. Un accès en écriture au stockage partagé ne suffit pas pour
+# exécuter du code dans les workers
+SIGNATURE_SALT = 'simulation.engines.snapshot'
+SIGNATURE_SIZE = 32
+
+
+def sign_blob(blob: bytes) -> bytes:
+    return salted_hmac(SIGNATURE_SALT, blob, algorithm='sha256').digest() + blob
+
+
+def verify_blob(signed: bytes) -> Optional[bytes]:
+    # Blob d'origine, None si la signature est absente ou invalide
+    signature, blob = signed[:SIGNATURE_SIZE], signed[SIGNATURE_SIZE:]
+    if len(signature) != SIGNATURE_SIZE or \
+            not hmac.compare_digest(signature, salted_hmac(SIGNATURE_SALT, blob, algorithm='sha256').digest()):
+        return None
+    return blob
+
+
+def _needs_flush(engine: SimulationEngine) -> bool:
+    # Le premier tour (is_running), la fin de simulation et un tour sur N sont écrits en base
+    pending = engine.turns_elapsed - engine.flushed_turns
+    if pending <= 0:
+        return False
+    return engine.flushed_turns == 0 or engine.is_finished or pending >= flush_interval()
+
+
+def write_progress(simulation_id: int, engine: SimulationEngine):
+    # Une seule requête UPDATE sur les colonnes de progression (pas de lecture ni de save() complet)
+    is_finished = engine.is_finished
+    Simulation.objects.filter(pk=simulation_id).update(
+        turns_elapsed=engine.turns_elapsed, is_running=not is_finished, is_finished=is_finished,
+        updated_at=timezone.now())
+
+
+def register_engine(simulation_id: int, engine: SimulationEngine) -> RegistryEntry:
+    # Nouveau moteur (création / réinitialisation) : écrase l'état stocké quelle que soit sa version
+    store = get_state_store()
+    blob = sign_blob(engine.snapshot()) if store.persistent else b''
+    while True:
+        try:
+            engine.store_version = store.save(simulation_id, blob, store.version(simulation_id))
+            break
+        except StaleStateError:
+            continue
+    engine.flush_recording()
+    return get_registry().put(simulation_id, engine)
+
+
+def _load(simulation_id: int) -> Optional[RegistryEntry]:
+    loaded = get_state_store().load(simulation_id)
+    if loaded is None:
+        return None
+    version, blob = loaded
+    blob = verify_blob(blob)
+    if blob is None:
+        # Jamais dépicklé : la simulation est traitée comme absente de ce processus
+        logger.error("Signature invalide pour l'état de la simulation %s", simulation_id)
+        return None
+    engine = SimulationEngine.restore(blob)
+    engine.store_version = version
+    return get_registry().put(simulation_id, engine)
+
+
+def get_engine_entry(simulation_id: int, fresh: bool = True) -> Optional[RegistryEntry]:
+    # Registre LRU du processus devant le stockage partagé ; fresh=True vérifie que la copie locale est à jour
+    simulation_id = int(simulation_id)
+    entry = get_registry().get_entry(simulation_id)
+    if entry is None:
+        return _load(simulation_id)
+    if fresh:
+        stored_version = get_state_store().version(simulation_id)
+        if stored_version and stored_version != entry.engine.store_version:
+            return _load(simulation_id)
+    return entry
+
+
+def mutate_engine(simulation_id: int, operation: Callable[[SimulationEngine], T]) -> Optional[T]:
+    # Applique une opération au moteur puis enregistre le snapshot avec contrôle de version optimiste.
+    # En cas de conflit, on recharge l'état le plus récent et on rejoue l'opération. Le résultat n'est renvoyé
+    # qu'une fois l'état enregistré : un tour servi à un client n'est jamais abandonné par un autre worker
+    store = get_state_store()
+    registry = get_registry()
+    for _ in range(MAX_CONFLICT_RETRIES):
+        entry = get_engine_entry(simulation_id, fresh=False)
+        if entry is None:
+            return None
+        with entry.lock:
+            engine = entry.engine
+            if engine.store_version != store.version(simulation_id):
+                registry.remove(simulation_id)
+                continue
+            result = operation(engine)
+            flush = _needs_flush(engine)
+            if flush:
+                # Marqué avant le snapshot pour que les autres workers sachent ce qui est déjà en base
+                engine.flushed_turns = engine.turns_elapsed
+            try:
+                blob = sign_blob(engine.snapshot()) if store.persistent else b''
+                engine.store_version = store.save(simulation_id, blob, engine.store_version)
+            except StaleStateError:
+                registry.remove(simulation_id)
+                continue
+            # Trames du journal écrites seulement pour un état enregistré (pas pour un tour qui sera rejoué)
+            engine.flush_recording()
+            if flush:
+                write_progress(simulation_id, engine)
+        registry.refresh_size(simulation_id)
+        return result
+    raise StaleStateError(simulation_id)
+
+
+def forget_engine(simulation_id: int):
+    get_registry().remove(simulation_id)
+    get_state_store().delete(simulation_id)
+    path = replay_path(simulation_id)
+    if path is not None:
+        delete_replay(path)
@@ -0,0 +1,423 @@
+from heapq import heappush, heappop
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .pathfinding import BlockedCells, Path, PathFinder, Position
+
+# Côté d'un cluster de l'abstraction (cases)
+CLUSTER_SIZE = 16
+# Un passage entre deux clusters plus large que ceci reçoit deux entrées (une à chaque extrémité)
+MAX_ENTRANCE_WIDTH = 6
+# En deçà de cette distance de Manhattan (portée de vue), A* plat est plus rapide que le graphe abstrait, même
+# d'un cluster à l'autre
+FLAT_SEARCH_DISTANCE = CLUSTER_SIZE
+
+Cluster = Tuple[int, int]
+
+_INFINITY = float("inf")
+
+
+class HierarchicalPathFinder:
+    # HPA* : la grille est découpée en clusters ; chaque passage libre entre deux clusters voisins donne des
+    # entrées (paires de cases de part et d'autre de la frontière) qui forment les nœuds d'un graphe abstrait.
+    # Arêtes : 1 entre les deux cases d'une entrée, distance dans le cluster entre les entrées d'un même cluster.
+    # Une recherche longue se fait sur ce graphe puis est raffinée localement avec le PathFinder plat.
+    # Un cluster n'est construit qu'au premier besoin, puis gardé en cache ; quand un obstacle statique change,
+    # seuls son cluster (et le voisin si la case est sur une frontière) sont reconstruits
+
+    def __init__(self, local: PathFinder, cluster_size: int = CLUSTER_SIZE):
+        self.local = local
+        self.width = local.width
+        self.height = local.height
+        self.cluster_size = cluster_size
+        self.edges: Dict[Position, Dict[Position, int]] = {}
+        self.cluster_nodes: Dict[Cluster, Set[Position]] = {}
+        self.borders: Dict[Tuple[Cluster, Cluster], List[Tuple[Position, Position]]] = {}
+        self.node_refs: Dict[Position, int] = {}
+        self.ready: Set[Cluster] = set()
+        # Chemins statiques entre deux entrées d'un même cluster (raffinement)
+        self.segments: Dict[Tuple[Position, Position], List[Position]] = {}
+        self.fields: Dict[Position, "HierarchicalField"] = {}
+        # Incrémenté à chaque changement d'obstacle (les champs se recalculent paresseusement)
+        self.version = 0
+        self.clusters_built = 0
+        self.abstract_expansions = 0
+
+    def cluster_of(self, x: int, y: int) -> Cluster:
+        return x // self.cluster_size, y // self.cluster_size
+
+    def _bounds(self, cluster: Cluster) -> Tuple[int, int, int, int]:
+        x0, y0 = cluster[0] * self.cluster_size, cluster[1] * self.cluster_size
+        return x0, y0, min(x0 + self.cluster_size, self.width), min(y0 + self.cluster_size, self.height)
+
+    def _is_free(self, x: int, y: int) -> bool:
+        return not self.local.static_blocked[x * self.height + y]
+
+    def _neighbor_clusters(self, cluster: Cluster) -> Iterable[Cluster]:
+        cx, cy = cluster
+        last_x = (self.width - 1) // self.cluster_size
+        last_y = (self.height - 1) // self.cluster_size
+        for nx, ny in ((cx - 1, cy), (cx + 1, cy), (cx, cy - 1), (cx, cy + 1)):
+            if 0 <= nx <= last_x and 0 <= ny <= last_y:
+                yield nx, ny
+
+    # Construction paresseuse
+
+    def ensure_cluster(self, cluster: Cluster):
+        if cluster in self.ready:
+            return
+        for neighbor in self._neighbor_clusters(cluster):
+            self._ensure_border(cluster, neighbor)
+        self._build_intra(cluster)
+        self.ready.add(cluster)
+        self.clusters_built += 1
+
+    def _ensure_border(self, a: Cluster, b: Cluster):
+        key = (a, b) if a < b else (b, a)
+        if key in self.borders:
+            return
+        first, second = key
+        x0, y0, x1, y1 = self._bounds(first)
+        if second[0] != first[0]:
+            # Frontière horizontale : dernière ligne x du premier cluster, première du second
+            line = [((x1 - 1, y), (x1, y)) for y in range(y0, y1)]
+        else:
+            line = [((x, y1 - 1), (x, y1)) for x in range(x0, x1)]
+
+        entrances = []
+        run: List[Tuple[Position, Position]] = []
+        for pair in line + [None]:
+            if pair is not None and self._is_free(*pair[0]) and self._is_free(*pair[1]):
+                run.append(pair)
+                continue
+            if run:
+                if len(run) < MAX_ENTRANCE_WIDTH:
+                    entrances.append(run[(len(run) - 1) // 2])
+                else:
+                    entrances += [run[0], run[-1]]
+                run = []
+
+        for p, q in entrances:
+            self._add_node(p, first)
+            self._add_node(q, second)
+            self.edges[p][q] = 1
+            self.edges[q][p] = 1
+        self.borders[key] = entrances
+
+    def _add_node(self, position: Position, cluster: Cluster):
+        self.node_refs[position] = self.node_refs.get(position, 0) + 1
+        self.edges.setdefault(position, {})
+        self.cluster_nodes.setdefault(cluster, set()).add(position)
+
+    def _remove_node_ref(self, position: Position, cluster: Cluster):
+        self.node_refs[position] -= 1
+        if self.node_refs[position] == 0:
+            del self.node_refs[position]
+            for neighbor in self.edges.pop(position, {}):
+                self.edges.get(neighbor, {}).pop(position, None)
+            nodes = self.cluster_nodes.get(cluster)
+            if nodes is not None:
+                nodes.discard(position)
+                if not nodes:
+                    del self.cluster_nodes[cluster]
+
+    def _build_intra(self, cluster: Cluster):
+        nodes = list(self.cluster_nodes.get(cluster, ()))
+        if len(nodes) < 2:
+            return
+        # Masque des cases libres du cluster, lu une fois (les bitsets creux sont coûteux case par case)
+        x0, y0, x1, y1 = self._bounds(cluster)
+        rows, columns = x1 - x0, y1 - y0
+        blocked = self.local.static_blocked
+        if isinstance(blocked, BlockedCells):
+            free = bytearray((~blocked.cells.window(x0, y0, x1, y1)).tobytes())
+        else:
+            free = bytearray(rows * columns)
+            for x in range(x0, x1):
+                row = blocked[x * self.height + y0:x * self.height + y1]
+                free[(x - x0) * columns:(x - x0 + 1) * columns] = bytes(1 - value for value in row)
+        # Voisins libres de chaque case libre, calculés une fois pour tous les parcours du cluster
+        adjacency: List[List[int]] = [[] for _ in range(rows * columns)]
+        for index in range(rows * columns):
+            if not free[index]:
+                continue
+            x, y = divmod(index, columns)
+            if x + 1 < rows and free[index + columns]:
+                adjacency[index].append(index + columns)
+                adjacency[index + columns].append(index)
+            if y + 1 < columns and free[index + 1]:
+                adjacency[index].append(index + 1)
+                adjacency[index + 1].append(index)
+
+        local = [(x - x0) * columns + (y - y0) for x, y in nodes]
+        for index, node in enumerate(nodes):
+            # Arêtes symétriques : un parcours par nœud suffit pour les paires suivantes
+            others = local[index + 1:]
+            if not others:
+                break
+            distances = self._breadth_first(local[index], others, adjacency)
+            for other, other_index in zip(nodes[index + 1:], others):
+                if other_index in distances:
+                    self.edges[node][other] = self.edges[other][node] = distances[other_index]
+
+    @staticmethod
+    def _breadth_first(source: int, targets: List[int], adjacency: List[List[int]]) -> Dict[int, int]:
+        # Parcours en largeur (coûts unitaires) dans un cluster ; s'arrête dès que toutes les cibles sont atteintes
+        wanted = set(targets)
+        remaining = len(wanted)
+        seen = {source: 0}
+        found: Dict[int, int] = {}
+        frontier = [source]
+        cost = 0
+        while frontier and remaining:
+            cost += 1
+            next_frontier = []
+            for index in frontier:
+                for neighbor in adjacency[index]:
+                    if neighbor not in seen:
+                        seen[neighbor] = cost
+                        next_frontier.append(neighbor)
+                        if neighbor in wanted:
+                            found[neighbor] = cost
+                            remaining -= 1
+            frontier = next_frontier
+        return found
+
+    def local_distances(self, sources: Dict[Position, int], cluster: Cluster) -> Dict[Position, int]:
+        # Dijkstra limité au cluster depuis plusieurs sources (coûts initiaux différents) ; une source peut être
+        # une case bloquée (la base), comme dans DistanceField
+        x0, y0, x1, y1 = self._bounds(cluster)
+        distances: Dict[Position, int] = {}
+        frontier = [(cost, position) for position, cost in sources.items()]
+        frontier.sort()
+        while frontier:
+            cost, position = heappop(frontier)
+            if position in distances:
+                continue
+            distances[position] = cost
+            x, y = position
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                if x0 <= nx < x1 and y0 <= ny < y1 and (nx, ny) not in distances and self._is_free(nx, ny):
+                    heappush(frontier, (cost + 1, (nx, ny)))
+        return distances
+
+    # Invalidation incrémentale
+
+    def invalidate(self, x: int, y: int):
+        # Une case change d'état (obstacle posé ou retiré) : on oublie les frontières qui la contiennent et
+        # l'abstraction interne des clusters concernés, reconstruits au prochain besoin
+        cluster = self.cluster_of(x, y)
+        touched = {cluster}
+        x0, y0, x1, y1 = self._bounds(cluster)
+        for neighbor in self._neighbor_clusters(cluster):
+            on_border = ((neighbor[0] < cluster[0] and x == x0) or (neighbor[0] > cluster[0] and x == x1 - 1)
+                         or (neighbor[1] < cluster[1] and y == y0) or (neighbor[1] > cluster[1] and y == y1 - 1))
+            if on_border:
+                self._drop_border(cluster, neighbor)
+                touched.add(neighbor)
+        for touched_cluster in touched:
+            self._drop_intra(touched_cluster)
+        self.version += 1
+
+    def _drop_border(self, a: Cluster, b: Cluster):
+        key = (a, b) if a < b else (b, a)
+        for p, q in self.borders.pop(key, ()):
+            self.edges.get(p, {}).pop(q, None)
+            self.edges.get(q, {}).pop(p, None)
+            self._remove_node_ref(p, key[0])
+            self._remove_node_ref(q, key[1])
+
+    def _drop_intra(self, cluster: Cluster):
+        nodes = self.cluster_nodes.get(cluster, set())
+        for node in nodes:
+            edges = self.edges.get(node, {})
+            for other in [other for other in edges if other in nodes]:
+                del edges[other]
+        self.segments = {key: path for key, path in self.segments.items()
+                         if self.cluster_of(*key[0]) != cluster}
+        self.ready.discard(cluster)
+
+    # Recherche
+
+    def find(self, start: Position, goal: Position, obstacles=()) -> Path:
+        start_cluster = self.cluster_of(*start)
+        goal_cluster = self.cluster_of(*goal)
+        if start_cluster == goal_cluster or \
+                abs(start[0] - goal[0]) + abs(start[1] - goal[1]) <= FLAT_SEARCH_DISTANCE:
+            return self.local.find(start, goal, obstacles)
+
+        self.ensure_cluster(start_cluster)
+        self.ensure_cluster(goal_cluster)
+        # Liens temporaires du départ et du but vers les entrées de leur cluster
+        start_links = self._links(start, start_cluster)
+        goal_links = self._links(goal, goal_cluster)
+        if not start_links or not goal_links:
+            return None
+
+        waypoints = self._abstract_search(start, goal, start_links, goal_links)
+        if waypoints is None:
+            return None
+        return self._refine(start, waypoints, obstacles)
+
+    def _links(self, position: Position, cluster: Cluster) -> Dict[Position, int]:
+        distances = self.local_distances({position: 0}, cluster)
+        return {node: distances[node] for node in self.cluster_nodes.get(cluster, ()) if node in distances}
+
+    def _abstract_search(self, start: Position, goal: Position, start_links: Dict[Position, int],
+                         goal_links: Dict[Position, int]) -> Optional[List[Position]]:
+        goal_x, goal_y = goal
+        cost = {start: 0}
+        came_from: Dict[Position, Position] = {}
+        closed = set()
+        counter = 0
+        # (f, h, ordre d'insertion, nœud) : à f égal, le nœud le plus proche du but d'abord (comme PathFinder)
+        start_h = abs(start[0] - goal_x) + abs(start[1] - goal_y)
+        frontier = [(start_h, start_h, counter, start)]
+        while frontier:
+            _, _, _, current = heappop(frontier)
+            if current in closed:
+                continue
+            closed.add(current)
+            self.abstract_expansions += 1
+            if current == goal:
+                waypoints = []
+                while current != start:
+                    waypoints.append(current)
+                    current = came_from[current]
+                waypoints.reverse()
+                return waypoints
+
+            if current == start:
+                # Le départ peut lui-même être une entrée : ses arêtes abstraites s'ajoutent aux liens
+                neighbors = list(start_links.items()) + list(self.edges.get(start, {}).items())
+            else:
+                self.ensure_cluster(self.cluster_of(*current))
+                neighbors = list(self.edges.get(current, {}).items())
+                if current in goal_links:
+                    neighbors.append((goal, goal_links[current]))
+            for neighbor, step_cost in neighbors:
+                new_cost = cost[current] + step_cost
+                if new_cost >= cost.get(neighbor, _INFINITY):
+                    continue
+                cost[neighbor] = new_cost
+                came_from[neighbor] = current
+                h = abs(neighbor[0] - goal_x) + abs(neighbor[1] - goal_y)
+                counter += 1
+                heappush(frontier, (new_cost + h, h, counter, neighbor))
+        return None
+
+    def _refine(self, start: Position, waypoints: List[Position], obstacles) -> Path:
+        # Le premier tronçon tient compte des obstacles dynamiques (robots) ; les suivants sont statiques et
+        # mis en cache entre deux entrées d'un même cluster
+        path: List[Position] = []
+        current = start
+        for index, waypoint in enumerate(waypoints):
+            if index == 0:
+                segment = self.local.find(current, waypoint, obstacles)
+                if segment is None:
+                    segment = self.local.find(current, waypoint)
+            elif abs(current[0] - waypoint[0]) + abs(current[1] - waypoint[1]) == 1:
+                segment = [waypoint]
+            elif index < len(waypoints) - 1:
+                key = (current, waypoint)
+                segment = self.segments.get(key)
+                if segment is None:
+                    segment = self.local.find(current, waypoint)
+                    if segment is not None:
+                        self.segments[key] = segment
+            else:
+                segment = self.local.find(current, waypoint)
+            if segment is None:
+                return None
+            path.extend(segment)
+            current = waypoint
+        return path
+
+    def field(self, source: Position) -> "HierarchicalField":
+        field = self.fields.get(source)
+        if field is None:
+            field = self.fields[source] = HierarchicalField(self, source)
+        return field
+
+
+class HierarchicalField:
+    # Distances (approchées, à la manière de HPA*) vers une source fixe sur une grande grille à obstacles.
+    # Même interface que DistanceField, sans tableau de la taille de la grille : Dijkstra paresseux sur le graphe
+    # abstrait depuis la source (repris là où il s'était arrêté), puis champ local par cluster depuis ses entrées.
+    # Un changement d'obstacle repart de zéro côté distances ; l'abstraction des clusters reste en cache
+
+    UNREACHABLE = -1
+
+    def __init__(self, hierarchy: HierarchicalPathFinder, source: Position):
+        self.hierarchy = hierarchy
+        self.width = hierarchy.width
+        self.height = hierarchy.height
+        self.source = source
+        self._reset()
+
+    def _reset(self):
+        hierarchy = self.hierarchy
+        self.version = hierarchy.version
+        self.settled: Dict[Position, int] = {}
+        self.cluster_fields: Dict[Cluster, Dict[Position, int]] = {}
+        source_cluster = hierarchy.cluster_of(*self.source)
+        hierarchy.ensure_cluster(source_cluster)
+        links = hierarchy._links(self.source, source_cluster)
+        self.best = dict(links)
+        self.frontier = [(distance, node) for node, distance in links.items()]
+        self.frontier.sort()
+
+    def _check_version(self):
+        if self.version != self.hierarchy.version:
+            self._reset()
+
+    def _settle(self, node: Position) -> int:
+        hierarchy = self.hierarchy
+        settled = self.settled
+        while node not in settled and self.frontier:
+            distance, current = heappop(self.frontier)
+            if current in settled:
+                continue
+            settled[current] = distance
+            hierarchy.ensure_cluster(hierarchy.cluster_of(*current))
+            for neighbor, cost in hierarchy.edges.get(current, {}).items():
+                new_distance = distance + cost
+                if new_distance < self.best.get(neighbor, _INFINITY):
+                    self.best[neighbor] = new_distance
+                    heappush(self.frontier, (new_distance, neighbor))
+        return settled.get(node, self.UNREACHABLE)
+
+    def _cluster_field(self, cluster: Cluster) -> Dict[Position, int]:
+        field = self.cluster_fields.get(cluster)
+        if field is None:
+            hierarchy = self.hierarchy
+            hierarchy.ensure_cluster(cluster)
+            sources = {}
+            for node in hierarchy.cluster_nodes.get(cluster, ()):
+                distance = self._settle(node)
+                if distance >= 0:
+                    sources[node] = distance
+            if hierarchy.cluster_of(*self.source) == cluster:
+                sources[self.source] = 0
+            field = self.cluster_fields[cluster] = hierarchy.local_distances(sources, cluster)
+        return field
+
+    def distance(self, x: int, y: int) -> int:
+        self._check_version()
+        return self._cluster_field(self.hierarchy.cluster_of(x, y)).get((x, y), self.UNREACHABLE)
+
+    def next_step(self, x: int, y: int, obstacles=()) -> Optional[Tuple[int, int]]:
+        best = self.distance(x, y)
+        if best <= 0:
+            return None
+        step = None
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < self.height and (nx, ny) not in obstacles:
+                value = self.distance(nx, ny)
+                if 0 <= value < best:
+                    best = value
+                    step = (dx, dy)
+        return step
+
+    def to_rows(self) -> List[List[int]]:
+        return [[self.distance(x, y) for y in range(self.height)] for x in range(self.width)]
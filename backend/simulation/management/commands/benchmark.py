@@ -0,0 +1,135 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulation import benchmarks
+from simulation.obstacle_maps import load_obstacle_map
+from simulation.simulation_engine import SimulationEngine
+
+SUITES = ("engine", "pathfinding", "perception", "api")
+
+
+def _int_list(value: str):
+    return [int(item) for item in value.split(",") if item]
+
+
+def _float_list(value: str):
+    return [float(item) for item in value.split(",") if item]
+
+
+def _suite_list(value: str):
+    suites = [item for item in value.split(",") if item]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise ValueError(f"suites inconnues : {', '.join(sorted(unknown))}")
+    return suites
+
+
+class Command(BaseCommand):
+    requires_system_checks = []
+    help = ("Mesure les performances du moteur, du pathfinding, de la perception et de l'API "
+            "et écrit les résultats en JSON (comparables entre commits avec --compare)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--suites", type=_suite_list, default=list(SUITES), help="ex : engine,api")
+        parser.add_argument("--quick", action="store_true", help="jeu de paramètres réduit (quelques secondes)")
+        parser.add_argument("--grid-sizes", type=_int_list, default=None, help="ex : 32,64,128")
+        parser.add_argument("--robots", type=_int_list, default=None, help="ex : 4,16,64")
+        parser.add_argument("--densities", type=_float_list, default=None, help="déchets par case, ex : 0.02,0.1")
+        parser.add_argument("--vision", type=_int_list, default=None, help="ex : 3,5,8")
+        parser.add_argument("--steps", type=int, default=None, help="tours mesurés par configuration")
+        parser.add_argument("--storage", choices=SimulationEngine.STORAGES, default="list")
+        parser.add_argument("--step-mode", choices=SimulationEngine.STEP_MODES, default="sequential")
+        parser.add_argument("--clutter", type=_float_list, default=[0.0, 0.3], help="part de cases encombrées")
+        parser.add_argument("--queries", type=int, default=None, help="requêtes a_star par carte")
+        parser.add_argument("--requests", type=int, default=None, help="requêtes HTTP par endpoint")
+        parser.add_argument("--map", default=None, help="carte d'obstacles (texte ou PBM) pour la suite engine")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default=None, help="fichier JSON de sortie (stdout par défaut)")
+        parser.add_argument("--compare", default=None, help="rapport JSON de référence à comparer")
+        parser.add_argument("--threshold", type=float, default=0.1, help="dégradation tolérée (0.1 = 10 %%)")
+
+    def handle(self, *args, **options):
+        if options["step_mode"] == "batch" and options["storage"] != "numpy":
+            raise CommandError("Le mode batch nécessite --storage numpy")
+        quick = options["quick"]
+        grid_sizes = options["grid_sizes"] or ([32] if quick else [32, 64, 128])
+        robots = options["robots"] or ([4, 16] if quick else [4, 16, 64])
+        densities = options["densities"] or ([0.05] if quick else [0.02, 0.1])
+        vision = options["vision"] or ([5] if quick else [3, 5, 8])
+        steps = options["steps"] or (50 if quick else 200)
+        queries = options["queries"] or (50 if quick else 300)
+        requests = options["requests"] or (20 if quick else 100)
+
+        walls = []
+        if options["map"]:
+            try:
+                walls = load_obstacle_map(options["map"])
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Carte illisible : {error}")
+
+        report = {"environment": benchmarks.environment(), "parameters": {
+            "grid_sizes": grid_sizes, "robots": robots, "densities": densities, "vision": vision,
+            "steps": steps, "storage": options["storage"], "step_mode": options["step_mode"],
+            "clutter": options["clutter"], "queries": queries, "requests": requests, "seed": options["seed"],
+            "map": options["map"],
+        }}
+        started = time.perf_counter()
+        for suite in options["suites"]:
+            self.stderr.write(f"Suite {suite}...")
+            suite_started = time.perf_counter()
+            if suite == "engine":
+                report["engine"] = benchmarks.bench_engine(
+                    grid_sizes, robots, densities, vision, steps, seed=options["seed"],
+                    storage=options["storage"], step_mode=options["step_mode"], walls=walls)
+            elif suite == "pathfinding":
+                report["pathfinding"] = benchmarks.bench_pathfinding(
+                    grid_sizes, options["clutter"], queries, seed=options["seed"])
+            elif suite == "perception":
+                report["perception"] = benchmarks.bench_perception(grid_sizes, vision, queries,
+                                                                   seed=options["seed"])
+            elif suite == "api":
+                report["api"] = self._bench_api(robots, requests)
+            self.stderr.write(f"  {time.perf_counter() - suite_started:.1f} s")
+        report["total_wall_time"] = time.perf_counter() - started
+
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Rapport de référence illisible : {error}")
+            rows = benchmarks.compare(baseline, report, options["threshold"])
+            report["comparison"] = {"baseline_commit": baseline.get("environment", {}).get("commit"),
+                                    "threshold": options["threshold"], "rows": rows}
+            regressions = [row for row in rows if row["regression"]]
+            for row in regressions:
+                self.stderr.write(self.style.WARNING(
+                    f"Régression {row['section']} {row['case']} {row['metric']} : "
+                    f"{row['baseline']:.3f} -> {row['current']:.3f} ({row['change']:+.1%})"))
+            if not regressions:
+                self.stderr.write(self.style.SUCCESS(f"Aucune régression sur {len(rows)} mesures"))
+
+        payload = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(payload)
+            self.stderr.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+        else:
+            self.stdout.write(payload)
+
+    def _bench_api(self, robots, requests):
+        # Base de données de test jetable : les mesures ne touchent pas aux simulations existantes
+        from django.test import Client
+        from django.test.utils import setup_test_environment, teardown_test_environment
+        from django.test.runner import DiscoverRunner
+
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        old_config = runner.setup_databases()
+        try:
+            return benchmarks.bench_api(Client(), robots, requests)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
@@ -0,0 +1,33 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulation.scheduler import TickScheduler
+
+
+class Command(BaseCommand):
+    help = ("Fait avancer en tâche de fond les simulations planifiées (processus dédié ; plusieurs processus se "
+            "répartissent les simulations avec --shard / --shards)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="tours exécutés en parallèle")
+        parser.add_argument("--poll-interval", type=float, default=1.0,
+                            help="secondes entre deux lectures des simulations planifiées")
+        parser.add_argument("--max-tick-rate", type=float, default=1000.0)
+        parser.add_argument("--shard", type=int, default=0, help="tranche traitée (identifiant modulo --shards)")
+        parser.add_argument("--shards", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if not 0 <= options["shard"] < options["shards"]:
+            raise CommandError("--shard doit être compris entre 0 et --shards - 1")
+        if options["workers"] < 1 or options["poll_interval"] <= 0:
+            raise CommandError("--workers et --poll-interval doivent être positifs")
+        scheduler = TickScheduler(workers=options["workers"], poll_interval=options["poll_interval"],
+                                  max_tick_rate=options["max_tick_rate"], shard=options["shard"],
+                                  shards=options["shards"])
+        self.stderr.write(f"Planificateur : tranche {options['shard']}/{options['shards']}, "
+                          f"{options['workers']} tours en parallèle (Ctrl+C pour arrêter)")
+        try:
+            asyncio.run(scheduler.run())
+        except KeyboardInterrupt:
+            pass
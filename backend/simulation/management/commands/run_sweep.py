@@ -0,0 +1,80 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulation.simulation_engine import SimulationEngine
+from simulation.sweep import build_configs, run_sweep, summarize
+
+
+def _int_list(value: str):
+    return [int(item) for item in value.split(",") if item]
+
+
+def _base_list(value: str):
+    # Format : "x:y,x:y"
+    bases = []
+    for item in value.split(","):
+        x, y = item.split(":")
+        bases.append((int(x), int(y)))
+    return bases
+
+
+class Command(BaseCommand):
+    requires_system_checks = []
+    help = "Exécute un balayage de paramètres de simulations (sans serveur) sur un pool de processus"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grid-size", type=int, default=32)
+        parser.add_argument("--trash", type=int, default=20)
+        parser.add_argument("--robots", type=_int_list, default=[4], help="ex : 2,4,8")
+        parser.add_argument("--vision", type=_int_list, default=[5], help="ex : 3,5,8")
+        parser.add_argument("--bases", type=_base_list, default=[(0, 0)], help="ex : 0:0,16:16")
+        parser.add_argument("--runs", type=int, default=10, help="nombre de graines par combinaison")
+        parser.add_argument("--seed", type=int, default=0, help="première graine")
+        parser.add_argument("--max-turns", type=int, default=100000)
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--storage", choices=SimulationEngine.STORAGES, default="list")
+        parser.add_argument("--step-mode", choices=SimulationEngine.STEP_MODES, default="sequential")
+        parser.add_argument("--output", default=None, help="fichier JSON de sortie (stdout par défaut)")
+        parser.add_argument("--include-runs", action="store_true", help="inclure le détail de chaque run")
+
+    def handle(self, *args, **options):
+        grid_size = options["grid_size"]
+        for x, y in options["bases"]:
+            if not (0 <= x < grid_size and 0 <= y < grid_size):
+                raise CommandError(f"Base ({x}, {y}) hors de la grille")
+        if options["step_mode"] == "batch" and options["storage"] != "numpy":
+            raise CommandError("Le mode batch nécessite --storage numpy")
+
+        configs = build_configs(
+            grid_size=grid_size,
+            num_trash=options["trash"],
+            robots=options["robots"],
+            vision_radii=options["vision"],
+            bases=options["bases"],
+            runs=options["runs"],
+            seed=options["seed"],
+            max_turns=options["max_turns"],
+            storage=options["storage"],
+            step_mode=options["step_mode"],
+        )
+        self.stderr.write(f"{len(configs)} simulations à exécuter...")
+        started = time.perf_counter()
+        results = run_sweep(configs, workers=options["workers"])
+
+        report = {
+            "total_runs": len(results),
+            "total_wall_time": time.perf_counter() - started,
+            "summary": summarize(results),
+        }
+        if options["include_runs"]:
+            report["runs"] = results
+
+        payload = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(payload)
+            self.stderr.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+        else:
+            self.stdout.write(payload)
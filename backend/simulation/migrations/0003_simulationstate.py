@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulation', '0002_simulation_seed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimulationState',
+            fields=[
+                ('simulation', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='engine_state', serialize=False, to='simulation.simulation')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('blob', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
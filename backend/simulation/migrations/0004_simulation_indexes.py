@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulation', '0003_simulationstate'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='simulation',
+            options={'get_latest_by': 'created_at'},
+        ),
+        migrations.AddIndex(
+            model_name='simulation',
+            index=models.Index(fields=['-created_at'], name='simulation_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='simulation',
+            index=models.Index(fields=['is_running', 'is_finished'], name='simulation_running_idx'),
+        ),
+    ]
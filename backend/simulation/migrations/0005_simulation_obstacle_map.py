@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulation', '0004_simulation_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name='obstacle_map',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
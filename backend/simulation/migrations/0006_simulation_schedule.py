@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulation', '0005_simulation_obstacle_map'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulation',
+            name='scheduled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='simulation',
+            name='tick_rate',
+            field=models.FloatField(default=10),
+        ),
+        migrations.AddIndex(
+            model_name='simulation',
+            index=models.Index(fields=['scheduled', 'is_finished'], name='simulation_scheduled_idx'),
+        ),
+    ]
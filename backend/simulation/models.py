@@ -8,11 +8,40 @@ class Simulation(models.Model):
     grid_size = models.IntegerField(default=32)
     base_x = models.IntegerField(default=0)
     base_y = models.IntegerField(default=0)
+    # Graine du générateur du moteur (None : tirage aléatoire)
+    seed = models.BigIntegerField(null=True, blank=True)
+    # Carte des obstacles statiques au format texte ("#" = obstacle, une ligne par x), vide = aucune
+    obstacle_map = models.TextField(blank=True, default='')
     turns_elapsed = models.IntegerField(default=0)
+    # Avance en tâche de fond par le planificateur (scheduler.py), à tick_rate tours par seconde
+    scheduled = models.BooleanField(default=False)
+    tick_rate = models.FloatField(default=10)
     is_running = models.BooleanField(default=False)
     is_finished = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        get_latest_by = 'created_at'
+        indexes = [
+            # Simulation la plus récente (latest()) et simulations en cours (planificateur, listes)
+            models.Index(fields=['-created_at'], name='simulation_created_idx'),
+            models.Index(fields=['is_running', 'is_finished'], name='simulation_running_idx'),
+            # Simulations que le planificateur doit faire avancer
+            models.Index(fields=['scheduled', 'is_finished'], name='simulation_scheduled_idx'),
+        ]
+
+    def __str__(self):
+        return f"Simulation {self.id} - {self.num_robots} robots, {self.num_trash} déchets"
+
+
+class SimulationState(models.Model):
+    # Dernier snapshot du moteur, versionné pour le contrôle de concurrence optimiste
+    simulation = models.OneToOneField(Simulation, on_delete=models.CASCADE, primary_key=True,
+                                      related_name='engine_state')
+    version = models.PositiveIntegerField(default=0)
+    blob = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"Simulation {self.id} - {self.num_robots} robots, {self.num_trash} déchets"
\ No newline at end of file
+        return f"État de la simulation {self.simulation_id} (v{self.version})"
@@ -0,0 +1,91 @@
+from typing import List, Tuple
+
+Position = Tuple[int, int]
+
+# Caractère des obstacles dans le format texte (les autres caractères sont des cases libres)
+WALL = "#"
+
+
+def parse_obstacle_map(text: str) -> List[Position]:
+    # Format texte : une ligne par valeur de x, un caractère par valeur de y (même orientation que la grille
+    # renvoyée par l'API), "#" = obstacle. Les images PBM en texte (P1, 1 = obstacle) sont aussi acceptées
+    if text.lstrip().startswith("P1"):
+        return _parse_plain_pbm(text)
+    walls = []
+    for x, line in enumerate(text.splitlines()):
+        for y, char in enumerate(line):
+            if char == WALL:
+                walls.append((x, y))
+    return walls
+
+
+def map_size(text: str) -> Tuple[int, int]:
+    # Dimensions (lignes, colonnes) couvertes par la carte
+    if text.lstrip().startswith("P1"):
+        width, height, _ = _pbm_header(_pbm_tokens(text))
+        return height, width
+    lines = text.splitlines()
+    return len(lines), max((len(line) for line in lines), default=0)
+
+
+def load_obstacle_map(path: str) -> List[Position]:
+    # Fichier texte ou image PBM (P1 texte, P4 binaire), par exemple exportée depuis un plan d'entrepôt
+    with open(path, "rb") as map_file:
+        data = map_file.read()
+    if data.startswith(b"P4"):
+        return _parse_raw_pbm(data)
+    return parse_obstacle_map(data.decode("utf-8"))
+
+
+def _pbm_tokens(text: str) -> List[str]:
+    tokens = []
+    for line in text.splitlines():
+        tokens += line.split("#", 1)[0].split()
+    return tokens
+
+
+def _pbm_header(tokens: List[str]) -> Tuple[int, int, List[str]]:
+    try:
+        width, height = int(tokens[1]), int(tokens[2])
+    except (IndexError, ValueError):
+        raise ValueError("En-tête PBM invalide")
+    return width, height, tokens[3:]
+
+
+def _parse_plain_pbm(text: str) -> List[Position]:
+    width, height, body = _pbm_header(_pbm_tokens(text))
+    # Les pixels peuvent être collés ("0110") ou séparés par des espaces
+    pixels = "".join(body)
+    if len(pixels) < width * height or set(pixels) - {"0", "1"}:
+        raise ValueError("Pixels PBM invalides")
+    # Ligne d'image = x, colonne = y
+    return [divmod(index, width) for index in range(width * height) if pixels[index] == "1"]
+
+
+def _parse_raw_pbm(data: bytes) -> List[Position]:
+    # P4 : en-tête texte puis une ligne de bits par ligne d'image, complétée à l'octet
+    fields = []
+    position = 2
+    while len(fields) < 2:
+        while data[position:position + 1].isspace():
+            position += 1
+        if data[position:position + 1] == b"#":
+            position = data.index(b"\n", position)
+            continue
+        start = position
+        while not data[position:position + 1].isspace():
+            position += 1
+        fields.append(int(data[start:position]))
+    width, height = fields
+    position += 1
+    row_bytes = (width + 7) // 8
+    pixels = data[position:position + row_bytes * height]
+    if len(pixels) < row_bytes * height:
+        raise ValueError("Image PBM tronquée")
+    walls = []
+    for x in range(height):
+        row = pixels[x * row_bytes:(x + 1) * row_bytes]
+        for y in range(width):
+            if row[y >> 3] & (0x80 >> (y & 7)):
+                walls.append((x, y))
+    return walls
@@ -0,0 +1,365 @@
+import threading
+from array import array
+from collections import OrderedDict, deque
+from heapq import heappush, heappop
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .world import ChunkedBitset
+
+Position = Tuple[int, int]
+Path = Optional[List[Position]]
+
+
+class PathFinder:
+    # A* sur indices plats (x * height + y) avec tampons réutilisés d'une recherche à l'autre :
+    # un numéro de génération évite de remettre à zéro les tableaux à chaque appel
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        size = width * height
+        # Cases bloquées en permanence (base, obstacles statiques)
+        self.static_blocked = bytearray(size)
+        self.cost = array('i', bytes(4 * size))
+        self.came_from = array('i', bytes(4 * size))
+        self.seen = array('I', bytes(4 * size))
+        self.closed = array('I', bytes(4 * size))
+        self.generation = 0
+        # Nombre total de nœuds développés (pour le profilage)
+        self.expansions = 0
+
+    def set_blocked(self, x: int, y: int, blocked: bool = True):
+        self.static_blocked[x * self.height + y] = 1 if blocked else 0
+
+    def _next_generation(self) -> int:
+        self.generation += 1
+        if self.generation >= 0xFFFFFFFF:
+            # Débordement du compteur : on remet les marqueurs à zéro une fois
+            size = self.width * self.height
+            self.seen = array('I', bytes(4 * size))
+            self.closed = array('I', bytes(4 * size))
+            self.generation = 1
+        return self.generation
+
+    def find(self, start: Position, goal: Position, obstacles=()) -> Path:
+        width, height = self.width, self.height
+        start_index = start[0] * height + start[1]
+        goal_index = goal[0] * height + goal[1]
+        goal_x, goal_y = goal
+        if start_index == goal_index:
+            return []
+
+        generation = self._next_generation()
+        cost, came_from, seen, closed = self.cost, self.came_from, self.seen, self.closed
+        blocked = self.static_blocked
+
+        seen[start_index] = generation
+        cost[start_index] = 0
+        came_from[start_index] = -1
+        # (f, h, ordre d'insertion, indice) : à f égal on préfère le nœud le plus proche du but
+        counter = 0
+        start_h = abs(start[0] - goal_x) + abs(start[1] - goal_y)
+        frontier = [(start_h, start_h, counter, start_index)]
+        expansions = 0
+        found = False
+
+        while frontier:
+            _, _, _, current = heappop(frontier)
+            if closed[current] == generation:
+                continue
+            closed[current] = generation
+            expansions += 1
+            if current == goal_index:
+                found = True
+                break
+
+            x, y = divmod(current, height)
+            new_cost = cost[current] + 1
+            # Même ordre de voisins que la version d'origine : (-1,0), (1,0), (0,-1), (0,1)
+            for nx, ny, neighbor in ((x - 1, y, current - height), (x + 1, y, current + height),
+                                     (x, y - 1, current - 1), (x, y + 1, current + 1)):
+                if nx < 0 or nx >= width or ny < 0 or ny >= height:
+                    continue
+                if (blocked[neighbor] and neighbor != goal_index) or (nx, ny) in obstacles:
+                    continue
+                if seen[neighbor] == generation and new_cost >= cost[neighbor]:
+                    continue
+                seen[neighbor] = generation
+                cost[neighbor] = new_cost
+                came_from[neighbor] = current
+                h = abs(nx - goal_x) + abs(ny - goal_y)
+                counter += 1
+                heappush(frontier, (new_cost + h, h, counter, neighbor))
+
+        self.expansions += expansions
+        if not found:
+            return None  # Pas de chemin
+
+        # Reconstituer le chemin
+        path = []
+        current = goal_index
+        while current != start_index:
+            path.append(divmod(current, height))
+            current = came_from[current]
+        path.reverse()
+        return path
+
+
+class BlockedCells:
+    # Cases bloquées d'une grande grille, indexables comme le masque bytearray (static_blocked[indice]) ;
+    # un bit par case, par blocs alloués à la demande (murs compris)
+    __slots__ = ("height", "cells")
+
+    def __init__(self, width: int, height: int):
+        self.height = height
+        self.cells = ChunkedBitset(max(width, height))
+
+    def __getitem__(self, index: int) -> bool:
+        return divmod(index, self.height) in self.cells
+
+    def __setitem__(self, index: int, blocked: bool):
+        self.cells[divmod(index, self.height)] = blocked
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+
+class SparsePathFinder(PathFinder):
+    # A* pour les très grandes grilles : coûts et parents dans des dictionnaires limités aux nœuds visités,
+    # aucun tampon proportionnel au nombre de cases
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.static_blocked = BlockedCells(width, height)
+        self.expansions = 0
+
+    def find(self, start: Position, goal: Position, obstacles=()) -> Path:
+        width, height = self.width, self.height
+        start_index = start[0] * height + start[1]
+        goal_index = goal[0] * height + goal[1]
+        goal_x, goal_y = goal
+        if start_index == goal_index:
+            return []
+
+        blocked = self.static_blocked
+        cost = {start_index: 0}
+        came_from = {start_index: -1}
+        closed = set()
+        counter = 0
+        start_h = abs(start[0] - goal_x) + abs(start[1] - goal_y)
+        frontier = [(start_h, start_h, counter, start_index)]
+        expansions = 0
+        found = False
+
+        while frontier:
+            _, _, _, current = heappop(frontier)
+            if current in closed:
+                continue
+            closed.add(current)
+            expansions += 1
+            if current == goal_index:
+                found = True
+                break
+
+            x, y = divmod(current, height)
+            new_cost = cost[current] + 1
+            for nx, ny, neighbor in ((x - 1, y, current - height), (x + 1, y, current + height),
+                                     (x, y - 1, current - 1), (x, y + 1, current + 1)):
+                if nx < 0 or nx >= width or ny < 0 or ny >= height:
+                    continue
+                if (blocked[neighbor] and neighbor != goal_index) or (nx, ny) in obstacles:
+                    continue
+                if new_cost >= cost.get(neighbor, new_cost + 1):
+                    continue
+                cost[neighbor] = new_cost
+                came_from[neighbor] = current
+                h = abs(nx - goal_x) + abs(ny - goal_y)
+                counter += 1
+                heappush(frontier, (new_cost + h, h, counter, neighbor))
+
+        self.expansions += expansions
+        if not found:
+            return None
+
+        path = []
+        current = goal_index
+        while current != start_index:
+            path.append(divmod(current, height))
+            current = came_from[current]
+        path.reverse()
+        return path
+
+
+def make_pathfinder(width: int, height: int, sparse: bool = False) -> PathFinder:
+    return SparsePathFinder(width, height) if sparse else PathFinder(width, height)
+
+
+class DistanceField:
+    # Distances BFS depuis une source fixe (la base) : un robot la redescend en O(1) par pas.
+    # Recalculé uniquement quand les obstacles statiques changent ; -1 = case inaccessible
+
+    UNREACHABLE = -1
+
+    def __init__(self, width: int, height: int, source: Position, static_blocked: bytearray):
+        self.width = width
+        self.height = height
+        self.source = source
+        self.distances = array('i', [self.UNREACHABLE]) * (width * height)
+        self._compute(static_blocked)
+
+    def _compute(self, static_blocked: bytearray):
+        width, height = self.width, self.height
+        distances = self.distances
+        source_index = self.source[0] * height + self.source[1]
+        distances[source_index] = 0
+        queue = deque([source_index])
+        while queue:
+            current = queue.popleft()
+            x, y = divmod(current, height)
+            next_distance = distances[current] + 1
+            for nx, ny, neighbor in ((x - 1, y, current - height), (x + 1, y, current + height),
+                                     (x, y - 1, current - 1), (x, y + 1, current + 1)):
+                if 0 <= nx < width and 0 <= ny < height and distances[neighbor] == self.UNREACHABLE \
+                        and not static_blocked[neighbor]:
+                    distances[neighbor] = next_distance
+                    queue.append(neighbor)
+
+    def distance(self, x: int, y: int) -> int:
+        return self.distances[x * self.height + y]
+
+    def next_step(self, x: int, y: int, obstacles=()) -> Optional[Tuple[int, int]]:
+        # Meilleur pas (dx, dy) vers la source parmi les voisins libres, None si aucun ne rapproche
+        height = self.height
+        distances = self.distances
+        best = distances[x * height + y]
+        if best <= 0:
+            return None
+        step = None
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < height and (nx, ny) not in obstacles:
+                value = distances[nx * height + ny]
+                if 0 <= value < best:
+                    best = value
+                    step = (dx, dy)
+        return step
+
+    def to_rows(self) -> List[List[int]]:
+        height = self.height
+        return [self.distances[x * height:(x + 1) * height].tolist() for x in range(self.width)]
+
+
+class ManhattanField:
+    # Champ de distances sans obstacle statique autre que la source : distance de Manhattan calculée à la
+    # demande (rien d'alloué, même sur une très grande grille). Même interface et même choix de pas que
+    # DistanceField
+
+    UNREACHABLE = DistanceField.UNREACHABLE
+
+    def __init__(self, width: int, height: int, source: Position):
+        self.width = width
+        self.height = height
+        self.source = source
+
+    def distance(self, x: int, y: int) -> int:
+        return abs(x - self.source[0]) + abs(y - self.source[1])
+
+    def next_step(self, x: int, y: int, obstacles=()) -> Optional[Tuple[int, int]]:
+        best = self.distance(x, y)
+        if best <= 0:
+            return None
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < self.height and (nx, ny) not in obstacles \
+                    and self.distance(nx, ny) < best:
+                return dx, dy
+        return None
+
+    def to_rows(self) -> List[List[int]]:
+        rows = np.abs(np.arange(self.width) - self.source[0])[:, None] + \
+            np.abs(np.arange(self.height) - self.source[1])[None, :]
+        return rows.tolist()
+
+
+class PathCache:
+    # Chemins calculés sur les obstacles statiques seulement (murs, base), un par but, valables tant que la
+    # version des obstacles statiques ne change pas. Un robot qui suit son chemin le retrouve aux tours suivants
+    # (suffixe depuis sa position) ; les robots sont vérifiés par l'appelant (voir SimulationEngine.find_path).
+    # Les buts les moins récemment utilisés sont oubliés au-delà de max_paths
+
+    def __init__(self, max_paths: int = 256):
+        # but -> (version, cases depuis le départ d'origine, indice de chaque case, chemin trouvé)
+        self.paths: "OrderedDict[Position, Tuple[int, List[Position], Dict[Position, int], bool]]" = OrderedDict()
+        self.max_paths = max_paths
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def get(self, start: Position, goal: Position, version: int) -> Tuple[bool, Path]:
+        entry = self.paths.get(goal)
+        if entry is not None and entry[0] == version:
+            index = entry[2].get(start)
+            if index is not None:
+                self.hits += 1
+                self.paths.move_to_end(goal)
+                return True, entry[1][index + 1:] if entry[3] else None
+        self.misses += 1
+        return False, None
+
+    def put(self, start: Position, goal: Position, version: int, path: Path):
+        cells = [start] + (path or [])
+        self.paths[goal] = (version, cells, {cell: index for index, cell in enumerate(cells)}, path is not None)
+        self.paths.move_to_end(goal)
+        if len(self.paths) > self.max_paths:
+            self.paths.popitem(last=False)
+
+    def discard(self, goal: Position):
+        self.paths.pop(goal, None)
+
+    def to_state(self) -> List[Tuple[Position, int, List[Position], bool]]:
+        # Contenu du cache pour un snapshot (une reprise doit rejouer les mêmes chemins)
+        return [(goal, version, cells, found) for goal, (version, cells, _, found) in self.paths.items()]
+
+    def load_state(self, state: List[Tuple[Position, int, List[Position], bool]]):
+        for goal, version, cells, found in state:
+            self.paths[goal] = (version, cells, {cell: index for index, cell in enumerate(cells)}, found)
+
+
+class GridWalls:
+    # Obstacles vus par a_star : murs ("#") lus sur la grille de chaînes à la demande (pas de parcours complet),
+    # puis obstacles dynamiques
+
+    __slots__ = ("grid", "obstacles")
+
+    def __init__(self, grid, obstacles):
+        self.grid = grid
+        self.obstacles = obstacles
+
+    def __contains__(self, position: Position) -> bool:
+        return self.grid[position[0]][position[1]] == "#" or position in self.obstacles
+
+
+# Tampons de recherche propres à chaque thread : (largeur, hauteur) -> (PathFinder, base marquée bloquée)
+_local = threading.local()
+
+
+def a_star(start, goal, grid, obstacles, base: Position):
+    # Interface historique (grille de chaînes) : la base, sauf comme but, et les murs sont infranchissables
+    width, height = len(grid), len(grid[0])
+    finders = getattr(_local, "finders", None)
+    if finders is None:
+        finders = _local.finders = {}
+    finder, blocked_base = finders.get((width, height), (None, None))
+    if finder is None:
+        finder = PathFinder(width, height)
+    if blocked_base != base:
+        if blocked_base is not None:
+            finder.set_blocked(*blocked_base, False)
+        finder.set_blocked(*base)
+        finders[(width, height)] = (finder, base)
+    return finder.find(start, goal, GridWalls(grid, obstacles))
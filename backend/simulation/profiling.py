@@ -0,0 +1,158 @@
+import copy
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+# Phases d'un tour du moteur
+PHASES = ("perception", "decision", "pathfinding", "movement", "bookkeeping")
+
+# Bornes supérieures des seaux d'histogramme (secondes), à la manière de Prometheus
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0)
+
+COUNTERS = ("astar_searches", "astar_expansions", "path_cache_hits", "path_cache_misses", "blocked_moves",
+            "moves", "pickups", "deposits", "deadlocks")
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        # Un compteur par seau, plus le seau +Inf
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        running = 0
+        rows = []
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            running += count
+            rows.append(("+Inf" if bound == float("inf") else repr(bound), running))
+        return rows
+
+    def to_dict(self) -> Dict:
+        return {"count": self.count, "sum_seconds": self.total,
+                "buckets": {bound: count for bound, count in self.cumulative()}}
+
+
+class TickProfiler:
+    # Instrumentation optionnelle de SimulationEngine.step : temps cumulés et histogrammes par phase
+    # (et par tour), compteurs d'expansions A* et de déplacements bloqués. Désactivé, le moteur n'en a pas
+
+    def __init__(self):
+        self.ticks = 0
+        self.phase_seconds = {phase: 0.0 for phase in PHASES}
+        self.phase_histograms = {phase: Histogram() for phase in PHASES}
+        self.tick_histogram = Histogram()
+        self.counters = {name: 0 for name in COUNTERS}
+        # Durées du tour en cours, versées dans les histogrammes à la fin du tour
+        self._current = {phase: 0.0 for phase in PHASES}
+
+    def add(self, phase: str, seconds: float):
+        self._current[phase] += seconds
+
+    def current(self, phase: str) -> float:
+        return self._current[phase]
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    def end_tick(self, seconds: float):
+        self.ticks += 1
+        self.tick_histogram.observe(seconds)
+        for phase, value in self._current.items():
+            self.phase_seconds[phase] += value
+            self.phase_histograms[phase].observe(value)
+            self._current[phase] = 0.0
+
+    def to_dict(self) -> Dict:
+        total = sum(self.phase_seconds.values())
+        return {
+            "ticks": self.ticks,
+            "tick": self.tick_histogram.to_dict(),
+            "phases": {
+                phase: {
+                    "seconds": self.phase_seconds[phase],
+                    "share": self.phase_seconds[phase] / total if total else 0.0,
+                    "mean_ms": self.phase_seconds[phase] / self.ticks * 1000 if self.ticks else 0.0,
+                    "histogram": self.phase_histograms[phase].to_dict(),
+                }
+                for phase in PHASES
+            },
+            "counters": dict(self.counters),
+        }
+
+
+def _labels(labels: Dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def _merge(labels: Dict, **extra) -> Dict:
+    return {**labels, **extra}
+
+
+def engine_sample(engine) -> Dict:
+    # Valeurs lues sous le verrou du moteur, rendues ensuite sans le bloquer
+    return {
+        "walle_turns_total": engine.turns_elapsed,
+        "walle_state_version": engine.version,
+        "walle_trash_remaining": engine.num_trash - engine.deposited_trash,
+        "walle_robots": engine.num_robots,
+        "walle_explored_ratio": engine.get_coverage()["ratio"],
+        "walle_astar_expansions_total": engine.pathfinder.expansions,
+        "walle_path_cache_hits_total": engine.path_cache.hits,
+        "walle_path_cache_misses_total": engine.path_cache.misses,
+        "profiler": copy.deepcopy(engine.profiler),
+    }
+
+
+ENGINE_METRICS = (
+    ("walle_turns_total", "counter", "Tours simulés"),
+    ("walle_state_version", "gauge", "Version de l'état du moteur"),
+    ("walle_trash_remaining", "gauge", "Déchets restant à déposer"),
+    ("walle_robots", "gauge", "Nombre de robots"),
+    ("walle_explored_ratio", "gauge", "Part de la grille explorée"),
+    ("walle_astar_expansions_total", "counter", "Noeuds développés par A*"),
+    ("walle_path_cache_hits_total", "counter", "Chemins servis par le cache"),
+    ("walle_path_cache_misses_total", "counter", "Chemins calculés"),
+)
+
+
+def prometheus_text(samples: Iterable[Tuple[Dict, Dict]], gauges: Iterable[Tuple[str, str, float]] = ()) -> str:
+    # Format d'exposition texte de Prometheus (version 0.0.4) ; samples : (étiquettes, engine_sample(...))
+    lines = []
+    for name, help_text, value in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+
+    samples = list(samples)
+    for name, kind, help_text in ENGINE_METRICS:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{_labels(labels)} {sample[name]}" for labels, sample in samples]
+
+    profiled = [(labels, sample["profiler"]) for labels, sample in samples if sample["profiler"] is not None]
+    if profiled:
+        lines += ["# HELP walle_profiled_ticks_total Tours instrumentés", "# TYPE walle_profiled_ticks_total counter"]
+        lines += [f"walle_profiled_ticks_total{_labels(labels)} {profiler.ticks}" for labels, profiler in profiled]
+        for counter in COUNTERS:
+            name = f"walle_{counter}_profiled_total"
+            lines += [f"# HELP {name} Compteur {counter} (tours instrumentés)", f"# TYPE {name} counter"]
+            lines += [f"{name}{_labels(labels)} {profiler.counters[counter]}" for labels, profiler in profiled]
+
+        name = "walle_phase_seconds"
+        lines += [f"# HELP {name} Durée par tour de chaque phase", f"# TYPE {name} histogram"]
+        for labels, profiler in profiled:
+            series = [(_merge(labels, phase=phase), profiler.phase_histograms[phase]) for phase in PHASES]
+            series.append((_merge(labels, phase="tick"), profiler.tick_histogram))
+            for series_labels, histogram in series:
+                for bound, count in histogram.cumulative():
+                    lines.append(f"{name}_bucket{_labels(_merge(series_labels, le=bound))} {count}")
+                lines.append(f"{name}_sum{_labels(series_labels)} {histogram.total}")
+                lines.append(f"{name}_count{_labels(series_labels)} {histogram.count}")
+    return "\n".join(lines) + "\n"
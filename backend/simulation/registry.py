@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+
+
+class RegistryEntry:
+    __slots__ = ("engine", "lock", "last_access", "size")
+
+    def __init__(self, engine, size: int):
+        self.engine = engine
+        # Sérialise les pas concurrents sur une même simulation
+        self.lock = threading.RLock()
+        self.last_access = time.monotonic()
+        self.size = size
+
+
+class EngineRegistry:
+    # Moteurs en mémoire indexés par Simulation.id, avec éviction LRU, TTL d'inactivité et budget mémoire
+
+    def __init__(self, max_engines: int = 64, idle_ttl: float = 1800.0, memory_budget: int = 512 * 1024 * 1024):
+        self.max_engines = max_engines
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self._entries: "OrderedDict[int, RegistryEntry]" = OrderedDict()
+        self._memory = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, simulation_id: int) -> bool:
+        return int(simulation_id) in self._entries
+
+    @property
+    def memory_used(self) -> int:
+        return self._memory
+
+    def get_entry(self, simulation_id: int) -> Optional[RegistryEntry]:
+        simulation_id = int(simulation_id)
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(simulation_id)
+            if entry is None:
+                return None
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(simulation_id)
+            return entry
+
+    def items(self):
+        # Copie des entrées (id, entrée) présentes dans ce processus, sans toucher à l'ordre LRU
+        with self._lock:
+            return list(self._entries.items())
+
+    def get(self, simulation_id: int):
+        entry = self.get_entry(simulation_id)
+        return entry.engine if entry is not None else None
+
+    def put(self, simulation_id: int, engine) -> RegistryEntry:
+        simulation_id = int(simulation_id)
+        entry = RegistryEntry(engine, engine.estimate_memory())
+        with self._lock:
+            self._discard(simulation_id)
+            self._entries[simulation_id] = entry
+            self._memory += entry.size
+            self._evict(time.monotonic(), keep=simulation_id)
+        return entry
+
+    def remove(self, simulation_id: int):
+        with self._lock:
+            self._discard(int(simulation_id))
+
+    def refresh_size(self, simulation_id: int):
+        # À appeler quand un moteur change notablement de taille (ex : nouvelle carte d'obstacles)
+        with self._lock:
+            entry = self._entries.get(int(simulation_id))
+            if entry is not None:
+                new_size = entry.engine.estimate_memory()
+                self._memory += new_size - entry.size
+                entry.size = new_size
+                self._evict(time.monotonic(), keep=int(simulation_id))
+
+    def _discard(self, simulation_id: int):
+        entry = self._entries.pop(simulation_id, None)
+        if entry is not None:
+            self._memory -= entry.size
+
+    def _expire(self, now: float):
+        # Les entrées sont ordonnées par dernier accès : on s'arrête à la première encore active
+        while self._entries:
+            simulation_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_access <= self.idle_ttl:
+                break
+            self._discard(simulation_id)
+
+    def _evict(self, now: float, keep: int):
+        self._expire(now)
+        while self._entries and (len(self._entries) > self.max_engines or self._memory > self.memory_budget):
+            simulation_id = next(iter(self._entries))
+            if simulation_id == keep:
+                # Le moteur qu'on vient d'ajouter n'est jamais évincé, même s'il dépasse seul le budget
+                break
+            self._discard(simulation_id)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> EngineRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                config = getattr(settings, 'SIMULATION_REGISTRY', {})
+                _registry = EngineRegistry(
+                    max_engines=config.get('MAX_ENGINES', 64),
+                    idle_ttl=config.get('IDLE_TTL', 1800),
+                    memory_budget=config.get('MEMORY_BUDGET', 512 * 1024 * 1024),
+                )
+    return _registry
@@ -0,0 +1,36 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+from .codec import encode_json, encode_keyframe, packed_from_grid_state
+
+
+class BinaryStateRenderer(BaseRenderer):
+    # Sélectionné par "Accept: application/x-walle-state" (ou ?format=bin)
+    media_type = 'application/x-walle-state'
+    format = 'bin'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, (bytes, bytearray)):
+            # Déjà encodé par la vue (sous le verrou du moteur)
+            return bytes(data)
+        if isinstance(data, dict) and "grid" in data and "robots" in data:
+            return encode_keyframe(packed_from_grid_state(data))
+        return encode_json(data)
+
+
+class PrometheusTextRenderer(BaseRenderer):
+    # Format d'exposition texte de Prometheus (la vue fournit déjà le texte)
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        # Erreurs de l'API : renvoyées en JSON brut dans le corps texte
+        return json.dumps(data).encode(self.charset)
@@ -0,0 +1,245 @@
+import mmap
+import os
+import struct
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .codec import decode_frame, encode_keyframe
+
+# Journal d'une partie : en-tête (magic, version du format, taille de grille) puis trames WALE (voir codec.py)
+# compressées, ajoutées à la suite. L'index compagnon (<journal>.idx) décrit une trame par entrée, par version
+# croissante : seules les trames qu'il référence font partie de la partie
+LOG_HEADER = struct.Struct('<8sII')
+LOG_MAGIC = b'WALEPLAY'
+LOG_FORMAT = 1
+# keyframe : numéro de la dernière image complète à partir de laquelle la trame se reconstitue
+INDEX_DTYPE = np.dtype([('version', '<u8'), ('turns', '<u8'), ('offset', '<u8'), ('length', '<u4'),
+                        ('keyframe', '<u4')])
+
+# Une image complète toutes les KEYFRAME_EVERY trames : aller à un tour coûte au plus autant de deltas
+KEYFRAME_EVERY = 128
+# Octets en attente au-delà desquels le moteur écrit sans attendre l'enregistrement de son état (longs advance)
+PENDING_LIMIT = 4 * 1024 * 1024
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _replace(path: str, data: bytes):
+    # Remplacement atomique, jamais de troncature : un lecteur qui a projeté l'ancien fichier le garde intact
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as handle:
+        handle.write(data)
+    os.replace(temporary, path)
+
+
+def _read_index(path: str) -> np.ndarray:
+    count = _size(path) // INDEX_DTYPE.itemsize
+    if not count:
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    return np.fromfile(path, dtype=INDEX_DTYPE, count=count)
+
+
+@contextmanager
+def _locked(path: str):
+    # Verrou exclusif inter-processus (flock) sur un fichier compagnon
+    import fcntl
+    with open(path, 'a+b') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def delete_replay(path: str):
+    for name in (path, path + '.idx', path + '.lock'):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+class ReplayRecorder:
+    # Côté moteur : la trame de chaque version est compressée et mise en attente, puis ajoutée au journal par
+    # flush() une fois l'état du moteur enregistré. Un tour rejoué après un conflit n'est donc écrit qu'une fois
+
+    def __init__(self, path: str, grid_size: int, keyframe_every: int = KEYFRAME_EVERY):
+        self.path = path
+        self.grid_size = grid_size
+        self.keyframe_every = max(1, keyframe_every)
+        # (version, tours écoulés, image complète ?, trame compressée)
+        self.pending: List[Tuple[int, int, bool, bytes]] = []
+        self.pending_bytes = 0
+        # Trames écrites depuis la dernière image complète (None : la prochaine trame doit en être une)
+        self.since_keyframe: Optional[int] = None
+        # Tailles (journal, index) après la dernière écriture de ce moteur, None tant qu'il n'a rien écrit
+        self._synced: Optional[Tuple[int, int]] = None
+        self._records = 0
+        self._keyframe_record = 0
+
+    @property
+    def needs_keyframe(self) -> bool:
+        return self.since_keyframe is None or self.since_keyframe >= self.keyframe_every - 1
+
+    def add(self, version: int, turns: int, frame: bytes, keyframe: bool):
+        data = zlib.compress(frame, 1)
+        self.pending.append((version, turns, keyframe, data))
+        self.pending_bytes += len(data)
+        self.since_keyframe = 0 if keyframe else self.since_keyframe + 1
+        if self.pending_bytes >= PENDING_LIMIT:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending, self.pending_bytes = self.pending, [], 0
+        index_path = self.path + '.idx'
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with _locked(self.path + '.lock'):
+            if self._synced != (_size(self.path), _size(index_path)):
+                if not pending[0][2]:
+                    # Un autre processus a écrit dans ce journal depuis notre dernière écriture : nos deltas ne
+                    # s'appliquent plus à sa dernière trame. Ils sont abandonnés, la suite repart d'une image
+                    # complète
+                    self.since_keyframe = None
+                    self._synced = None
+                    return
+                self._rewind(pending[0][0], index_path)
+
+            entries = np.zeros(len(pending), dtype=INDEX_DTYPE)
+            with open(self.path, 'ab') as log:
+                offset = log.seek(0, os.SEEK_END)
+                for number, (version, turns, keyframe, data) in enumerate(pending):
+                    if keyframe:
+                        self._keyframe_record = self._records + number
+                    entries[number] = (version, turns, offset, len(data), self._keyframe_record)
+                    log.write(data)
+                    offset += len(data)
+            # Index écrit après les trames : un lecteur ne voit que des trames complètes
+            with open(index_path, 'ab') as index:
+                index.write(entries.tobytes())
+            self._records += len(pending)
+            self._synced = (_size(self.path), _size(index_path))
+
+    def _rewind(self, version: int, index_path: str):
+        # Première écriture de ce moteur (ou après celle d'un autre processus) : les trames de version >= version
+        # sortent de l'index (tours abandonnés après un conflit, partie réinitialisée). Les octets devenus
+        # orphelins restent dans le journal, sauf si plus rien n'est gardé : le journal repart alors de zéro
+        entries = _read_index(index_path)
+        keep = int(np.searchsorted(entries["version"], version)) if len(entries) else 0
+        if keep == 0 or not self._valid_log():
+            _replace(self.path, LOG_HEADER.pack(LOG_MAGIC, LOG_FORMAT, self.grid_size))
+            _replace(index_path, b'')
+            keep = 0
+        elif keep < len(entries):
+            _replace(index_path, entries[:keep].tobytes())
+        self._records = keep
+
+    def _valid_log(self) -> bool:
+        try:
+            with open(self.path, 'rb') as log:
+                header = log.read(LOG_HEADER.size)
+        except FileNotFoundError:
+            return False
+        return len(header) == LOG_HEADER.size and header == LOG_HEADER.pack(LOG_MAGIC, LOG_FORMAT, self.grid_size)
+
+
+class ReplayReader:
+    # Relecture d'un journal projeté en mémoire (mmap) : aller à un tour coûte une image complète et au plus
+    # KEYFRAME_EVERY deltas, sans charger le reste du fichier. Les trames ajoutées après l'ouverture sont ignorées
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        try:
+            self.log = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("Journal de partie vide")
+        if len(self.log) < LOG_HEADER.size or LOG_HEADER.unpack_from(self.log, 0)[:2] != (LOG_MAGIC, LOG_FORMAT):
+            self.close()
+            raise ValueError("Journal de partie invalide")
+        self.grid_size = LOG_HEADER.unpack_from(self.log, 0)[2]
+
+        # Journal ouvert avant l'index : on ne garde que les entrées dont la trame est entièrement projetée
+        count = _size(path + '.idx') // INDEX_DTYPE.itemsize
+        if count:
+            index = np.memmap(path + '.idx', dtype=INDEX_DTYPE, mode='r', shape=(count,))
+            ends = index["offset"] + index["length"]
+            self.index = index[:int(np.searchsorted(ends, len(self.log), side="right"))]
+        else:
+            self.index = np.zeros(0, dtype=INDEX_DTYPE)
+
+    def close(self):
+        self.index = None
+        self.log.close()
+        self._file.close()
+
+    def __enter__(self) -> "ReplayReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def first_turn(self) -> Optional[int]:
+        return int(self.index[0]["turns"]) if len(self.index) else None
+
+    @property
+    def last_turn(self) -> Optional[int]:
+        return int(self.index[-1]["turns"]) if len(self.index) else None
+
+    def locate(self, turn: int) -> int:
+        # Dernière trame du tour (les modifications d'obstacles ajoutent des versions sans faire avancer les tours)
+        record = int(np.searchsorted(self.index["turns"], turn, side="right")) - 1
+        if record < 0:
+            raise KeyError(turn)
+        return record
+
+    def frame(self, record: int) -> bytes:
+        entry = self.index[record]
+        offset = int(entry["offset"])
+        return zlib.decompress(self.log[offset:offset + int(entry["length"])])
+
+    def state_at(self, turn: int) -> Dict:
+        # État complet (format de SimulationEngine.get_packed_state) : image complète puis deltas jusqu'au tour
+        record = self.locate(turn)
+        keyframe = int(self.index[record]["keyframe"])
+        state = decode_frame(self.frame(keyframe))
+        cells = state["cells"].copy()
+        # Robots rangés par identifiant (ligne i = robot i), comme dans les images complètes
+        robots = state["robots"].copy()
+        for number in range(keyframe + 1, record + 1):
+            delta = decode_frame(self.frame(number))
+            positions = delta["cell_positions"]
+            cells[positions[:, 0], positions[:, 1]] = delta["cell_codes"]
+            changed = delta["robots"]
+            robots[changed[:, 0]] = changed
+            state = delta
+        return {
+            "version": state["version"],
+            "grid_size": self.grid_size,
+            "cells": cells,
+            "robots": robots,
+            "trash_remaining": state["trash_remaining"],
+            "turns_elapsed": state["turns_elapsed"],
+            "is_finished": state["is_finished"],
+        }
+
+    def frames(self, first_turn: int, last_turn: int) -> Iterator[bytes]:
+        # Trames WALE de first_turn à last_turn : image complète reconstituée au premier tour, puis trames
+        # enregistrées telles quelles (deltas, et images complètes périodiques)
+        start = self.locate(first_turn)
+        yield encode_keyframe(self.state_at(first_turn))
+        for record in range(start + 1, self.locate(last_turn) + 1):
+            yield self.frame(record)
@@ -0,0 +1,318 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from heapq import heappop, heappush
+from typing import Dict, List, Optional, Set, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .engines import mutate_engine
+from .models import Simulation
+from .state_store import StaleStateError
+
+logger = logging.getLogger(__name__)
+
+WAITING = "waiting"
+READY = "ready"
+RUNNING = "running"
+
+# Avance (en secondes de CPU) qu'une simulation restée inactive peut avoir sur les autres à son réveil
+FAIRNESS_WINDOW = 0.05
+# Délai (secondes) avant de retenter une simulation dont le tour a échoué (base momentanément verrouillée...)
+ERROR_BACKOFF = 1.0
+# Lissage de la fréquence mesurée (moyenne mobile exponentielle des intervalles entre deux tours)
+RATE_SMOOTHING = 0.1
+
+
+class ScheduledSimulation:
+    __slots__ = ("simulation_id", "tick_rate", "state", "due", "vtime", "cpu_time", "ticks", "interval", "last_tick")
+
+    def __init__(self, simulation_id: int, tick_rate: float, due: float, vtime: float):
+        self.simulation_id = simulation_id
+        self.tick_rate = tick_rate
+        self.state = WAITING
+        # Échéance du prochain tour (horloge de la boucle d'événements)
+        self.due = due
+        # Temps CPU consommé, ajusté au réveil (clé du partage équitable)
+        self.vtime = vtime
+        self.cpu_time = 0.0
+        self.ticks = 0
+        self.interval: Optional[float] = None
+        self.last_tick: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "simulation": self.simulation_id,
+            "state": self.state,
+            "tick_rate": self.tick_rate,
+            "achieved_rate": 1.0 / self.interval if self.interval else None,
+            "ticks": self.ticks,
+            "cpu_seconds": self.cpu_time,
+        }
+
+
+def _tick(simulation_id: int) -> Tuple[Optional[bool], float]:
+    # Exécuté dans le pool : un tour (calcul + enregistrement de l'état), mesuré en temps CPU du thread.
+    # Renvoie (terminée, None si le moteur est introuvable ; temps CPU)
+    started = time.thread_time()
+    try:
+        finished = mutate_engine(simulation_id, lambda engine: engine.step())
+    except StaleStateError:
+        # Trop de conflits avec un autre processus : on retentera au prochain tour
+        finished = False
+    finally:
+        close_old_connections()
+    return finished, time.thread_time() - started
+
+
+class TickScheduler:
+    # Fait avancer en tâche de fond les simulations planifiées (Simulation.scheduled), chacune à sa fréquence
+    # cible. La boucle d'événements ne fait qu'ordonnancer : les tours s'exécutent dans un pool de threads.
+    # Quand le pool est saturé, la simulation prête qui a consommé le moins de CPU passe en premier (partage
+    # équitable à la CFS) : les simulations coûteuses ralentissent sans affamer les autres. La liste des
+    # simulations planifiées est relue en base (toutes les poll_interval secondes, ou sur demande) ; shard / shards
+    # répartissent les simulations entre plusieurs processus dédiés (identifiant modulo shards)
+
+    def __init__(self, workers: int = 4, poll_interval: float = 1.0, max_tick_rate: float = 1000.0,
+                 shard: int = 0, shards: int = 1):
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.max_tick_rate = max_tick_rate
+        self.shard = shard
+        self.shards = max(1, shards)
+        self.simulations: Dict[int, ScheduledSimulation] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        # Tas (échéance, id) des simulations en attente et (temps CPU, id) des simulations prêtes
+        self._waiting: List[Tuple[float, int]] = []
+        self._ready: List[Tuple[float, int]] = []
+        self._busy = 0
+        # Horloge virtuelle : temps CPU de la dernière simulation lancée
+        self._clock = 0.0
+        # Retirées faute de moteur : reprises seulement sur demande explicite
+        self._unavailable: Set[int] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sync_requested: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    @property
+    def is_running(self) -> bool:
+        return self.loop is not None and not self._stopping
+
+    def owns(self, simulation_id: int) -> bool:
+        return self.is_running and int(simulation_id) in self.simulations
+
+    def handles(self, simulation_id: int) -> bool:
+        # Simulation de la tranche de ce processus (planifiée ici, ou diffusée en direct depuis ce processus)
+        return int(simulation_id) % self.shards == self.shard
+
+    def describe(self, simulation_id: int) -> Optional[Dict]:
+        entry = self.simulations.get(int(simulation_id))
+        return entry.to_dict() if entry is not None and self.is_running else None
+
+    def status(self) -> Dict:
+        entries = sorted(list(self.simulations.values()), key=lambda entry: entry.simulation_id)
+        return {
+            "running": self.is_running,
+            "workers": self.workers,
+            "busy_workers": self._busy,
+            "shard": self.shard,
+            "shards": self.shards,
+            "simulations": [entry.to_dict() for entry in entries] if self.is_running else [],
+        }
+
+    def request_sync(self, simulation_id: Optional[int] = None):
+        # Appelable depuis n'importe quel thread (vues) : relit la base sans attendre poll_interval
+        loop = self.loop
+        if loop is not None and not self._stopping:
+            loop.call_soon_threadsafe(self._request_sync, simulation_id)
+
+    def start(self) -> asyncio.Task:
+        # Dans la boucle d'événements courante (serveur ASGI) ; sans effet si déjà démarré
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='walle-scheduler')
+        self._wakeup = asyncio.Event()
+        self._sync_requested = asyncio.Event()
+        self._stopping = False
+        poller = asyncio.ensure_future(self._poll())
+        try:
+            while not self._stopping:
+                self._dispatch()
+                timeout = max(0.0, self._waiting[0][0] - self.loop.time()) if self._waiting else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            self._stopping = True
+            poller.cancel()
+            # Les tours en cours se terminent (état enregistré), aucun nouveau n'est lancé
+            self._executor.shutdown(wait=False)
+            self.simulations.clear()
+            self._waiting.clear()
+            self._ready.clear()
+            self.loop = None
+
+    def _request_sync(self, simulation_id: Optional[int]):
+        if simulation_id is not None:
+            self._unavailable.discard(int(simulation_id))
+        self._sync_requested.set()
+
+    def _dispatch(self):
+        now = self.loop.time()
+        while self._waiting and self._waiting[0][0] <= now:
+            due, simulation_id = heappop(self._waiting)
+            entry = self.simulations.get(simulation_id)
+            if entry is None or entry.state != WAITING or entry.due != due:
+                continue
+            # Une simulation restée longtemps inactive ne rattrape pas tout son retard de CPU d'un coup
+            entry.vtime = max(entry.vtime, self._clock - FAIRNESS_WINDOW)
+            entry.state = READY
+            heappush(self._ready, (entry.vtime, simulation_id))
+
+        while self._ready and self._busy < self.workers:
+            vtime, simulation_id = heappop(self._ready)
+            entry = self.simulations.get(simulation_id)
+            if entry is None or entry.state != READY:
+                continue
+            entry.state = RUNNING
+            self._busy += 1
+            self._clock = max(self._clock, vtime)
+            future = self.loop.run_in_executor(self._executor, _tick, simulation_id)
+            future.add_done_callback(partial(self._finished, entry))
+
+    def _finished(self, entry: ScheduledSimulation, future: asyncio.Future):
+        self._busy -= 1
+        self._wakeup.set()
+        if future.cancelled():
+            return
+        simulation_id = entry.simulation_id
+        if self.simulations.get(simulation_id) is not entry:
+            # Mise en pause (ou replanifiée) pendant le tour
+            return
+        now = self.loop.time()
+        try:
+            finished, cpu_time = future.result()
+        except Exception:
+            logger.exception("Échec d'un tour de la simulation %s", simulation_id)
+            entry.due = now + ERROR_BACKOFF
+            entry.state = WAITING
+            heappush(self._waiting, (entry.due, simulation_id))
+            return
+        if finished is None:
+            self._unavailable.add(simulation_id)
+        if finished is None or finished:
+            del self.simulations[simulation_id]
+            return
+
+        entry.ticks += 1
+        entry.cpu_time += cpu_time
+        entry.vtime += cpu_time
+        if entry.last_tick is not None:
+            interval = now - entry.last_tick
+            entry.interval = interval if entry.interval is None else \
+                entry.interval + RATE_SMOOTHING * (interval - entry.interval)
+        entry.last_tick = now
+        # Pas de rafale pour rattraper les tours manqués : une simulation en retard repart dès que possible
+        entry.due = max(entry.due + 1.0 / entry.tick_rate, now)
+        entry.state = WAITING
+        heappush(self._waiting, (entry.due, simulation_id))
+
+    async def _poll(self):
+        while True:
+            try:
+                rows = await sync_to_async(self._scheduled_rows, thread_sensitive=False)()
+            except Exception:
+                logger.exception("Lecture des simulations planifiées impossible")
+            else:
+                self._apply(rows)
+            try:
+                await asyncio.wait_for(self._sync_requested.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._sync_requested.clear()
+
+    def _scheduled_rows(self) -> Dict[int, float]:
+        try:
+            rows = Simulation.objects.filter(scheduled=True, is_finished=False).values_list('pk', 'tick_rate')
+            return {pk: tick_rate for pk, tick_rate in rows if pk % self.shards == self.shard}
+        finally:
+            close_old_connections()
+
+    def _apply(self, rows: Dict[int, float]):
+        now = self.loop.time()
+        for simulation_id in list(self.simulations):
+            if simulation_id not in rows:
+                # Un tour en cours se termine normalement, la simulation n'est simplement plus relancée
+                del self.simulations[simulation_id]
+        self._unavailable &= rows.keys()
+
+        for simulation_id, tick_rate in rows.items():
+            if simulation_id in self._unavailable or tick_rate <= 0:
+                continue
+            tick_rate = min(tick_rate, self.max_tick_rate)
+            entry = self.simulations.get(simulation_id)
+            if entry is None:
+                self.simulations[simulation_id] = ScheduledSimulation(simulation_id, tick_rate, now, self._clock)
+                heappush(self._waiting, (now, simulation_id))
+            elif entry.tick_rate != tick_rate:
+                entry.tick_rate = tick_rate
+                if entry.state == WAITING:
+                    # Nouvelle fréquence appliquée dès le prochain tour (l'ancienne entrée du tas devient caduque)
+                    entry.due = (entry.last_tick if entry.last_tick is not None else now) + 1.0 / tick_rate
+                    heappush(self._waiting, (entry.due, simulation_id))
+                # Fréquence mesurée repartie de zéro à la nouvelle cadence
+                entry.interval = entry.last_tick = None
+        self._wakeup.set()
+
+
+_scheduler: Optional[TickScheduler] = None
+
+
+def get_scheduler() -> TickScheduler:
+    # Planificateur du processus (démarré dans la boucle du serveur ASGI si SIMULATION_SCHEDULER['IN_PROCESS'])
+    global _scheduler
+    if _scheduler is None:
+        config = getattr(settings, 'SIMULATION_SCHEDULER', {})
+        _scheduler = TickScheduler(
+            workers=config.get('WORKERS', 4),
+            poll_interval=config.get('POLL_INTERVAL', 1.0),
+            max_tick_rate=config.get('MAX_TICK_RATE', 1000.0),
+            shard=config.get('SHARD', 0),
+            shards=config.get('SHARDS', 1),
+        )
+    return _scheduler
+
+
+async def lifespan_application(scope, receive, send):
+    # Protocole lifespan ASGI : démarre et arrête le planificateur avec le serveur
+    in_process = getattr(settings, 'SIMULATION_SCHEDULER', {}).get('IN_PROCESS', True)
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if in_process:
+                get_scheduler().start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await get_scheduler().stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
@@ -1,5 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Simulation
+from .obstacle_maps import map_size, parse_obstacle_map
 
 class SimulationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,10 +9,91 @@ class SimulationSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class SimulationConfigSerializer(serializers.Serializer):
-    num_robots = serializers.IntegerField(min_value=1, max_value=20, default=4)
-    num_trash = serializers.IntegerField(min_value=1, max_value=400, default=20)
-    base_x = serializers.IntegerField(min_value=0, max_value=31, default=0)
-    base_y = serializers.IntegerField(min_value=0, max_value=31, default=0)
+    grid_size = serializers.IntegerField(min_value=2, max_value=getattr(settings, 'SIMULATION_MAX_GRID_SIZE', 4096),
+                                         default=32)
+    num_robots = serializers.IntegerField(min_value=1, max_value=getattr(settings, 'SIMULATION_MAX_ROBOTS', 1000),
+                                          default=4)
+    num_trash = serializers.IntegerField(min_value=1, default=20)
+    base_x = serializers.IntegerField(min_value=0, default=0)
+    base_y = serializers.IntegerField(min_value=0, default=0)
+    seed = serializers.IntegerField(min_value=0, max_value=2 ** 63 - 1, required=False, allow_null=True)
+    # Carte texte ("#" = obstacle, une ligne par x) ou image PBM P1
+    obstacle_map = serializers.CharField(required=False, allow_blank=True, trim_whitespace=False)
+
+    def validate_obstacle_map(self, value):
+        try:
+            parse_obstacle_map(value)
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
+        return value
+
+    def validate(self, attrs):
+        # Bornes qui dépendent de la taille de la grille ; en réinitialisation partielle, les champs absents
+        # gardent la valeur de la simulation (self.instance)
+        def value(field):
+            if field in attrs:
+                return attrs[field]
+            if self.instance is not None:
+                return getattr(self.instance, field)
+            return self.fields[field].default
+
+        grid_size = value('grid_size')
+        errors = {}
+        for field in ('base_x', 'base_y'):
+            if value(field) >= grid_size:
+                errors[field] = [f"Doit être inférieur à la taille de la grille ({grid_size})."]
+        obstacle_map = attrs.get('obstacle_map', getattr(self.instance, 'obstacle_map', ''))
+        walls = set(parse_obstacle_map(obstacle_map)) if obstacle_map else set()
+        if walls:
+            rows, columns = map_size(obstacle_map)
+            if rows > grid_size or columns > grid_size:
+                errors['obstacle_map'] = [f"Carte de {rows} x {columns} cases, plus grande que la grille."]
+            elif (value('base_x'), value('base_y')) in walls:
+                errors['obstacle_map'] = ["La base est sur un obstacle."]
+        cells = grid_size * grid_size - len(walls)
+        if value('num_robots') + value('num_trash') + 1 > cells:
+            errors['num_trash'] = [f"Trop de robots et de déchets pour une grille de {cells} cases "
+                                   f"(base comprise)."]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+class ViewportSerializer(serializers.Serializer):
+    # Paramètres de state : fenêtre "x0,y0,x1,y1" (x1 et y1 exclus) et taille des blocs agrégés
+    bbox = serializers.CharField(required=False)
+    downsample = serializers.IntegerField(min_value=1, max_value=4096, default=1)
+
+    def validate_bbox(self, value):
+        try:
+            bounds = [int(part) for part in value.split(',')]
+        except ValueError:
+            bounds = []
+        if len(bounds) != 4:
+            raise serializers.ValidationError("Format attendu : x0,y0,x1,y1")
+        x0, y0, x1, y1 = bounds
+        if x0 < 0 or y0 < 0 or x1 <= x0 or y1 <= y0:
+            raise serializers.ValidationError("Fenêtre vide ou coordonnées négatives")
+        return bounds
+
+class ObstacleEditSerializer(serializers.Serializer):
+    # Cases [x, y] à transformer en obstacles ou à libérer
+    add = serializers.ListField(child=serializers.ListField(child=serializers.IntegerField(min_value=0),
+                                                            min_length=2, max_length=2), default=list)
+    remove = serializers.ListField(child=serializers.ListField(child=serializers.IntegerField(min_value=0),
+                                                               min_length=2, max_length=2), default=list)
+
+class AdvanceSerializer(serializers.Serializer):
+    steps = serializers.IntegerField(min_value=1, max_value=1000000, default=1)
+    until_finished = serializers.BooleanField(default=False)
+    time_budget_ms = serializers.IntegerField(min_value=1, required=False)
+    sample_every = serializers.IntegerField(min_value=1, required=False)
+    max_frames = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+class ScheduleSerializer(serializers.Serializer):
+    # Fréquence cible du planificateur (tours par seconde)
+    tick_rate = serializers.FloatField(
+        min_value=0.01, max_value=getattr(settings, 'SIMULATION_SCHEDULER', {}).get('MAX_TICK_RATE', 1000),
+        required=False)
 
 class GridStateSerializer(serializers.Serializer):
     grid = serializers.ListField(
@@ -23,4 +106,5 @@ class GridStateSerializer(serializers.Serializer):
     )
     trash_remaining = serializers.IntegerField()
     turns_elapsed = serializers.IntegerField()
+    version = serializers.IntegerField(required=False)
     is_finished = serializers.BooleanField()
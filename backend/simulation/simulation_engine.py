@@ -1,59 +1,48 @@
+import os
+import pickle
 import random
-from typing import List, Tuple, Dict, Set
-from queue import PriorityQueue
-
-
-def a_star(start, goal, grid, obstacles):
-    def manhattanDistance(a, b):
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])  # distance de Manhattan
-
-    frontier = PriorityQueue()
-    frontier.put((0, start))
-    came_from = {start: None}
-    cost_so_far = {start: 0}
-
-    while not frontier.empty():
-        _, current = frontier.get()
-
-        if current == goal:
-            break
-
-        for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-            next_node = (current[0] + dx, current[1] + dy)
-            if (0 <= next_node[0] < len(grid) and
-                0 <= next_node[1] < len(grid[0]) and
-                next_node not in obstacles and
-                grid[next_node[0]][next_node[1]] != "B"):  # on peut ignorer B ici si on vise B
-                new_cost = cost_so_far[current] + 1
-                if next_node not in cost_so_far or new_cost < cost_so_far[next_node]:
-                    cost_so_far[next_node] = new_cost
-                    priority = new_cost + manhattanDistance(goal, next_node)
-                    frontier.put((priority, next_node))
-                    came_from[next_node] = current
-
-    # Reconstituer le chemin
-    if goal not in came_from:
-        return None  # Pas de chemin
-
-    path = []
-    current = goal
-    while current != start:
-        path.append(current)
-        current = came_from[current]
-    path.reverse()
-    return path
+import time
+import zlib
+from bisect import bisect_right
+from collections import deque
+from typing import Callable, Iterable, List, Optional, Tuple, Dict, Set
+
+import numpy as np
+
+from .allocation import TrashAllocator
+from .batch import BatchFleet
+from .codec import encode_delta, encode_keyframe
+from .cooperative import (LEAVE_RADIUS, PUSH_LIMIT, RANK_CARRYING, RANK_EXPLORING, RANK_LEAVING_BASE, RANK_TARGET,
+                          CooperativePlanner, ReservedCells)
+from .hierarchical import CLUSTER_SIZE, HierarchicalPathFinder
+from .pathfinding import DistanceField, ManhattanField, PathCache, a_star, make_pathfinder
+from .profiling import TickProfiler
+from .replay import KEYFRAME_EVERY, ReplayRecorder
+from .spatial_index import BucketIndex
+from .world import (CELL_CODES, CELL_NAMES, BlockedView, CellBitset, ChunkedBitset, ChunkedWorld, NumpyWorld,
+                    new_cell_set)
+
 
 class Robot:
-    def __init__(self, x: int, y: int, robot_id: int):
+    # Pas de __dict__ par robot : les flottes de plusieurs milliers de robots restent compactes
+    __slots__ = ("x", "y", "id", "carrying_trash", "vision_radius", "known_trash", "visited_cells",
+                 "random_direction", "steps_in_direction", "rng")
+
+    def __init__(self, x: int, y: int, robot_id: int, vision_radius: int = 5, rng: Optional[random.Random] = None,
+                 grid_size: Optional[int] = None):
         self.x = x
         self.y = y
         self.id = robot_id
         self.carrying_trash = False
-        self.vision_radius = 5
+        self.vision_radius = vision_radius
         self.known_trash: Set[Tuple[int, int]] = set()
-        self.visited_cells: Set[Tuple[int, int]] = {(x, y)}
-        self.random_direction: Tuple[int, int] = {0, 0}
+        # Cases visitées : un bit par case de la grille quand sa taille est connue (par blocs si très grande)
+        self.visited_cells = new_cell_set(grid_size) if grid_size else set()
+        self.visited_cells.add((x, y))
+        self.random_direction: Tuple[int, int] = (0, 0)
         self.steps_in_direction: int = 0
+        # Générateur du moteur (le module random par défaut)
+        self.rng = rng if rng is not None else random
 
     def move(self, dx: int, dy: int, grid_size: int, obstacles: List[Tuple[int, int]]) -> bool:
         new_x = self.x + dx
@@ -89,47 +78,67 @@ class Robot:
                     visible_cells.append((x, y, grid[x][y]))
         return visible_cells
 
+    def perceive(self, trash_index: BucketIndex, robots_positions) -> List[Tuple[int, int]]:
+        # Déchets visibles (sans robot dessus) via l'index spatial, sans balayer toute la fenêtre
+        return [position for position in trash_index.query(self.x, self.y, self.vision_radius)
+                if position not in robots_positions]
+
     def decide_action(self, grid: List[List[str]], base_position: Tuple[int, int],
-                      robots_positions: List[Tuple[int, int]]) -> str:
+                      robots_positions: List[Tuple[int, int]],
+                      visible_trash: Optional[List[Tuple[int, int]]] = None,
+                      find_path: Optional[Callable] = None,
+                      base_field: Optional[DistanceField] = None,
+                      explored: Optional[np.ndarray] = None) -> str:
         if self.carrying_trash:
             # Si on porte un déchet, essayer d'aller vers la base
             base_x, base_y = base_position
             if self.x == base_x and self.y == base_y:
                 return "deposit"
 
-            # Sinon se déplacer vers la base
+            # Sinon descendre le champ de distances vers la base
+            if base_field is not None:
+                step = base_field.next_step(self.x, self.y, robots_positions)
+                if step is not None:
+                    return f"move:{step[0]}:{step[1]}"
+            else:
+                dx = 1 if base_x > self.x else (-1 if base_x < self.x else 0)
+                dy = 1 if base_y > self.y else (-1 if base_y < self.y else 0)
 
-            dx = 1 if base_x > self.x else (-1 if base_x < self.x else 0)
-            dy = 1 if base_y > self.y else (-1 if base_y < self.y else 0)
+                # Si on peut se déplacer horizontalement
+                if dx != 0 and (self.x + dx, self.y) not in robots_positions and 0 <= self.x + dx < len(grid):
+                    return f"move:{dx}:0"
 
-            # Si on peut se déplacer horizontalement
-            if dx != 0 and (self.x + dx, self.y) not in robots_positions and 0 <= self.x + dx < len(grid):
-                return f"move:{dx}:0"
-
-            # Si on peut se déplacer verticalement
-            if dy != 0 and (self.x, self.y + dy) not in robots_positions and 0 <= self.y + dy < len(grid[0]):
-                return f"move:0:{dy}"
+                # Si on peut se déplacer verticalement
+                if dy != 0 and (self.x, self.y + dy) not in robots_positions and 0 <= self.y + dy < len(grid[0]):
+                    return f"move:0:{dy}"
 
         # Si on est sur un déchet et qu'on n'en porte pas, le ramasser
         if grid[self.x][self.y] == "T" or grid[self.x][self.y] == "RT" and not self.carrying_trash:
             return "pickup"
-        # Voir autour
-        visible_cells = self.see_around(grid)
-        visible_trash = [(x, y) for x, y, v in visible_cells if v == "T"]
+        # Voir autour (si la perception n'a pas déjà été faite par le moteur)
+        if visible_trash is None:
+            visible_cells = self.see_around(grid)
+            visible_trash = [(x, y) for x, y, v in visible_cells if v == "T"]
 
         if visible_trash:
             # Aller vers le déchet le plus proche
             target = min(visible_trash, key=lambda t: abs(t[0] - self.x) + abs(t[1] - self.y))
-            path = a_star((self.x, self.y), target, grid, set(robots_positions))
+            if find_path is not None:
+                path = find_path((self.x, self.y), target, robots_positions)
+            else:
+                path = a_star((self.x, self.y), target, grid, robots_positions, base_position)
             if path:
                 next_x, next_y = path[0]
                 dx, dy = next_x - self.x, next_y - self.y
                 return f"move:{dx}:{dy}"
 
         # Déplacements aléatoires
-        if self.steps_in_direction <= 0 or self.random_direction == {0, 0}:
+        if self.steps_in_direction <= 0 or self.random_direction == (0, 0):
             directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-            random.shuffle(directions)
+            self.rng.shuffle(directions)
+            if explored is not None:
+                # Les cases encore inexplorées par la flotte passent en premier (ordre aléatoire conservé sinon)
+                directions.sort(key=lambda d: self._explored(explored, self.x + d[0], self.y + d[1]))
             for dx, dy in directions:
                 new_x, new_y = self.x + dx, self.y + dy
                 if (0 <= new_x < len(grid) and 0 <= new_y < len(grid[0])
@@ -151,122 +160,1131 @@ class Robot:
             self.steps_in_direction = 0
             return "wait"
 
+    @staticmethod
+    def _explored(explored: np.ndarray, x: int, y: int) -> bool:
+        size_x, size_y = explored.shape
+        return not (0 <= x < size_x and 0 <= y < size_y) or bool(explored[x, y])
+
 
 class SimulationEngine:
-    def __init__(self, grid_size: int, num_robots: int, num_trash: int, base_position: Tuple[int, int]):
+    STORAGES = ("list", "numpy", "chunked")
+    STEP_MODES = ("sequential", "batch", "cooperative")
+    # Nombre de deltas conservés : un client plus en retard reçoit une image complète
+    DELTA_HISTORY = 64
+
+    def __init__(self, grid_size: int, num_robots: int, num_trash: int, base_position: Tuple[int, int],
+                 storage: str = "list", step_mode: str = "sequential", vision_radius: int = 5,
+                 seed: Optional[int] = None, profile: bool = False, walls: Iterable[Tuple[int, int]] = ()):
+        if storage not in self.STORAGES:
+            raise ValueError(f"Stockage inconnu : {storage}")
+        if step_mode not in self.STEP_MODES:
+            raise ValueError(f"Mode de pas inconnu : {step_mode}")
+        if step_mode == "batch" and storage != "numpy":
+            raise ValueError("Le mode batch nécessite le stockage numpy")
+        self._configure(grid_size, num_robots, num_trash, base_position, storage, step_mode, vision_radius, seed)
+
+        # Obstacles statiques (carte chargée), avant les robots et les déchets
+        self._place_walls(walls)
+
+        # Initialiser les robots
+        self._place_robots()
+
+        # Placer les déchets
+        self._place_trash()
+
+        self._build_indexes()
+        if profile:
+            self.enable_profiling()
+
+    def _configure(self, grid_size: int, num_robots: int, num_trash: int, base_position: Tuple[int, int],
+                   storage: str, step_mode: str, vision_radius: int, seed: Optional[int]):
         self.grid_size = grid_size
         self.num_robots = num_robots
         self.num_trash = num_trash
-        self.base_position = base_position
+        self.base_position = tuple(base_position)
         self.deposited_trash = 0
+        self.storage = storage
+        self.step_mode = step_mode
+        self.vision_radius = vision_radius
+
+        # Générateur propre au moteur : runs reproductibles et indépendants des autres moteurs
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+        # Versionnement de l'état : cases et robots modifiés à chaque tour
+        self.version = 0
+        self._dirty_cells: Set[Tuple[int, int]] = set()
+        self._dirty_robots: Set[int] = set()
+        self._deltas = deque(maxlen=self.DELTA_HISTORY)
+        # Identifiant de la partie (la version repart de 0 à la réinitialisation) et date du dernier changement :
+        # validateurs HTTP (ETag, Last-Modified) de l'état
+        self.lineage = os.urandom(4).hex()
+        self.modified_at = time.time()
+        # Réponses déjà sérialisées pour la version courante, par format (plusieurs clients interrogent la même)
+        self._rendered: Dict[str, bytes] = {}
+        self._rendered_version = -1
 
         # Initialiser la grille (vide)
-        self.grid = [["." for _ in range(grid_size)] for _ in range(grid_size)]
+        if storage == "numpy":
+            # Couches uint8/bool compactes, lues par vues (grid[x][y] reste valide)
+            self.grid = NumpyWorld(grid_size)
+        elif storage == "chunked":
+            # Très grandes grilles : seuls les blocs contenant la base, des robots ou des déchets sont alloués
+            self.grid = ChunkedWorld(grid_size)
+        else:
+            self.grid = [["." for _ in range(grid_size)] for _ in range(grid_size)]
 
         # Placer la base
-        base_x, base_y = base_position
-        self.grid[base_x][base_y] = "B"
+        base_x, base_y = self.base_position
+        self._set_cell(base_x, base_y, "B")
 
-        # Initialiser les robots
         self.robots = []
-        self._place_robots()
-
-        # Placer les déchets
         self.trash_positions = set()
-        self._place_trash()
+        # Obstacles statiques (murs, zones interdites), aussi marqués "#" sur la grille
+        self.walls = new_cell_set(grid_size)
+        # Couverture de la flotte : cases déjà visitées par au moins un robot
+        if storage == "chunked":
+            self.explored = ChunkedBitset(grid_size)
+        else:
+            self.explored = np.zeros((grid_size, grid_size), dtype=np.bool_)
 
-    def _place_robots(self):
-        positions = []
+        # Version du snapshot stocké dont ce moteur est issu (contrôle de concurrence optimiste)
+        self.store_version = 0
+
+        # Compteur de tours tenu par le moteur ; flushed_turns = valeur déjà écrite en base
+        self.turns_elapsed = 0
+        self.flushed_turns = 0
+
+        # Instrumentation des tours (None : désactivée, aucun coût dans step)
+        self.profiler: Optional[TickProfiler] = None
+        # Journal de la partie (None : pas d'enregistrement)
+        self.recorder: Optional[ReplayRecorder] = None
+
+    def enable_profiling(self, enabled: bool = True):
+        if not enabled:
+            self.profiler = None
+        elif self.profiler is None:
+            self.profiler = TickProfiler()
+
+    def enable_recording(self, path: Optional[str], keyframe_every: int = KEYFRAME_EVERY):
+        # Une trame par version dans le journal path (None : arrêt), en commençant par l'état courant complet.
+        # Les trames sont écrites par flush_recording, une fois l'état enregistré (voir engines.mutate_engine)
+        if path is None:
+            self.recorder = None
+            return
+        self.recorder = ReplayRecorder(path, self.grid_size, keyframe_every)
+        self._record_frame()
+
+    def flush_recording(self):
+        if self.recorder is not None:
+            self.recorder.flush()
+
+    def _record_frame(self):
+        recorder = self.recorder
+        extra = {"turns_elapsed": self.turns_elapsed, "is_finished": self.is_finished}
+        keyframe = recorder.needs_keyframe
+        if keyframe:
+            frame = encode_keyframe({**self.get_packed_state(), **extra})
+        else:
+            frame = encode_delta({**self.get_packed_delta(self.version - 1), **extra})
+        recorder.add(self.version, self.turns_elapsed, frame, keyframe)
+
+    def _build_indexes(self):
+        base_x, base_y = self.base_position
+
+        # Pathfinding : la base est infranchissable, les chemins statiques sont mis en cache par but
+        self.pathfinder = make_pathfinder(self.grid_size, self.grid_size, sparse=self.storage == "chunked")
+        self.pathfinder.set_blocked(base_x, base_y)
+        for x, y in self.walls:
+            self.pathfinder.set_blocked(x, y)
+        # Abstraction HPA* pour les recherches longues sur les cartes à obstacles (construite à la demande)
+        self.hierarchy = None
+        if self.grid_size > 2 * CLUSTER_SIZE:
+            self.hierarchy = HierarchicalPathFinder(self.pathfinder)
+        self.obstacle_version = 0
+        self.path_cache = PathCache(max(64, 2 * self.num_robots))
+        self._base_field = None
 
-        # S'assurer que les robots ne sont pas placés sur la base
-        while len(positions) < self.num_robots:
-            x, y = random.randint(0, self.grid_size - 1), random.randint(0, self.grid_size - 1)
-            if (x, y) != self.base_position and (x, y) not in positions:
-                positions.append((x, y))
-                self.robots.append(Robot(x, y, len(self.robots)))
-                self.grid[x][y] = "R"
+        # Index spatial des déchets mis à jour à chaque placement et ramassage (l'occupation des cases par les
+        # robots vient de _robot_positions : codes du monde ou ensemble reconstruit au tour)
+        self.trash_index = BucketIndex(positions=self.trash_positions)
+
+        # Réservations des déchets (un robot par déchet), libérées au ramassage
+        self.allocator = TrashAllocator()
+
+        # En mode coopératif, table de réservations espace-temps partagée par la flotte
+        self.planner = CooperativePlanner() if self.step_mode == "cooperative" else None
+        self._base_exit = None
+
+        # En mode batch, l'état des robots vit dans des tableaux (struct-of-arrays)
+        self.fleet = None
+        if self.step_mode == "batch":
+            self.fleet = BatchFleet(self.robots, self.grid_size, self.base_position,
+                                    np.random.default_rng(self.rng.getrandbits(64)), self.vision_radius)
+
+    def _sample_free_cells(self, count: int, excluded) -> List[Tuple[int, int]]:
+        # Tirage sans remise parmi les cases hors de excluded, sans rejet (coût indépendant de la densité) :
+        # rng.sample sur un range (aucune liste de cases construite), puis chaque rang est décalé des cases
+        # exclues qui le précèdent
+        size = self.grid_size
+        skipped = sorted(x * size + y for x, y in excluded)
+        free_before = [index - rank for rank, index in enumerate(skipped)]
+        if count > size * size - len(skipped):
+            raise ValueError("Pas assez de cases libres sur la grille")
+        cells = []
+        for index in self.rng.sample(range(size * size - len(skipped)), count):
+            cells.append(divmod(index + bisect_right(free_before, index), size))
+        return cells
+
+    def _place_walls(self, walls: Iterable[Tuple[int, int]]):
+        for x, y in walls:
+            if (x, y) != self.base_position and 0 <= x < self.grid_size and 0 <= y < self.grid_size:
+                self.walls.add((x, y))
+                self._set_cell(x, y, "#")
+
+    def _place_robots(self):
+        # Ni sur la base ni sur un obstacle
+        for x, y in self._sample_free_cells(self.num_robots, [self.base_position, *self.walls]):
+            self.robots.append(Robot(x, y, len(self.robots), self.vision_radius, self.rng, self.grid_size))
+            self.explored[x, y] = True
+            self._set_cell(x, y, "R")
 
     def _place_trash(self):
-        # Obtenir les positions occupées (base + robots)
-        occupied = {self.base_position} | {(robot.x, robot.y) for robot in self.robots}
+        # Ni sur la base, ni sur un obstacle, ni sous un robot
+        occupied = [self.base_position, *self.walls] + [(robot.x, robot.y) for robot in self.robots]
+        for x, y in self._sample_free_cells(self.num_trash, occupied):
+            self.trash_positions.add((x, y))
+            self._set_cell(x, y, "T")
 
-        # Placer les déchets
-        while len(self.trash_positions) < self.num_trash:
-            x, y = random.randint(0, self.grid_size - 1), random.randint(0, self.grid_size - 1)
-            if (x, y) not in occupied and (x, y) not in self.trash_positions:
-                self.trash_positions.add((x, y))
-                self.grid[x][y] = "T"
+    def _set_cell(self, x: int, y: int, value: str):
+        self._dirty_cells.add((x, y))
+        if self.storage == "list":
+            self.grid[x][y] = value
+        else:
+            self.grid.set_cell(x, y, value)
+
+    def _robot_positions(self):
+        # En mode numpy (ou par blocs), les codes du monde servent directement d'ensemble de positions
+        if self.storage != "list":
+            return self.grid.occupied_positions()
+        return {(robot.x, robot.y) for robot in self.robots}
+
+    def set_walls(self, add: Iterable[Tuple[int, int]] = (), remove: Iterable[Tuple[int, int]] = ()) -> Dict:
+        # Modifie les obstacles statiques en cours de simulation. Les cases de la base, d'un robot ou d'un déchet
+        # ne peuvent pas devenir des obstacles (ignorées). Seuls les clusters HPA* touchés sont invalidés
+        occupied = self._robot_positions()
+        added = removed = 0
+        for x, y in add:
+            position = (x, y)
+            if not (0 <= x < self.grid_size and 0 <= y < self.grid_size) or position in self.walls \
+                    or position == self.base_position or position in self.trash_positions or position in occupied:
+                continue
+            self.walls.add(position)
+            self._set_cell(x, y, "#")
+            self._static_changed(x, y, True)
+            added += 1
+        for x, y in remove:
+            position = (x, y)
+            if position not in self.walls:
+                continue
+            self.walls.discard(position)
+            self._set_cell(x, y, ".")
+            self._static_changed(x, y, False)
+            removed += 1
+        if added or removed:
+            self.obstacle_version += 1
+            self._commit_delta()
+        return {"added": added, "removed": removed, "walls": len(self.walls), "version": self.version}
+
+    def _static_changed(self, x: int, y: int, blocked: bool):
+        self.pathfinder.set_blocked(x, y, blocked)
+        if self.hierarchy is not None:
+            self.hierarchy.invalidate(x, y)
+
+    @property
+    def base_field(self) -> DistanceField:
+        # Partagé par tous les robots, recalculé seulement si les obstacles statiques ont changé
+        if self._base_field is None or self._base_field_version != self.obstacle_version:
+            if self.storage == "chunked" and not self.walls:
+                # Seule la base est bloquée : distance de Manhattan, sans tableau de la taille de la grille
+                self._base_field = ManhattanField(self.grid_size, self.grid_size, self.base_position)
+            elif self.storage == "chunked" and self.hierarchy is not None:
+                # Grande carte à obstacles : distances par l'abstraction HPA* (pas de BFS sur toute la grille)
+                self._base_field = self.hierarchy.field(self.base_position)
+            else:
+                self._base_field = DistanceField(self.grid_size, self.grid_size, self.base_position,
+                                                 self.pathfinder.static_blocked)
+            self._base_field_version = self.obstacle_version
+        return self._base_field
+
+    def get_distance_field(self) -> List[List[int]]:
+        return self.base_field.to_rows()
+
+    def find_path(self, start: Tuple[int, int], goal: Tuple[int, int], obstacles=None):
+        # Chemin sur les obstacles statiques, mis en cache par but et repris tour après tour (PathCache). Avec des
+        # obstacles dynamiques (robots), seuls les premiers pas (portée de vue) sont vérifiés : la recherche
+        # n'est refaite en évitant les robots que si l'un d'eux est sur le chemin
+        hit, path = self.path_cache.get(start, goal, self.obstacle_version)
+        if not hit:
+            path = self._search(start, goal, ())
+            self.path_cache.put(start, goal, self.obstacle_version, path)
+        if path and obstacles is not None and any(cell in obstacles for cell in path[:self.vision_radius]):
+            path = self._search(start, goal, obstacles)
+        return path
+
+    def _search(self, start: Tuple[int, int], goal: Tuple[int, int], obstacles):
+        # Avec des obstacles, les recherches entre clusters passent par l'abstraction hiérarchique
+        finder = self.hierarchy if self.hierarchy is not None and self.walls else self.pathfinder
+        profiler = self.profiler
+        if profiler is None:
+            return finder.find(start, goal, obstacles)
+        started, expansions = time.perf_counter(), self.pathfinder.expansions
+        path = finder.find(start, goal, obstacles)
+        profiler.add("pathfinding", time.perf_counter() - started)
+        profiler.count("astar_searches")
+        profiler.count("astar_expansions", self.pathfinder.expansions - expansions)
+        return path
+
+    @property
+    def is_finished(self) -> bool:
+        return self.deposited_trash >= self.num_trash
 
     def step(self) -> bool:
         # Si plus de déchets, la simulation est terminée
-        if self.deposited_trash >= self.num_trash:
+        if self.is_finished:
             return True
 
-        # Positions actuelles des robots pour éviter les collisions
-        robot_positions = {(robot.x, robot.y) for robot in self.robots}
+        profiler = self.profiler
+        if profiler is not None:
+            started = time.perf_counter()
+            cache_hits, cache_misses = self.path_cache.hits, self.path_cache.misses
 
-        for robot in self.robots:
-            # Mettre à jour la connaissance du robot sur son environnement
-            visible_cells = robot.see_around(self.grid)
-            for x, y, cell_type in visible_cells:
-                if cell_type == "T":
-                    robot.known_trash.add((x, y))
+        if self.fleet is not None:
+            self._step_batch()
+        elif self.planner is not None:
+            self._step_cooperative()
+        else:
+            self._step_sequential()
+
+        if profiler is not None:
+            bookkeeping_started = time.perf_counter()
+        self.turns_elapsed += 1
+        self._commit_delta()
+        if profiler is not None:
+            now = time.perf_counter()
+            profiler.add("bookkeeping", now - bookkeeping_started)
+            profiler.count("path_cache_hits", self.path_cache.hits - cache_hits)
+            profiler.count("path_cache_misses", self.path_cache.misses - cache_misses)
+            profiler.end_tick(now - started)
+        return False
+
+    def _step_batch(self):
+        deposited, picked = self.fleet.step(self.grid, self.base_field, self.explored, self.profiler)
+        if self.profiler is not None:
+            started = time.perf_counter()
+        self.deposited_trash += deposited
+        for position in picked:
+            self.trash_positions.discard(position)
+            self.trash_index.remove(position)
+            self.path_cache.discard(position)
+        self._dirty_cells.update(self.fleet.changed_cells)
+        self._dirty_robots.update(self.fleet.changed_robots)
+        if self.profiler is not None:
+            self.profiler.add("bookkeeping", time.perf_counter() - started)
+
+    def _step_sequential(self):
+        # Positions actuelles des robots pour éviter les collisions (et obstacles statiques s'il y en a)
+        robot_positions = self._robot_positions()
+        if self.walls:
+            robot_positions = BlockedView(robot_positions, self.walls)
+        base_field = self.base_field
+        # Chronométrage par phase seulement si l'instrumentation est active
+        profiler = self.profiler
+        clock = time.perf_counter
 
-            # Retirer les déchets ramassés de la connaissance du robot
-            robot.known_trash -= self.trash_positions
+        # Perception de toute la flotte, puis attribution des déchets aux robots libres
+        self._perceive_and_assign(robot_positions)
+        allocator = self.allocator
+
+        for robot in self.robots:
+            if profiler is not None:
+                started = clock()
+                pathfinding_before = profiler.current("pathfinding")
+            # Chaque robot ne poursuit que le déchet qui lui est réservé ; sans chemin, la réservation
+            # est rendue pour qu'un autre robot puisse le prendre au tour suivant
+            target = allocator.target(robot.id)
+            find_path = self.find_path
+            if target is not None and not robot.carrying_trash and target != (robot.x, robot.y):
+                path = self.find_path((robot.x, robot.y), target, robot_positions)
+                if path:
+                    # Même robot, mêmes positions : la décision reprend ce chemin au lieu de relancer A*
+                    find_path = lambda start, goal, obstacles=None, path=path: path
+                else:
+                    allocator.release_robot(robot.id)
+                    target = None
+            visible_trash = [target] if target is not None else []
 
             # Décider de l'action
-            action = robot.decide_action(self.grid, self.base_position, robot_positions)
-
-            # Exécuter l'action
-            if action.startswith("move"):
-                _, dx, dy = action.split(":")
-                dx, dy = int(dx), int(dy)
-
-                # Mettre à jour la grille et la position du robot
-                if robot.move(dx, dy, self.grid_size, list(robot_positions - {(robot.x, robot.y)})):
-                    # Enlever le robot de son ancienne position
-                    # self.grid[robot.x - dx][robot.y - dy] = "."
-                    old_x, old_y = robot.x - dx, robot.y - dy
-                    if (old_x, old_y) == self.base_position:
-                        self.grid[old_x][old_y] = "B"
-                    else:
-                        self.grid[old_x][old_y] = "."
+            action = robot.decide_action(self.grid, self.base_position, robot_positions, visible_trash,
+                                         find_path, base_field, self.explored)
+            if profiler is not None:
+                # Le temps passé dans A* est compté à part (voir find_path)
+                now = clock()
+                profiler.add("decision", now - started - (profiler.current("pathfinding") - pathfinding_before))
+                started = now
+
+            self._apply_action(robot, action, robot_positions)
+
+            if profiler is not None:
+                profiler.add("movement", clock() - started)
+
+    def _step_cooperative(self):
+        # Comme le mode séquentiel, mais les robots planifient par ordre de priorité dans une table de
+        # réservations espace-temps (WHCA*) : aucun robot n'entre dans une case promise à un autre, et les
+        # robots bloqués trop longtemps sont examinés pour détecter les interblocages
+        robot_positions = self._robot_positions()
+        if self.walls:
+            robot_positions = BlockedView(robot_positions, self.walls)
+        base_field = self.base_field
+        profiler = self.profiler
+        clock = time.perf_counter
+
+        self._perceive_and_assign(robot_positions)
+        if profiler is not None:
+            started = clock()
+        planner = self.planner
+        table = planner.table
+        turn = self.turns_elapsed
+
+        # Buts du tour (base pour les robots chargés, déchet réservé sinon) et ordre de priorité
+        goals: Dict[int, Tuple[Tuple[int, int], Callable]] = {}
+        keys: Dict[int, Tuple] = {}
+        for robot in self.robots:
+            position = (robot.x, robot.y)
+            goal = self._cooperative_goal(robot, base_field)
+            if goal is not None:
+                goals[robot.id] = goal
+            base_distance = base_field.distance(*position)
+            if robot.carrying_trash:
+                rank, distance = RANK_CARRYING, max(base_distance, 0)
+            elif 0 <= base_distance <= LEAVE_RADIUS:
+                # Robot vide près de la base : il doit dégager la place pour les robots chargés
+                rank, distance = RANK_LEAVING_BASE, base_distance
+            elif goal is not None:
+                rank, distance = RANK_TARGET, goal[1](*position)
+            else:
+                rank, distance = RANK_EXPLORING, 0
+            keys[robot.id] = planner.priority(robot.id, rank, distance)
+
+        # Case de sortie de la base, interdite aux robots chargés : le robot qui vient de déposer peut toujours
+        # quitter la base, même quand la file d'attente l'entoure
+        self._base_exit = self._exit_cell()
+
+        # Chaque robot garde sa case au tour suivant tant qu'il n'a pas planifié
+        table.clear()
+        for robot in self.robots:
+            table.reserve_cell(robot.id, (robot.x, robot.y), turn + 1)
+        reserved = ReservedCells(table, turn + 1, self.walls, self.base_position)
+        if profiler is not None:
+            profiler.add("decision", clock() - started)
 
-                    # Si la nouvelle position contient un déchet et que le robot porte déjà un déchet,
-                    # remettre le déchet sur la case
-                    if (robot.x, robot.y) in self.trash_positions:
-                        self.grid[robot.x][robot.y] = "RT"  # Indique qu’un robot est sur un déchet
+        wanted: Dict[int, Optional[Tuple[int, int]]] = {}
+        occupant = {(robot.x, robot.y): robot.id for robot in self.robots}
+        # Robots déjà joués ce tour-ci (y compris ceux poussés par un robot prioritaire)
+        done: Set[int] = set()
+        for robot in sorted(self.robots, key=lambda robot: keys[robot.id]):
+            if robot.id in done:
+                continue
+            if profiler is not None:
+                started = clock()
+                pathfinding_before = profiler.current("pathfinding")
+            table.release(robot.id)
+            start = (robot.x, robot.y)
+            goal = goals.get(robot.id)
+            action = None
+            if robot.id in planner.yielding:
+                # Céder le passage : s'écarter de la base (ou du but des autres) vers une case libre
+                step = planner.side_step(robot.id, start, turn, self._passable(None, robot), base_field.distance)
+                if step is not None:
+                    action = f"move:{step[0] - robot.x}:{step[1] - robot.y}"
+            elif goal is not None:
+                passable = self._passable(goal[0], robot)
+                path = planner.reuse(robot.id, start, goal[0], turn)
+                if path is None and planner.boxed(robot.id, start, turn, passable):
+                    # Encerclé au tour suivant : attendre, sans chercher plus loin (replanifié au prochain tour)
+                    action = "wait"
+                elif path is None:
+                    path = planner.plan(robot.id, start, goal[0], turn, passable, goal[1])
+                if path:
+                    table.reserve_path(robot.id, start, path, turn)
+                    if path[0] != start:
+                        action = f"move:{path[0][0] - robot.x}:{path[0][1] - robot.y}"
                     else:
-                        self.grid[robot.x][robot.y] = "R"
+                        action = "wait"
+                elif robot.carrying_trash:
+                    # Pas de plan sans conflit vers la base : attendre (pas de détour glouton par la sortie)
+                    action = "wait"
+            if action is None:
+                # Exploration, ramassage, dépôt : décision habituelle, au vu des cases réservées au tour suivant
+                visible_trash = [goal[0]] if goal is not None and not robot.carrying_trash else []
+                reserved.current = start
+                action = robot.decide_action(self.grid, self.base_position, reserved, visible_trash,
+                                             self.find_path, base_field, self.explored)
+            if robot.id not in table.owned:
+                # Action hors plan : réserver la case du tour suivant (l'attente si elle est déjà promise)
+                target = start
+                if action.startswith("move"):
+                    _, dx, dy = action.split(":")
+                    target = (robot.x + int(dx), robot.y + int(dy))
+                    if not table.can_move(robot.id, start, target, turn):
+                        action, target = "wait", start
+                table.reserve_move(robot.id, start, target, turn)
+            if action == "wait" and keys[robot.id][0] <= RANK_LEAVING_BASE:
+                # Robot urgent (dégage la base ou cède le passage) : il hérite de la priorité sur ses voisins pas
+                # encore joués et leur demande de s'écarter
+                step = self._push(robot, turn, occupant, done, robot_positions)
+                if step is not None:
+                    action = f"move:{step[0] - robot.x}:{step[1] - robot.y}"
+            elif action == "wait" and robot.carrying_trash and self._exchange(robot, turn, occupant, done):
+                action = None
+            if profiler is not None:
+                now = clock()
+                profiler.add("decision", now - started - (profiler.current("pathfinding") - pathfinding_before))
+                started = now
 
-                    # Mettre à jour les positions des robots
-                    robot_positions.remove((robot.x - dx, robot.y - dy))
-                    robot_positions.add((robot.x, robot.y))
+            progressed = self._cooperative_act(robot, action, robot_positions, occupant) if action else True
+            done.add(robot.id)
+            if not progressed:
+                wanted[robot.id] = self._wanted_cell(robot, goal, base_field)
+            if profiler is not None:
+                profiler.add("movement", clock() - started)
 
-            elif action == "pickup":
-                if (robot.x, robot.y) in self.trash_positions and robot.pickup_trash():
-                    self.trash_positions.remove((robot.x, robot.y))
-                    self.grid[robot.x][robot.y] = "R"  # Le robot est maintenant sur la case (sans déchet)
-                    # Informer les autres robots que ce déchet a été ramassé
-                    for other_robot in self.robots:
-                        if (robot.x, robot.y) in other_robot.known_trash:
-                            other_robot.known_trash.remove((robot.x, robot.y))
+        if profiler is not None:
+            started = clock()
+        self._resolve_deadlocks(wanted, keys)
+        if profiler is not None:
+            profiler.add("decision", clock() - started)
 
-            elif action == "deposit":
-                if (robot.x, robot.y) == self.base_position and robot.deposit_trash():
-                    self.deposited_trash += 1
+    def _cooperative_act(self, robot: Robot, action: str, robot_positions, occupant: Dict) -> bool:
+        start = (robot.x, robot.y)
+        progressed = self._apply_action(robot, action, robot_positions)
+        if (robot.x, robot.y) != start:
+            del occupant[start]
+            occupant[(robot.x, robot.y)] = robot.id
+        self.planner.record(robot.id, progressed)
+        return progressed
 
-            # Pour "wait", aucune action à effectuer
+    def _push(self, robot: Robot, turn: int, occupant: Dict, done: Set[int],
+              robot_positions) -> Optional[Tuple[int, int]]:
+        # Héritage de priorité : le robot urgent cherche (en largeur) la plus courte chaîne de robots voisins pas
+        # encore joués qui mène à une case libre, puis la chaîne avance d'une case en partant du bout (chaque
+        # robot poussé joue immédiatement). Renvoie la case obtenue par le robot (déjà réservée) ou None
+        table = self.planner.table
+        start = (robot.x, robot.y)
+        parents: Dict[Tuple[int, int], Optional[Tuple[int, int]]] = {start: None}
+        queue = deque([start])
+        free_cell = None
+        while queue and free_cell is None and len(parents) < PUSH_LIMIT:
+            cell = queue.popleft()
+            mover = robot if cell == start else self.robots[occupant[cell]]
+            passable = self._passable(None, mover)
+            # Un robot chargé n'est jamais repoussé loin de la base (il y reviendrait au tour suivant)
+            limit = self.base_field.distance(*cell) if mover.carrying_trash and mover is not robot else None
+            for neighbor in self._preferred_cells(mover):
+                if neighbor in parents or not passable(*neighbor):
+                    continue
+                if limit is not None and not 0 <= self.base_field.distance(*neighbor) < limit:
+                    continue
+                other = occupant.get(neighbor)
+                if other is None:
+                    if table.can_move(mover.id, cell, neighbor, turn):
+                        parents[neighbor] = cell
+                        free_cell = neighbor
+                        break
+                elif other not in done:
+                    parents[neighbor] = cell
+                    queue.append(neighbor)
+        if free_cell is None:
+            return None
 
+        chain = [free_cell]
+        while parents[chain[-1]] is not None:
+            chain.append(parents[chain[-1]])
+        # chain : case libre, ..., case du robot urgent ; les robots poussés avancent du bout vers le début
+        for index in range(1, len(chain) - 1):
+            pushed = self.robots[occupant[chain[index]]]
+            target = chain[index - 1]
+            table.release(pushed.id)
+            table.reserve_move(pushed.id, chain[index], target, turn)
+            self._cooperative_act(pushed, f"move:{target[0] - pushed.x}:{target[1] - pushed.y}", robot_positions,
+                                  occupant)
+            done.add(pushed.id)
+        table.release(robot.id)
+        table.reserve_move(robot.id, start, chain[-2], turn)
+        return chain[-2]
+
+    def _exchange(self, robot: Robot, turn: int, occupant: Dict, done: Set[int]) -> bool:
+        # Robot chargé bloqué : un robot vide qui attend sur une case plus proche de la base lui cède sa place en
+        # prenant la sienne (les deux cases leur sont réservées, aucun autre robot n'y entre). Chaque échange
+        # rapproche un robot chargé de la base : la foule ne peut pas tourner en rond, même quand les robots
+        # vides encerclent la base
+        table = self.planner.table
+        base_field = self.base_field
+        start = (robot.x, robot.y)
+        distance = base_field.distance(*start)
+        passable = self._passable(self.base_position, robot)
+        for cell in self._preferred_cells(robot):
+            other_id = occupant.get(cell)
+            if other_id is None or not passable(*cell) or not 0 <= base_field.distance(*cell) < distance:
+                continue
+            other = self.robots[other_id]
+            if other.carrying_trash or table.cells.get((cell, turn + 1)) != other_id:
+                continue
+            table.release(robot.id)
+            table.release(other_id)
+            table.reserve_cell(robot.id, cell, turn + 1)
+            table.reserve_cell(other_id, start, turn + 1)
+            # Mêmes cases occupées avant et après : seules les positions des deux robots changent
+            for mover, (x, y) in ((robot, cell), (other, start)):
+                mover.x, mover.y = x, y
+                mover.visited_cells.add((x, y))
+                self.explored[x, y] = True
+                self._dirty_robots.add(mover.id)
+                self.planner.record(mover.id, True)
+                occupant[(x, y)] = mover.id
+            done.add(other_id)
+            if self.profiler is not None:
+                self.profiler.count("moves", 2)
+            return True
         return False
 
+    def _preferred_cells(self, robot: Robot) -> List[Tuple[int, int]]:
+        # Voisins par ordre de préférence : vers la base pour un robot chargé, en s'en éloignant sinon
+        # (la congestion se forme autour de la base)
+        base_field = self.base_field
+        cells = [(robot.x + 1, robot.y), (robot.x - 1, robot.y), (robot.x, robot.y + 1), (robot.x, robot.y - 1)]
+        distances = {cell: base_field.distance(*cell) if 0 <= cell[0] < self.grid_size
+                     and 0 <= cell[1] < self.grid_size else -1 for cell in cells}
+        if robot.carrying_trash:
+            return sorted(cells, key=lambda cell: distances[cell] if distances[cell] >= 0 else self.grid_size ** 2)
+        return sorted(cells, key=lambda cell: -distances[cell])
+
+    def _cooperative_goal(self, robot: Robot, base_field) -> Optional[Tuple[Tuple[int, int], Callable]]:
+        # (but, heuristique) du robot ; None s'il explore, ramasse ou dépose ce tour-ci
+        position = (robot.x, robot.y)
+        if robot.carrying_trash:
+            if position == self.base_position:
+                return None
+            return self.base_position, base_field.distance
+        target = self.allocator.target(robot.id)
+        if target is None or target == position:
+            return None
+        # Chemin statique (mis en cache) : vérifie que le déchet est atteignable et guide la recherche
+        # fenêtrée au-delà de l'horizon (distance à la case du chemin atteinte à l'horizon + reste du chemin)
+        guide = self.find_path(position, target)
+        if not guide:
+            self.allocator.release_robot(robot.id)
+            return None
+        horizon = min(self.planner.window, len(guide)) - 1
+        (waypoint_x, waypoint_y), rest = guide[horizon], len(guide) - horizon - 1
+        return target, lambda x, y: abs(x - waypoint_x) + abs(y - waypoint_y) + rest
+
+    def _passable(self, goal: Optional[Tuple[int, int]], robot: Optional[Robot] = None) -> Callable[[int, int], bool]:
+        # Cases franchissables hors robots : dans la grille, sans obstacle statique (la base seulement comme but),
+        # et hors de la sortie de la base pour un robot chargé
+        size = self.grid_size
+        blocked = self.pathfinder.static_blocked
+        closed = self._base_exit if robot is not None and robot.carrying_trash else None
+
+        def passable(x: int, y: int) -> bool:
+            return (0 <= x < size and 0 <= y < size and (not blocked[x * size + y] or (x, y) == goal)
+                    and (x, y) != closed)
+        return passable
+
+    def _exit_cell(self) -> Optional[Tuple[int, int]]:
+        # Premier voisin franchissable de la base (ordre fixe), seulement s'il en reste un autre pour entrer
+        passable = self._passable(None)
+        base_x, base_y = self.base_position
+        ring = [(x, y) for x, y in ((base_x + 1, base_y), (base_x - 1, base_y), (base_x, base_y + 1),
+                                    (base_x, base_y - 1)) if passable(x, y)]
+        return ring[0] if len(ring) > 1 else None
+
+    def _wanted_cell(self, robot: Robot, goal, base_field) -> Optional[Tuple[int, int]]:
+        # Case que le robot aurait voulue ce tour-ci (graphe d'attente) : premier pas de son chemin statique
+        if goal is None:
+            return None
+        if robot.carrying_trash:
+            return base_field.next_step(robot.x, robot.y)
+        guide = self.find_path((robot.x, robot.y), goal[0])
+        return guide[0] if guide else None
+
+    def _resolve_deadlocks(self, wanted: Dict[int, Optional[Tuple[int, int]]], keys: Dict[int, Tuple]):
+        planner = self.planner
+        if not any(planner.stalled(robot_id) for robot_id in wanted):
+            return
+        occupant = {(robot.x, robot.y): robot.id for robot in self.robots}
+        free = self._passable(None)
+
+        def can_yield(robot_id: int) -> bool:
+            robot = self.robots[robot_id]
+            return any(free(x, y) and (x, y) not in occupant
+                       for x, y in ((robot.x + 1, robot.y), (robot.x - 1, robot.y),
+                                    (robot.x, robot.y + 1), (robot.x, robot.y - 1)))
+
+        for group in planner.find_deadlocks(wanted, occupant):
+            victim = planner.resolve(group, keys, can_yield)
+            if victim is not None:
+                # Le robot qui s'écarte rend son déchet : un autre pourra le prendre
+                self.allocator.release_robot(victim)
+                if self.profiler is not None:
+                    self.profiler.count("deadlocks")
+
+    def _perceive_and_assign(self, robot_positions):
+        profiler = self.profiler
+        clock = time.perf_counter
+        if profiler is not None:
+            started = clock()
+        allocator = self.allocator
+        candidates = []
+        for robot in self.robots:
+            # (les déchets ramassés sont retirés des connaissances au ramassage, voir _apply_action)
+            visible_trash = robot.perceive(self.trash_index, robot_positions)
+            robot.known_trash.update(visible_trash)
+            allocator.observe(robot.id, visible_trash)
+            if visible_trash and not robot.carrying_trash and allocator.target(robot.id) is None:
+                candidates.append((robot.id, robot.x, robot.y, visible_trash))
+        if profiler is not None:
+            now = clock()
+            profiler.add("perception", now - started)
+            started = now
+        allocator.assign(candidates)
+        if profiler is not None:
+            profiler.add("decision", clock() - started)
+
+    def _apply_action(self, robot: Robot, action: str, robot_positions) -> bool:
+        # Exécute l'action décidée ; renvoie True si le robot a progressé (déplacement, ramassage, dépôt)
+        profiler = self.profiler
+        allocator = self.allocator
+        if action.startswith("move"):
+            _, dx, dy = action.split(":")
+            dx, dy = int(dx), int(dy)
+
+            # Mettre à jour la grille et la position du robot
+            # dx/dy ne sont jamais nuls : la case du robot lui-même n'est pas une cible
+            if robot.move(dx, dy, self.grid_size, robot_positions):
+                # Enlever le robot de son ancienne position
+                # self.grid[robot.x - dx][robot.y - dy] = "."
+                old_x, old_y = robot.x - dx, robot.y - dy
+                if (old_x, old_y) in self.trash_positions:
+                    # Le déchet laissé sous le robot redevient visible
+                    self._set_cell(old_x, old_y, "T")
+                elif (old_x, old_y) == self.base_position:
+                    self._set_cell(old_x, old_y, "B")
+                else:
+                    self._set_cell(old_x, old_y, ".")
+
+                # Si la nouvelle position contient un déchet et que le robot porte déjà un déchet,
+                # remettre le déchet sur la case
+                if (robot.x, robot.y) in self.trash_positions:
+                    self._set_cell(robot.x, robot.y, "RT")  # Indique qu’un robot est sur un déchet
+                else:
+                    self._set_cell(robot.x, robot.y, "R")
+
+                # Mettre à jour les positions des robots
+                robot_positions.remove((robot.x - dx, robot.y - dy))
+                robot_positions.add((robot.x, robot.y))
+                self.explored[robot.x, robot.y] = True
+                self._dirty_robots.add(robot.id)
+                if profiler is not None:
+                    profiler.count("moves")
+                return True
+            if profiler is not None:
+                profiler.count("blocked_moves")
+
+        elif action == "pickup":
+            if (robot.x, robot.y) in self.trash_positions and robot.pickup_trash():
+                self.trash_positions.remove((robot.x, robot.y))
+                self.trash_index.remove((robot.x, robot.y))
+                self.path_cache.discard((robot.x, robot.y))
+                self._set_cell(robot.x, robot.y, "R")  # Le robot est maintenant sur la case (sans déchet)
+                self._dirty_robots.add(robot.id)
+                # Libérer les réservations et informer les robots qui connaissaient ce déchet
+                allocator.release_robot(robot.id)
+                for watcher in allocator.release_trash((robot.x, robot.y)):
+                    self.robots[watcher].known_trash.discard((robot.x, robot.y))
+                if profiler is not None:
+                    profiler.count("pickups")
+                return True
+
+        elif action == "deposit":
+            if (robot.x, robot.y) == self.base_position and robot.deposit_trash():
+                self.deposited_trash += 1
+                self._dirty_robots.add(robot.id)
+                if profiler is not None:
+                    profiler.count("deposits")
+                return True
+
+        # Pour "wait", aucune action à effectuer (robot bloqué)
+        elif profiler is not None:
+            profiler.count("blocked_moves")
+        return False
+
+    def _robot_record(self, robot_id: int) -> Dict:
+        if self.fleet is not None:
+            fleet = self.fleet
+            return {"id": robot_id, "x": int(fleet.xs[robot_id]), "y": int(fleet.ys[robot_id]),
+                    "carrying_trash": bool(fleet.carrying[robot_id])}
+        robot = self.robots[robot_id]
+        return {"id": robot.id, "x": robot.x, "y": robot.y, "carrying_trash": robot.carrying_trash}
+
+    def _commit_delta(self):
+        # Enregistre les changements du tour sous un nouveau numéro de version
+        self.version += 1
+        self.modified_at = time.time()
+        grid = self.grid
+        self._deltas.append({
+            "version": self.version,
+            "cells": [[x, y, grid[x][y]] for x, y in self._dirty_cells],
+            "robots": [self._robot_record(robot_id) for robot_id in sorted(self._dirty_robots)],
+        })
+        self._dirty_cells = set()
+        self._dirty_robots = set()
+        if self.recorder is not None:
+            self._record_frame()
+
+    @property
+    def etag(self) -> str:
+        return f"{self.lineage}-{self.version}"
+
+    def rendered(self, key: str, render: Callable[[], bytes]) -> bytes:
+        # Sérialisation de l'état courant calculée une fois par version, puis resservie telle quelle
+        if self._rendered_version != self.version:
+            self._rendered = {}
+            self._rendered_version = self.version
+        body = self._rendered.get(key)
+        if body is None:
+            body = self._rendered[key] = render()
+        return body
+
+    def get_delta(self, since_version: int) -> Optional[Dict]:
+        # Changements cumulés depuis since_version, ou None si une image complète est nécessaire
+        if since_version > self.version:
+            return None
+        if since_version < self.version:
+            oldest = self._deltas[0]["version"] if self._deltas else self.version + 1
+            if since_version + 1 < oldest:
+                return None
+        cells = {}
+        robots = {}
+        for delta in self._deltas:
+            if delta["version"] <= since_version:
+                continue
+            for x, y, value in delta["cells"]:
+                cells[(x, y)] = value
+            for record in delta["robots"]:
+                robots[record["id"]] = record
+        return {
+            "version": self.version,
+            "since": since_version,
+            "cells": [[x, y, value] for (x, y), value in cells.items()],
+            "robots": [robots[robot_id] for robot_id in sorted(robots)],
+            "trash_remaining": self.num_trash - self.deposited_trash,
+        }
+
+    def estimate_memory(self) -> int:
+        # Estimation (en octets) de l'empreinte du moteur, utilisée pour le budget mémoire du registre
+        cells = self.grid_size * self.grid_size
+        if self.storage == "chunked":
+            # Blocs actifs seulement ; pathfinding et champ de distances sans tampon par case
+            size = self.grid.nbytes + self.explored.nbytes + self.walls.nbytes
+        else:
+            if self.storage == "numpy":
+                size = 3 * cells
+            else:
+                # Un pointeur par case plus l'en-tête de chaque ligne
+                size = 8 * cells + 64 * self.grid_size
+            # Tampons du pathfinding (masque + 4 tableaux d'entiers), champ de distances, couverture de la flotte,
+            # obstacles
+            size += 23 * cells
+        # Par robot : bitset des cases visitées et déchets connus (~ 100 octets)
+        size += sum(robot.visited_cells.nbytes + 100 * len(robot.known_trash) + 200 for robot in self.robots)
+        size += 100 * len(self.trash_positions)
+        size += sum(len(body) for body in self._rendered.values())
+        return size
+
+    def get_layers(self) -> Dict:
+        # Vues (sans copie) sur les couches numpy du monde
+        if self.storage != "numpy":
+            raise ValueError("Les couches ne sont disponibles qu'avec le stockage numpy")
+        return {"cells": self.grid.cells, "occupancy": self.grid.occupancy, "trash": self.grid.trash,
+                "explored": self.explored}
+
+    def get_coverage(self) -> Dict:
+        # Part de la grille déjà visitée par la flotte
+        if self.storage == "chunked":
+            explored = len(self.explored)
+        else:
+            explored = int(np.count_nonzero(self.explored))
+        total = self.grid_size * self.grid_size
+        return {"explored_cells": explored, "total_cells": total, "ratio": explored / total}
+
+    def get_explored(self) -> np.ndarray:
+        # Couche booléenne de couverture (reconstituée à partir des blocs pour le stockage par blocs)
+        if self.storage == "chunked":
+            return self.explored.to_array()
+        return self.explored
+
+    def clip_box(self, bbox: Tuple[int, int, int, int]) -> Tuple[int, int, int, int]:
+        x0, y0, x1, y1 = bbox
+        size = self.grid_size
+        return max(0, x0), max(0, y0), min(size, x1), min(size, y1)
+
+    def _window(self, x0: int, y0: int, x1: int, y1: int) -> List[List[str]]:
+        if self.storage == "list":
+            return [row[y0:y1] for row in self.grid[x0:x1]]
+        if self.storage == "numpy":
+            codes = self.grid.cells[x0:x1, y0:y1]
+        else:
+            codes = self.grid.window(x0, y0, x1, y1)
+        return np.array(CELL_NAMES, dtype=object)[codes].tolist()
+
+    def _robots_in(self, x0: int, y0: int, x1: int, y1: int) -> List[Dict]:
+        if self.fleet is not None:
+            fleet = self.fleet
+            inside = np.flatnonzero((fleet.xs >= x0) & (fleet.xs < x1) & (fleet.ys >= y0) & (fleet.ys < y1))
+            return [self._robot_record(robot_id) for robot_id in fleet.ids[inside].tolist()]
+        return [
+            {"id": robot.id, "x": robot.x, "y": robot.y, "carrying_trash": robot.carrying_trash}
+            for robot in self.robots if x0 <= robot.x < x1 and y0 <= robot.y < y1
+        ]
+
+    def get_region(self, bbox: Tuple[int, int, int, int], downsample: int = 1) -> Dict:
+        # Fenêtre [x0, x1) x [y0, y1) (coordonnées absolues) lue sur les structures du moteur, sans construire
+        # la grille complète. downsample > 1 : nombre de déchets et de robots par bloc de downsample² cases
+        x0, y0, x1, y1 = self.clip_box(bbox)
+        x1, y1 = max(x0, x1), max(y0, y1)
+        data = {
+            "version": self.version,
+            "bbox": [x0, y0, x1, y1],
+            "trash_remaining": self.num_trash - self.deposited_trash,
+            "turns_elapsed": self.turns_elapsed,
+        }
+        if downsample <= 1:
+            data["cells"] = self._window(x0, y0, x1, y1)
+            data["robots"] = self._robots_in(x0, y0, x1, y1)
+            return data
+
+        shape = (-(-(x1 - x0) // downsample), -(-(y1 - y0) // downsample))
+        trash = np.zeros(shape, dtype=np.int32)
+        robots = np.zeros(shape, dtype=np.int32)
+        if x1 > x0 and y1 > y0:
+            positions = np.array(self.trash_index.query_box(x0, y0, x1 - 1, y1 - 1), dtype=np.int64).reshape(-1, 2)
+            np.add.at(trash, ((positions[:, 0] - x0) // downsample, (positions[:, 1] - y0) // downsample), 1)
+            records = self._robots_in(x0, y0, x1, y1)
+            for record in records:
+                robots[(record["x"] - x0) // downsample, (record["y"] - y0) // downsample] += 1
+        data["downsample"] = downsample
+        data["trash"] = trash.tolist()
+        data["robots"] = robots.tolist()
+        return data
+
     def get_grid_state(self) -> Dict:
+        if self.storage != "list":
+            grid = self.grid.to_strings()
+        else:
+            grid = [row[:] for row in self.grid]
+        if self.fleet is not None:
+            robots = self.fleet.robot_records()
+        else:
+            robots = [
+                {"id": robot.id, "x": robot.x, "y": robot.y, "carrying_trash": robot.carrying_trash}
+                for robot in self.robots
+            ]
+        return {
+            "version": self.version,
+            "grid": grid,
+            "robots": robots,
+            "trash_remaining": self.num_trash - self.deposited_trash,
+            "turns_elapsed": self.turns_elapsed,
+        }
+
+    def _packed_robots(self) -> np.ndarray:
+        # Robots sous forme de tableau int32 (id, x, y, porte_un_déchet)
+        if self.fleet is not None:
+            fleet = self.fleet
+            return np.stack([fleet.ids, fleet.xs, fleet.ys, fleet.carrying.astype(np.int32)], axis=1)
+        packed = np.empty((len(self.robots), 4), dtype=np.int32)
+        for index, robot in enumerate(self.robots):
+            packed[index] = (robot.id, robot.x, robot.y, robot.carrying_trash)
+        return packed
+
+    def get_packed_state(self) -> Dict:
+        # État complet en tableaux compacts (codes de cases uint8), sans objets Python par case
+        if self.storage == "numpy":
+            cells = self.grid.cells
+        elif self.storage == "chunked":
+            cells = self.grid.to_dense()
+        else:
+            cells = np.array([[CELL_CODES[value] for value in row] for row in self.grid], dtype=np.uint8)
         return {
-            "grid": [row[:] for row in self.grid],
+            "version": self.version,
+            "grid_size": self.grid_size,
+            "cells": cells,
+            "robots": self._packed_robots(),
+            "trash_remaining": self.num_trash - self.deposited_trash,
+        }
+
+    def get_packed_delta(self, since_version: int) -> Optional[Dict]:
+        delta = self.get_delta(since_version)
+        if delta is None:
+            return None
+        changes = delta["cells"]
+        robots = delta["robots"]
+        return {
+            "version": delta["version"],
+            "since": since_version,
+            "grid_size": self.grid_size,
+            "cell_positions": np.array([(x, y) for x, y, _ in changes], dtype=np.int32).reshape(-1, 2),
+            "cell_codes": np.array([CELL_CODES[value] for _, _, value in changes], dtype=np.uint8),
+            "robots": np.array([(r["id"], r["x"], r["y"], r["carrying_trash"]) for r in robots],
+                               dtype=np.int32).reshape(-1, 4),
+            "trash_remaining": delta["trash_remaining"],
+        }
+
+    def snapshot(self) -> bytes:
+        # Sérialise tout l'état du moteur (grille, robots, connaissances, générateurs) en un blob compact
+        if self.fleet is not None:
+            self.fleet.sync_to(self.robots)
+        state = {
+            "config": {
+                "grid_size": self.grid_size,
+                "num_robots": self.num_robots,
+                "num_trash": self.num_trash,
+                "base_position": self.base_position,
+                "storage": self.storage,
+                "step_mode": self.step_mode,
+                "vision_radius": self.vision_radius,
+                "seed": self.seed,
+            },
+            "deposited_trash": self.deposited_trash,
+            "version": self.version,
+            "lineage": self.lineage,
+            "modified_at": self.modified_at,
+            "turns_elapsed": self.turns_elapsed,
+            "flushed_turns": self.flushed_turns,
+            "trash_positions": list(self.trash_positions),
+            "walls": self.walls,
+            "claims": list(self.allocator.target_of.items()),
+            "paths": self.path_cache.to_state(),
+            "watchers": [(position, list(robots)) for position, robots in self.allocator.watchers.items()],
             "robots": [
-                {"id": robot.id, "x": robot.x, "y": robot.y, "carrying_trash": robot.carrying_trash}
+                (robot.x, robot.y, robot.carrying_trash, list(robot.known_trash), robot.visited_cells,
+                 robot.random_direction, robot.steps_in_direction)
                 for robot in self.robots
             ],
-            "trash_remaining": self.num_trash - self.deposited_trash,
+            "rng": self.rng.getstate(),
+            "profiler": self.profiler,
+            "replay": (self.recorder.path, self.recorder.keyframe_every) if self.recorder is not None else None,
         }
+        if self.planner is not None:
+            planner = self.planner
+            state["planner"] = {"waits": planner.waits, "yielding": planner.yielding, "plans": planner.plans,
+                                "deadlocks": planner.deadlocks}
+        if self.storage == "chunked":
+            # Blocs actifs seulement (une grille de 4096² vide ne pèse presque rien)
+            state["chunks"] = self.grid.to_chunks()
+            state["explored"] = self.explored
+        else:
+            state["cells"] = self.get_packed_state()["cells"].tobytes()
+            state["explored"] = np.packbits(self.explored).tobytes()
+        if self.fleet is not None:
+            fleet = self.fleet
+            state["fleet"] = {
+                "dir_x": fleet.dir_x.tobytes(),
+                "dir_y": fleet.dir_y.tobytes(),
+                "steps_in_direction": fleet.steps_in_direction.tobytes(),
+                "rng": fleet.rng.bit_generator.state,
+            }
+        return zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+    @classmethod
+    def restore(cls, blob: bytes) -> "SimulationEngine":
+        state = pickle.loads(zlib.decompress(blob))
+        engine = cls.__new__(cls)
+        engine._configure(**state["config"])
+        engine.deposited_trash = state["deposited_trash"]
+        engine.version = state["version"]
+        engine.lineage = state.get("lineage", engine.lineage)
+        engine.modified_at = state.get("modified_at", engine.modified_at)
+        engine.turns_elapsed = state.get("turns_elapsed", 0)
+        engine.flushed_turns = state.get("flushed_turns", engine.turns_elapsed)
+
+        if engine.storage == "chunked":
+            engine.grid.load_chunks(state["chunks"])
+            engine.explored = state["explored"]
+        else:
+            engine._restore_cells(state)
+        engine._dirty_cells = set()
+        engine.trash_positions = set(state["trash_positions"])
+        engine.walls = state.get("walls", engine.walls)
+
+        for robot_id, (x, y, carrying, known_trash, visited, direction, steps) in enumerate(state["robots"]):
+            robot = Robot(x, y, robot_id, engine.vision_radius, engine.rng)
+            robot.carrying_trash = carrying
+            robot.known_trash = set(known_trash)
+            # Les anciens snapshots stockent le bitset sous forme d'octets
+            if isinstance(visited, bytes):
+                visited = CellBitset(engine.grid_size, visited)
+            robot.visited_cells = visited
+            robot.random_direction = direction
+            robot.steps_in_direction = steps
+            engine.robots.append(robot)
+
+        engine._build_indexes()
+        engine.path_cache.load_state(state.get("paths", ()))
+        for robot_id, position in state.get("claims", ()):
+            engine.allocator.claim(robot_id, position)
+        for position, robots in state.get("watchers", ()):
+            engine.allocator.watchers[position] = set(robots)
+        if engine.fleet is not None:
+            fleet = engine.fleet
+            fleet.dir_x[:] = np.frombuffer(state["fleet"]["dir_x"], dtype=np.int32)
+            fleet.dir_y[:] = np.frombuffer(state["fleet"]["dir_y"], dtype=np.int32)
+            fleet.steps_in_direction[:] = np.frombuffer(state["fleet"]["steps_in_direction"], dtype=np.int32)
+            fleet.rng.bit_generator.state = state["fleet"]["rng"]
+        if engine.planner is not None and "planner" in state:
+            planner = engine.planner
+            planner.waits = state["planner"]["waits"]
+            planner.yielding = state["planner"]["yielding"]
+            planner.plans = state["planner"]["plans"]
+            planner.deadlocks = state["planner"]["deadlocks"]
+        engine.profiler = state.get("profiler")
+        if state.get("replay"):
+            # Le journal reprend à la version restaurée par une image complète (trames en attente non reprises)
+            path, keyframe_every = state["replay"]
+            engine.recorder = ReplayRecorder(path, engine.grid_size, keyframe_every)
+        # Restauré en dernier : la construction des index consomme le générateur
+        engine.rng.setstate(state["rng"])
+        return engine
+
+    def _restore_cells(self, state: Dict):
+        # Grille dense (listes ou couches numpy) et couverture depuis un snapshot
+        codes = np.frombuffer(state["cells"], dtype=np.uint8).reshape(self.grid_size, self.grid_size)
+        if self.storage == "numpy":
+            world = self.grid
+            world.cells[:] = codes
+            world.occupancy[:] = (codes == CELL_CODES["R"]) | (codes == CELL_CODES["RT"])
+            world.trash[:] = (codes == CELL_CODES["T"]) | (codes == CELL_CODES["RT"])
+            world.walls[:] = codes == CELL_CODES["#"]
+        else:
+            names = np.array(CELL_NAMES, dtype=object)
+            self.grid = names[codes].tolist()
+        cells = self.grid_size * self.grid_size
+        self.explored[:] = np.unpackbits(np.frombuffer(state["explored"], dtype=np.uint8))[:cells].reshape(
+            self.grid_size, self.grid_size)
+
+    def fork(self) -> "SimulationEngine":
+        # Branche "et si" indépendante, à partir de l'état courant (sans le journal de la partie d'origine)
+        engine = SimulationEngine.restore(self.snapshot())
+        engine.recorder = None
+        return engine
@@ -0,0 +1,93 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+Position = Tuple[int, int]
+
+
+class BucketIndex:
+    # Grille uniforme de seaux : une requête "éléments dans un rayon r" ne visite que les seaux
+    # qui recouvrent la fenêtre, son coût dépend du nombre d'éléments proches et non de r²
+
+    def __init__(self, bucket_size: int = 8, positions: Iterable[Position] = ()):
+        self.bucket_size = bucket_size
+        self.buckets: Dict[Position, Set[Position]] = {}
+        self.count = 0
+        for position in positions:
+            self.add(position)
+
+    def _key(self, position: Position) -> Position:
+        return position[0] // self.bucket_size, position[1] // self.bucket_size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, position: Position) -> bool:
+        bucket = self.buckets.get(self._key(position))
+        return bucket is not None and position in bucket
+
+    def __iter__(self):
+        for bucket in self.buckets.values():
+            yield from bucket
+
+    def add(self, position: Position):
+        bucket = self.buckets.setdefault(self._key(position), set())
+        if position not in bucket:
+            bucket.add(position)
+            self.count += 1
+
+    def remove(self, position: Position):
+        key = self._key(position)
+        bucket = self.buckets.get(key)
+        if bucket is None or position not in bucket:
+            return
+        bucket.remove(position)
+        self.count -= 1
+        # Les seaux vides sont supprimés pour garder des requêtes proportionnelles au contenu
+        if not bucket:
+            del self.buckets[key]
+
+    def move(self, old: Position, new: Position):
+        if self._key(old) == self._key(new):
+            bucket = self.buckets[self._key(old)]
+            bucket.discard(old)
+            bucket.add(new)
+        else:
+            self.remove(old)
+            self.add(new)
+
+    def query(self, x: int, y: int, radius: int) -> List[Position]:
+        # Éléments dans la fenêtre carrée [x - r, x + r] x [y - r, y + r], triés comme un balayage ligne par ligne
+        min_x, max_x = x - radius, x + radius
+        min_y, max_y = y - radius, y + radius
+        size = self.bucket_size
+        found = []
+        for bx in range(min_x // size, max_x // size + 1):
+            for by in range(min_y // size, max_y // size + 1):
+                bucket = self.buckets.get((bx, by))
+                if not bucket:
+                    continue
+                for position in bucket:
+                    if min_x <= position[0] <= max_x and min_y <= position[1] <= max_y:
+                        found.append(position)
+        found.sort()
+        return found
+
+    def query_box(self, min_x: int, min_y: int, max_x: int, max_y: int) -> List[Position]:
+        # Éléments dans le rectangle [min_x, max_x] x [min_y, max_y] (bornes incluses), même ordre que query.
+        # Sur une grande fenêtre, on parcourt les seaux existants plutôt que tous les seaux couverts
+        size = self.bucket_size
+        first_x, last_x = min_x // size, max_x // size
+        first_y, last_y = min_y // size, max_y // size
+        if (last_x - first_x + 1) * (last_y - first_y + 1) > len(self.buckets):
+            keys = [key for key in self.buckets if first_x <= key[0] <= last_x and first_y <= key[1] <= last_y]
+        else:
+            keys = [(bx, by) for bx in range(first_x, last_x + 1) for by in range(first_y, last_y + 1)]
+        found = []
+        for key in keys:
+            bucket = self.buckets.get(key)
+            if not bucket:
+                continue
+            for position in bucket:
+                if min_x <= position[0] <= max_x and min_y <= position[1] <= max_y:
+                    found.append(position)
+        found.sort()
+        return found
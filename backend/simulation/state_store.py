@@ -0,0 +1,256 @@
+import mmap
+import os
+import struct
+import threading
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+
+class StaleStateError(Exception):
+    # Levée quand un autre processus a enregistré une version plus récente de l'état
+    pass
+
+
+class EngineStateStore:
+    # Interface commune : blobs de snapshot versionnés (version 0 = absent)
+    # persistent = False : les blobs sont ignorés (inutile de sérialiser le moteur avant save)
+    persistent = True
+
+    def load(self, simulation_id: int) -> Optional[Tuple[int, bytes]]:
+        raise NotImplementedError
+
+    def version(self, simulation_id: int) -> int:
+        loaded = self.load(simulation_id)
+        return loaded[0] if loaded is not None else 0
+
+    def save(self, simulation_id: int, blob: bytes, expected_version: int) -> int:
+        # Enregistre si la version stockée vaut expected_version et renvoie la nouvelle version
+        raise NotImplementedError
+
+    def delete(self, simulation_id: int):
+        raise NotImplementedError
+
+
+class MemoryStateStore(EngineStateStore):
+    # Aucune persistance : l'état ne vit que dans le registre du processus, seules les versions sont suivies
+    persistent = False
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def load(self, simulation_id):
+        return None
+
+    def version(self, simulation_id):
+        return self._versions.get(int(simulation_id), 0)
+
+    def save(self, simulation_id, blob, expected_version):
+        with self._lock:
+            if self.version(simulation_id) != expected_version:
+                raise StaleStateError(simulation_id)
+            self._versions[int(simulation_id)] = expected_version + 1
+            return expected_version + 1
+
+    def delete(self, simulation_id):
+        self._versions.pop(int(simulation_id), None)
+
+
+class DatabaseStateStore(EngineStateStore):
+    def load(self, simulation_id):
+        from .models import SimulationState
+        row = SimulationState.objects.filter(pk=simulation_id).values_list('version', 'blob').first()
+        if row is None:
+            return None
+        return row[0], bytes(row[1])
+
+    def version(self, simulation_id):
+        from .models import SimulationState
+        return SimulationState.objects.filter(pk=simulation_id).values_list('version', flat=True).first() or 0
+
+    def save(self, simulation_id, blob, expected_version):
+        from .models import SimulationState
+        new_version = expected_version + 1
+        if expected_version == 0:
+            try:
+                with transaction.atomic():
+                    SimulationState.objects.create(simulation_id=simulation_id, version=new_version, blob=blob)
+            except IntegrityError:
+                raise StaleStateError(simulation_id)
+            return new_version
+        # Mise à jour conditionnelle : ne touche la ligne que si personne ne l'a modifiée entre-temps
+        # (update() ne renseigne pas auto_now)
+        updated = SimulationState.objects.filter(pk=simulation_id, version=expected_version).update(
+            version=new_version, blob=blob, updated_at=timezone.now())
+        if not updated:
+            raise StaleStateError(simulation_id)
+        return new_version
+
+    def delete(self, simulation_id):
+        from .models import SimulationState
+        SimulationState.objects.filter(pk=simulation_id).delete()
+
+
+class _FileLock:
+    # Verrou exclusif inter-processus (flock) sur un fichier compagnon
+    def __init__(self, path: str):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        import fcntl
+        self.handle = open(self.path, 'a+b')
+        fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        import fcntl
+        fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+
+
+class FileStateStore(EngineStateStore):
+    # Un fichier par simulation : version (uint64) puis blob. Lecture par mmap, écriture atomique (os.replace)
+    HEADER = struct.Struct('<Q')
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, simulation_id: int) -> str:
+        return os.path.join(self.directory, f'{int(simulation_id)}.state')
+
+    def _lock(self, simulation_id: int) -> "_FileLock":
+        return _FileLock(self._path(simulation_id) + '.lock')
+
+    def load(self, simulation_id):
+        try:
+            with open(self._path(simulation_id), 'rb') as handle:
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    (version,) = self.HEADER.unpack_from(mapped, 0)
+                    return version, mapped[self.HEADER.size:]
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def version(self, simulation_id):
+        try:
+            with open(self._path(simulation_id), 'rb') as handle:
+                header = handle.read(self.HEADER.size)
+        except FileNotFoundError:
+            return 0
+        return self.HEADER.unpack(header)[0] if len(header) == self.HEADER.size else 0
+
+    def save(self, simulation_id, blob, expected_version):
+        with self._lock(simulation_id):
+            if self.version(simulation_id) != expected_version:
+                raise StaleStateError(simulation_id)
+            new_version = expected_version + 1
+            path = self._path(simulation_id)
+            temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(temporary, 'wb') as handle:
+                handle.write(self.HEADER.pack(new_version))
+                handle.write(blob)
+            os.replace(temporary, path)
+            return new_version
+
+    def delete(self, simulation_id):
+        for path in (self._path(simulation_id), self._path(simulation_id) + '.lock'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class LocalKeyValueClient:
+    # Remplaçant local d'un client Redis (sous-ensemble get/set/delete/lock), sans serveur. Réservé aux tests :
+    # les données ne vivent que dans le processus, rien n'est partagé entre workers
+
+    def __init__(self):
+        self._data = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, value):
+        self._data[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self._data.pop(key, None)
+
+    def lock(self, name, timeout=None):
+        with self._guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+
+class KeyValueStateStore(EngineStateStore):
+    # Clés "<préfixe>:<id>:version" et "<préfixe>:<id>:blob" sur un client compatible Redis
+    def __init__(self, client, prefix: str = 'walle:simulation', lock_timeout: float = 10):
+        self.client = client
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+
+    def _key(self, simulation_id: int, part: str) -> str:
+        return f'{self.prefix}:{int(simulation_id)}:{part}'
+
+    def load(self, simulation_id):
+        version = self.version(simulation_id)
+        if not version:
+            return None
+        blob = self.client.get(self._key(simulation_id, 'blob'))
+        return (version, bytes(blob)) if blob is not None else None
+
+    def version(self, simulation_id):
+        version = self.client.get(self._key(simulation_id, 'version'))
+        return int(version) if version is not None else 0
+
+    def save(self, simulation_id, blob, expected_version):
+        with self.client.lock(self._key(simulation_id, 'lock'), timeout=self.lock_timeout):
+            if self.version(simulation_id) != expected_version:
+                raise StaleStateError(simulation_id)
+            new_version = expected_version + 1
+            self.client.set(self._key(simulation_id, 'blob'), blob)
+            self.client.set(self._key(simulation_id, 'version'), new_version)
+            return new_version
+
+    def delete(self, simulation_id):
+        self.client.delete(self._key(simulation_id, 'version'), self._key(simulation_id, 'blob'))
+
+
+def build_state_store(config: dict) -> EngineStateStore:
+    backend = config.get('BACKEND', 'database')
+    if backend == 'database':
+        return DatabaseStateStore()
+    if backend == 'file':
+        return FileStateStore(config.get('PATH', os.path.join(settings.BASE_DIR, 'simulation_states')))
+    if backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("Le stockage 'redis' nécessite le paquet redis")
+        return KeyValueStateStore(redis.Redis.from_url(config.get('URL', 'redis://localhost:6379/0')))
+    if backend == 'local':
+        return KeyValueStateStore(LocalKeyValueClient())
+    if backend == 'memory':
+        return MemoryStateStore()
+    raise ImproperlyConfigured(f"Stockage d'état inconnu : {backend}")
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> EngineStateStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = build_state_store(getattr(settings, 'SIMULATION_STATE_STORE', {}))
+    return _store
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import re
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .engines import get_engine_entry, mutate_engine
+from .scheduler import get_scheduler
+
+WEBSOCKET_PATH = re.compile(r'^/ws/simulations/(?P<pk>\d+)/$')
+
+
+def default_tick_rate() -> float:
+    return float(getattr(settings, 'SIMULATION_STREAM_TICK_RATE', 10))
+
+
+class LatestFrameSlot:
+    # Boîte aux lettres d'un abonné : une seule trame en attente, les plus anciennes sont écrasées.
+    # Un client lent saute donc des trames au lieu de les accumuler (backpressure)
+
+    def __init__(self, since: int):
+        self.since = since
+        self.event = asyncio.Event()
+
+    def notify(self):
+        self.event.set()
+
+    async def wait(self):
+        await self.event.wait()
+        self.event.clear()
+
+
+class SimulationBroadcaster:
+    # Une boucle par simulation, partagée par tous les spectateurs du processus. Seul le processus de la tranche
+    # de la simulation (voir TickScheduler.handles) la fait avancer ; les autres relaient les tours enregistrés
+
+    def __init__(self, simulation_id: int, tick_rate: float):
+        self.simulation_id = simulation_id
+        self.tick_rate = tick_rate
+        self.subscribers = set()
+        self.task: Optional[asyncio.Task] = None
+        self.finished = False
+        # Trames déjà calculées pour la version courante, par version de départ du client
+        self._payloads: Dict[int, str] = {}
+        self._payloads_version = -1
+
+    def subscribe(self, slot: LatestFrameSlot):
+        self.subscribers.add(slot)
+        slot.notify()
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run())
+
+    def unsubscribe(self, slot: LatestFrameSlot):
+        self.subscribers.discard(slot)
+
+    def payload_for(self, engine, since: int) -> str:
+        if self._payloads_version != engine.version:
+            self._payloads = {}
+            self._payloads_version = engine.version
+        payload = self._payloads.get(since)
+        if payload is None:
+            delta = engine.get_delta(since)
+            if delta is None:
+                delta = engine.get_grid_state()
+                delta["type"] = "keyframe"
+            else:
+                delta["type"] = "delta"
+            delta["turns_elapsed"] = engine.turns_elapsed
+            delta["is_finished"] = engine.is_finished
+            payload = self._payloads[since] = json.dumps(delta)
+        return payload
+
+    async def _run(self):
+        while self.subscribers and not self.finished:
+            started = asyncio.get_running_loop().time()
+
+            def advance(engine):
+                if engine.is_finished:
+                    return True, False
+                return engine.step(), True
+
+            # Une simulation avancée par le planificateur, ou d'une autre tranche, n'est pas avancée ici : la
+            # diffusion relaie ses tours
+            scheduler = get_scheduler()
+            if scheduler.handles(self.simulation_id) and not scheduler.owns(self.simulation_id):
+                # Le pas (CPU + enregistrement de l'état) s'exécute hors de la boucle d'événements ;
+                # la progression est écrite en base par lots par mutate_engine
+                result = await sync_to_async(mutate_engine, thread_sensitive=False)(self.simulation_id, advance)
+                if result is None:
+                    break
+                self.finished, stepped = result
+                if not stepped:
+                    break
+
+            for slot in list(self.subscribers):
+                slot.notify()
+
+            elapsed = asyncio.get_running_loop().time() - started
+            await asyncio.sleep(max(0.0, 1.0 / self.tick_rate - elapsed))
+
+        if _broadcasters.get(self.simulation_id) is self and (self.finished or not self.subscribers):
+            del _broadcasters[self.simulation_id]
+
+
+_broadcasters: Dict[int, SimulationBroadcaster] = {}
+
+
+def get_broadcaster(simulation_id: int, tick_rate: Optional[float]) -> SimulationBroadcaster:
+    broadcaster = _broadcasters.get(simulation_id)
+    if broadcaster is None:
+        broadcaster = SimulationBroadcaster(simulation_id, tick_rate or default_tick_rate())
+        _broadcasters[simulation_id] = broadcaster
+    elif tick_rate:
+        broadcaster.tick_rate = tick_rate
+    return broadcaster
+
+
+def _frame(broadcaster: SimulationBroadcaster, simulation_id: int, since: int) -> Optional[Tuple[int, Optional[str]]]:
+    # Exécuté hors de la boucle d'événements : le verrou du moteur peut être tenu par un pas en cours et la trame
+    # (état + JSON) coûte cher. Renvoie (version, trame ou None si rien de nouveau), None si le moteur a disparu
+    # Copie locale si ce processus fait avancer la simulation, sinon relue quand le stockage a une version plus récente
+    entry = get_engine_entry(simulation_id, fresh=not get_scheduler().handles(simulation_id))
+    if entry is None:
+        return None
+    with entry.lock:
+        engine = entry.engine
+        if since == engine.version:
+            return since, None
+        return engine.version, broadcaster.payload_for(engine, since)
+
+
+async def _sender(send, broadcaster: SimulationBroadcaster, slot: LatestFrameSlot, simulation_id: int):
+    while True:
+        await slot.wait()
+        since = slot.since
+        frame = await sync_to_async(_frame, thread_sensitive=False)(broadcaster, simulation_id, since)
+        if frame is None:
+            await send({'type': 'websocket.close', 'code': 4404})
+            return
+        version, payload = frame
+        if payload is None:
+            # Rien de nouveau depuis la dernière trame envoyée
+            continue
+        if slot.since == since:
+            # Sinon une image complète a été demandée pendant le calcul : elle partira au tour suivant
+            slot.since = version
+        await send({'type': 'websocket.send', 'text': payload})
+
+
+async def websocket_application(scope, receive, send):
+    # Consommateur ASGI "nu" : /ws/simulations/<id>/?tick_rate=10&since=<version>
+    match = WEBSOCKET_PATH.match(scope['path'])
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if match is None:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    simulation_id = int(match.group('pk'))
+    if await sync_to_async(get_engine_entry)(simulation_id) is None:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    try:
+        tick_rate = float(query['tick_rate'][0]) if 'tick_rate' in query else None
+        since = int(query['since'][0]) if 'since' in query else -1
+    except ValueError:
+        await send({'type': 'websocket.close', 'code': 4400})
+        return
+    if tick_rate is not None and not 0 < tick_rate <= 1000:
+        await send({'type': 'websocket.close', 'code': 4400})
+        return
+
+    await send({'type': 'websocket.accept'})
+    broadcaster = get_broadcaster(simulation_id, tick_rate)
+    slot = LatestFrameSlot(since)
+    broadcaster.subscribe(slot)
+    sender = asyncio.ensure_future(_sender(send, broadcaster, slot, simulation_id))
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            if message['type'] == 'websocket.receive' and message.get('text'):
+                # Le client peut demander une image complète : {"keyframe": true}
+                try:
+                    request = json.loads(message['text'])
+                except ValueError:
+                    continue
+                if isinstance(request, dict) and request.get('keyframe'):
+                    slot.since = -1
+                    slot.notify()
+            if sender.done():
+                break
+    finally:
+        broadcaster.unsubscribe(slot)
+        sender.cancel()
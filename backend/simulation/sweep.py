@@ -0,0 +1,91 @@
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import Dict, Iterable, List, Tuple
+
+from .simulation_engine import SimulationEngine
+
+
+def run_simulation(config: Dict) -> Dict:
+    # Fonction de haut niveau (picklable) exécutée dans un processus du pool
+    started = time.perf_counter()
+    engine = SimulationEngine(
+        grid_size=config["grid_size"],
+        num_robots=config["num_robots"],
+        num_trash=config["num_trash"],
+        base_position=tuple(config["base_position"]),
+        storage=config.get("storage", "list"),
+        step_mode=config.get("step_mode", "sequential"),
+        vision_radius=config["vision_radius"],
+        seed=config["seed"],
+    )
+    turns = 0
+    finished = False
+    while turns < config["max_turns"]:
+        if engine.step():
+            finished = True
+            break
+        turns += 1
+    wall_time = time.perf_counter() - started
+
+    return {
+        **config,
+        "finished": finished,
+        "turns_to_clear": turns if finished else None,
+        "turns": turns,
+        "deposited_trash": engine.deposited_trash,
+        "trash_per_turn": engine.deposited_trash / turns if turns else 0.0,
+        "wall_time": wall_time,
+    }
+
+
+def build_configs(grid_size: int, num_trash: int, robots: Iterable[int], vision_radii: Iterable[int],
+                  bases: Iterable[Tuple[int, int]], runs: int, seed: int, max_turns: int,
+                  storage: str = "list", step_mode: str = "sequential") -> List[Dict]:
+    configs = []
+    for num_robots, vision_radius, base in product(robots, vision_radii, bases):
+        for run in range(runs):
+            configs.append({
+                "grid_size": grid_size,
+                "num_trash": num_trash,
+                "num_robots": num_robots,
+                "vision_radius": vision_radius,
+                "base_position": list(base),
+                "seed": seed + run,
+                "max_turns": max_turns,
+                "storage": storage,
+                "step_mode": step_mode,
+            })
+    return configs
+
+
+def run_sweep(configs: List[Dict], workers: int = None) -> List[Dict]:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # chunksize > 1 pour amortir le coût d'envoi des tâches quand les runs sont courts
+        chunksize = max(1, len(configs) // ((workers or 1) * 8))
+        return list(executor.map(run_simulation, configs, chunksize=chunksize))
+
+
+def summarize(results: List[Dict]) -> List[Dict]:
+    # Agrégats par combinaison de paramètres (toutes graines confondues)
+    groups: Dict[Tuple, List[Dict]] = {}
+    for result in results:
+        key = (result["num_robots"], result["vision_radius"], tuple(result["base_position"]))
+        groups.setdefault(key, []).append(result)
+
+    summary = []
+    for (num_robots, vision_radius, base), group in sorted(groups.items()):
+        cleared = [r["turns_to_clear"] for r in group if r["finished"]]
+        summary.append({
+            "num_robots": num_robots,
+            "vision_radius": vision_radius,
+            "base_position": list(base),
+            "runs": len(group),
+            "finished_runs": len(cleared),
+            "mean_turns_to_clear": statistics.mean(cleared) if cleared else None,
+            "median_turns_to_clear": statistics.median(cleared) if cleared else None,
+            "mean_trash_per_turn": statistics.mean(r["trash_per_turn"] for r in group),
+            "mean_wall_time": statistics.mean(r["wall_time"] for r in group),
+        })
+    return summary
@@ -0,0 +1,917 @@
+import asyncio
+import json
+import random
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from .allocation import TrashAllocator
+from .codec import (COUNT, HEADER, KIND_DELTA, KIND_KEYFRAME, decode_frame, encode_delta, encode_keyframe,
+                    run_length_encode)
+from .hierarchical import HierarchicalPathFinder
+from .engines import get_engine_entry, mutate_engine, register_engine, sign_blob, verify_blob
+from .models import Simulation, SimulationState
+from .pathfinding import PathFinder
+from .replay import INDEX_DTYPE, ReplayReader
+from .registry import EngineRegistry
+from .scheduler import TickScheduler
+from .simulation_engine import SimulationEngine
+from .state_store import (DatabaseStateStore, FileStateStore, KeyValueStateStore, LocalKeyValueClient,
+                          MemoryStateStore, StaleStateError)
+from .streaming import websocket_application
+from .world import ChunkedWorld, NumpyWorld
+
+
+def run_to_completion(engine: SimulationEngine, max_turns: int) -> SimulationEngine:
+    while not engine.step() and engine.turns_elapsed < max_turns:
+        pass
+    return engine
+
+
+class BatchModeTests(SimpleTestCase):
+    # Flotte dense : les robots vides ne doivent pas encercler la base (plus aucun dépôt possible)
+
+    def test_dense_run_with_corner_base_finishes(self):
+        engine = SimulationEngine(24, 60, 150, (0, 0), seed=1, storage="numpy", step_mode="batch")
+        run_to_completion(engine, 3000)
+        self.assertTrue(engine.is_finished)
+
+    def test_dense_run_with_central_base_finishes(self):
+        engine = SimulationEngine(24, 60, 150, (12, 12), seed=1, storage="numpy", step_mode="batch")
+        run_to_completion(engine, 3000)
+        self.assertTrue(engine.is_finished)
+        positions = set(zip(engine.fleet.xs.tolist(), engine.fleet.ys.tolist()))
+        self.assertEqual(len(positions), 60)
+
+
+class CooperativeModeTests(SimpleTestCase):
+    # Base au centre de la carte : les robots vides qui l'entourent doivent laisser passer les robots chargés
+
+    def test_run_with_central_base_finishes(self):
+        engine = SimulationEngine(64, 200, 600, (32, 32), seed=4, step_mode="cooperative")
+        run_to_completion(engine, 2000)
+        self.assertTrue(engine.is_finished)
+        positions = {(robot.x, robot.y) for robot in engine.robots}
+        self.assertEqual(len(positions), 200)
+
+
+class WorldTests(SimpleTestCase):
+    # Les écritures grid[x][y] tiennent toutes les couches à jour
+
+    def test_numpy_row_assignment_updates_layers(self):
+        world = NumpyWorld(8)
+        world[2][3] = "RT"
+        self.assertTrue(world.occupancy[2, 3] and world.trash[2, 3])
+        world[2][3] = "T"
+        self.assertFalse(world.occupancy[2, 3])
+        self.assertEqual(list(world.occupied_positions()), [])
+
+    def test_chunked_occupancy_counts_robots(self):
+        world = ChunkedWorld(300)
+        world[1][1] = "R"
+        world[200][250] = "RT"
+        world[5][5] = "T"
+        occupancy = world.occupied_positions()
+        self.assertEqual(len(occupancy), 2)
+        world[1][1] = "."
+        world[200][250] = "T"
+        self.assertEqual(len(occupancy), 0)
+        self.assertFalse(occupancy)
+        restored = ChunkedWorld(300)
+        world.set_cell(7, 7, "R")
+        restored.load_chunks(world.to_chunks())
+        self.assertEqual(len(restored.occupied_positions()), 1)
+
+
+class PathCacheTests(SimpleTestCase):
+    # Chemins calculés sur les murs seulement, repris depuis n'importe quelle case du chemin mis en cache
+
+    def test_path_is_reused_from_a_later_cell(self):
+        engine = SimulationEngine(16, 1, 1, (0, 0), seed=1)
+        path = engine.find_path((2, 2), (10, 2))
+        self.assertEqual(path[-1], (10, 2))
+        self.assertEqual(engine.find_path(path[2], (10, 2)), path[3:])
+        self.assertEqual((engine.path_cache.hits, engine.path_cache.misses), (1, 1))
+
+    def test_blocked_path_is_replanned_around_robots(self):
+        engine = SimulationEngine(16, 1, 1, (0, 0), seed=1)
+        path = engine.find_path((2, 2), (10, 2))
+        robots = {path[1]}
+        detour = engine.find_path((2, 2), (10, 2), robots)
+        self.assertEqual(detour[-1], (10, 2))
+        self.assertNotIn(path[1], detour)
+        # Le chemin sur les murs reste en cache pour les tours suivants
+        self.assertEqual(engine.find_path((2, 2), (10, 2), set()), path)
+
+
+class SnapshotTests(SimpleTestCase):
+    # Un moteur restauré depuis son snapshot rejoue exactement les mêmes tours que l'original
+
+    def assert_restored_run_matches(self, storage: str, step_mode: str):
+        engine = SimulationEngine(24, 8, 40, (3, 3), seed=7, storage=storage, step_mode=step_mode)
+        for _ in range(15):
+            engine.step()
+        restored = SimulationEngine.restore(engine.snapshot())
+        self.assertEqual(restored.get_grid_state(), engine.get_grid_state())
+        for _ in range(30):
+            engine.step()
+            restored.step()
+        self.assertEqual(restored.get_grid_state(), engine.get_grid_state())
+        self.assertEqual(restored.turns_elapsed, engine.turns_elapsed)
+
+    def test_sequential_list_storage(self):
+        self.assert_restored_run_matches("list", "sequential")
+
+    def test_chunked_storage(self):
+        self.assert_restored_run_matches("chunked", "sequential")
+
+    def test_batch_mode(self):
+        self.assert_restored_run_matches("numpy", "batch")
+
+    def test_cooperative_mode(self):
+        self.assert_restored_run_matches("list", "cooperative")
+
+    def test_same_seed_same_run(self):
+        first = run_to_completion(SimulationEngine(16, 4, 20, (0, 0), seed=11), 2000)
+        second = run_to_completion(SimulationEngine(16, 4, 20, (0, 0), seed=11), 2000)
+        self.assertEqual(first.turns_elapsed, second.turns_elapsed)
+        self.assertEqual(first.get_grid_state(), second.get_grid_state())
+
+
+class StateStoreTests(TestCase):
+    # Contrôle de version optimiste commun à tous les stockages
+
+    def setUp(self):
+        self.simulation_id = Simulation.objects.create().pk
+
+    def assert_versioning(self, store):
+        simulation_id = self.simulation_id
+        self.assertEqual(store.version(simulation_id), 0)
+        self.assertIsNone(store.load(simulation_id))
+        self.assertEqual(store.save(simulation_id, b"first", 0), 1)
+        with self.assertRaises(StaleStateError):
+            store.save(simulation_id, b"concurrent", 0)
+        self.assertEqual(store.save(simulation_id, b"second", 1), 2)
+        with self.assertRaises(StaleStateError):
+            store.save(simulation_id, b"stale", 1)
+        self.assertEqual(store.version(simulation_id), 2)
+        if store.persistent:
+            self.assertEqual(store.load(simulation_id), (2, b"second"))
+        store.delete(simulation_id)
+        self.assertEqual(store.version(simulation_id), 0)
+
+    def test_database_store(self):
+        self.assert_versioning(DatabaseStateStore())
+
+    def test_database_store_touches_updated_at(self):
+        store = DatabaseStateStore()
+        store.save(self.simulation_id, b"first", 0)
+        created = SimulationState.objects.get(pk=self.simulation_id).updated_at
+        store.save(self.simulation_id, b"second", 1)
+        self.assertGreater(SimulationState.objects.get(pk=self.simulation_id).updated_at, created)
+
+    def test_file_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assert_versioning(FileStateStore(directory))
+
+    def test_key_value_store(self):
+        self.assert_versioning(KeyValueStateStore(LocalKeyValueClient()))
+
+    def test_memory_store(self):
+        self.assert_versioning(MemoryStateStore())
+
+
+class MultiWorkerTests(TestCase):
+    # Deux workers (registres distincts) devant le même stockage partagé : chacun peut servir la simulation,
+    # et aucun tour renvoyé à un client n'est perdu
+
+    def setUp(self):
+        self.simulation = Simulation.objects.create(num_robots=6, num_trash=30, grid_size=16, seed=3)
+        store = KeyValueStateStore(LocalKeyValueClient())
+        patcher = patch("simulation.engines.get_state_store", return_value=store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.workers = [EngineRegistry(), EngineRegistry()]
+
+    def new_engine(self) -> SimulationEngine:
+        return SimulationEngine(16, 6, 30, (0, 0), seed=3)
+
+    def on(self, worker: EngineRegistry, function, *args):
+        with patch("simulation.engines.get_registry", return_value=worker):
+            return function(*args)
+
+    def step(self, worker: EngineRegistry) -> int:
+        def run_step(engine):
+            engine.step()
+            return engine.turns_elapsed
+        return self.on(worker, mutate_engine, self.simulation.pk, run_step)
+
+    def test_interleaved_workers_never_diverge(self):
+        first, second = self.workers
+        self.on(first, register_engine, self.simulation.pk, self.new_engine())
+        served = [self.step(first) for _ in range(6)]
+        # Le second worker charge l'état pendant que le premier continue d'avancer
+        self.on(second, get_engine_entry, self.simulation.pk)
+        served.append(self.step(first))
+        served += [self.step(second) for _ in range(3)]
+        served.append(self.step(first))
+        self.assertEqual(served, list(range(1, 12)))
+
+        reference = self.new_engine()
+        for _ in range(11):
+            reference.step()
+        engine = self.on(EngineRegistry(), get_engine_entry, self.simulation.pk).engine
+        self.assertEqual(engine.turns_elapsed, 11)
+        self.assertEqual(engine.get_grid_state()["grid"], reference.get_grid_state()["grid"])
+        self.assertEqual(Simulation.objects.get(pk=self.simulation.pk).turns_elapsed, 1)
+
+    def test_unsigned_snapshot_is_not_loaded(self):
+        # Blob écrit directement dans le stockage, sans signature : jamais dépicklé
+        store = KeyValueStateStore(LocalKeyValueClient())
+        store.save(self.simulation.pk, self.new_engine().snapshot(), 0)
+        with patch("simulation.engines.get_state_store", return_value=store), \
+                self.assertLogs("simulation.engines", "ERROR"):
+            self.assertIsNone(self.on(self.workers[0], get_engine_entry, self.simulation.pk))
+
+
+class ApiTestCase(TestCase):
+    # Registre et stockage propres à chaque test (le registre du processus survit aux rollbacks de la base)
+
+    def setUp(self):
+        registry, store = EngineRegistry(), KeyValueStateStore(LocalKeyValueClient())
+        for target, value in (("simulation.engines.get_registry", registry),
+                              ("simulation.views.get_registry", registry),
+                              ("simulation.engines.get_state_store", store)):
+            patcher = patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+
+    def create_simulation(self, **config) -> int:
+        config = {"grid_size": 16, "num_robots": 4, "num_trash": 10, "base_x": 0, "base_y": 0, "seed": 2, **config}
+        response = self.client.post("/api/simulations/create_simulation/", config, format="json")
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+
+class SeedApiTests(ApiTestCase):
+    # Une graine fixe rend la partie reproductible, y compris après une réinitialisation
+
+    def state(self, pk: int):
+        data = self.client.get(f"/api/simulations/{pk}/state/").json()
+        return data["grid"], data["robots"]
+
+    def test_same_seed_same_run(self):
+        first, second = self.create_simulation(seed=11), self.create_simulation(seed=11)
+        self.assertEqual(self.state(first), self.state(second))
+        self.assertNotEqual(self.state(self.create_simulation(seed=12)), self.state(first))
+        for pk in (first, second):
+            for _ in range(5):
+                self.client.post(f"/api/simulations/{pk}/step/")
+        self.assertEqual(self.state(first), self.state(second))
+
+    def test_reset_replays_initial_state(self):
+        pk = self.create_simulation(seed=11)
+        initial = self.state(pk)
+        self.client.post(f"/api/simulations/{pk}/step/")
+        self.client.post(f"/api/simulations/{pk}/reset/", {}, format="json")
+        self.assertEqual(self.state(pk), initial)
+
+
+class ViewportTests(SimpleTestCase):
+    # Fenêtres et tuiles de densité lues sur les structures du moteur, identiques à la grille complète
+
+    def engine(self, storage: str) -> SimulationEngine:
+        engine = SimulationEngine(40, 10, 120, (5, 5), seed=6, storage=storage)
+        for _ in range(5):
+            engine.step()
+        return engine
+
+    def test_window_matches_full_grid(self):
+        for storage in ("list", "numpy", "chunked"):
+            with self.subTest(storage=storage):
+                engine = self.engine(storage)
+                state = engine.get_grid_state()
+                region = engine.get_region((3, 10, 17, 31))
+                self.assertEqual(region["bbox"], [3, 10, 17, 31])
+                self.assertEqual(region["cells"], [row[10:31] for row in state["grid"][3:17]])
+                inside = [robot for robot in state["robots"] if 3 <= robot["x"] < 17 and 10 <= robot["y"] < 31]
+                self.assertEqual(sorted(robot["id"] for robot in region["robots"]),
+                                 sorted(robot["id"] for robot in inside))
+
+    def test_window_is_clipped_to_the_grid(self):
+        engine = self.engine("numpy")
+        region = engine.get_region((30, 35, 100, 100))
+        self.assertEqual(region["bbox"], [30, 35, 40, 40])
+        self.assertEqual((len(region["cells"]), len(region["cells"][0])), (10, 5))
+
+    def test_downsample_counts_per_block(self):
+        for storage in ("list", "numpy", "chunked"):
+            with self.subTest(storage=storage):
+                engine = self.engine(storage)
+                grid = engine.get_grid_state()["grid"]
+                region = engine.get_region((0, 0, 40, 40), downsample=16)
+                self.assertEqual((len(region["trash"]), len(region["trash"][0])), (3, 3))
+                expected_trash = [[0] * 3 for _ in range(3)]
+                expected_robots = [[0] * 3 for _ in range(3)]
+                for x in range(40):
+                    for y in range(40):
+                        expected_trash[x // 16][y // 16] += "T" in grid[x][y]
+                        expected_robots[x // 16][y // 16] += "R" in grid[x][y]
+                self.assertEqual(region["trash"], expected_trash)
+                self.assertEqual(region["robots"], expected_robots)
+
+
+class ViewportApiTests(ApiTestCase):
+
+    def test_region_and_density_queries(self):
+        pk = self.create_simulation(grid_size=32)
+        data = self.client.get(f"/api/simulations/{pk}/state/", {"bbox": "0,0,8,4"}).json()
+        self.assertEqual((len(data["cells"]), len(data["cells"][0])), (8, 4))
+        data = self.client.get(f"/api/simulations/{pk}/state/", {"downsample": 8}).json()
+        self.assertEqual(sum(map(sum, data["trash"])), 10)
+        self.assertEqual(sum(map(sum, data["robots"])), 4)
+
+    def test_invalid_or_oversized_window(self):
+        pk = self.create_simulation(grid_size=32)
+        for bbox in ("1,2,3", "4,4,2,8", "-1,0,4,4", "a,b,c,d"):
+            response = self.client.get(f"/api/simulations/{pk}/state/", {"bbox": bbox})
+            self.assertEqual(response.status_code, 400, bbox)
+        with override_settings(SIMULATION_MAX_VIEWPORT_CELLS=100):
+            self.assertEqual(self.client.get(f"/api/simulations/{pk}/state/", {"bbox": "0,0,20,20"}).status_code, 400)
+            self.assertEqual(self.client.get(f"/api/simulations/{pk}/state/", {"bbox": "0,0,10,10"}).status_code, 200)
+            response = self.client.get(f"/api/simulations/{pk}/state/", {"downsample": 4})
+            self.assertEqual(response.status_code, 200)
+            # État complet plus grand que la limite : refusé en JSON
+            self.assertEqual(self.client.get(f"/api/simulations/{pk}/state/").status_code, 400)
+
+
+class MetricsApiTests(ApiTestCase):
+
+    def test_profiling_toggle_and_counters(self):
+        pk = self.create_simulation()
+        self.assertFalse(self.client.get(f"/api/simulations/{pk}/metrics/").data["profiling"])
+        response = self.client.post(f"/api/simulations/{pk}/metrics/", {"enabled": True}, format="json")
+        self.assertTrue(response.data["profiling"])
+        for _ in range(3):
+            self.client.post(f"/api/simulations/{pk}/step/")
+        data = self.client.get(f"/api/simulations/{pk}/metrics/").data
+        self.assertEqual(data["turns_elapsed"], 3)
+        self.assertEqual(data["profile"]["ticks"], 3)
+        response = self.client.post(f"/api/simulations/{pk}/metrics/", {"enabled": "yes"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_reset_keeps_profiling(self):
+        pk = self.create_simulation()
+        self.client.post(f"/api/simulations/{pk}/metrics/", {"enabled": True}, format="json")
+        self.client.post(f"/api/simulations/{pk}/step/")
+        self.client.post(f"/api/simulations/{pk}/reset/", {}, format="json")
+        data = self.client.get(f"/api/simulations/{pk}/metrics/").data
+        self.assertEqual(data["turns_elapsed"], 0)
+        self.assertTrue(data["profiling"])
+
+    def test_prometheus_exposition(self):
+        first, second = self.create_simulation(), self.create_simulation()
+        self.client.post(f"/api/simulations/{first}/metrics/", {"enabled": True}, format="json")
+        self.client.post(f"/api/simulations/{first}/step/")
+
+        response = self.client.get(f"/api/simulations/{first}/metrics/prometheus/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        text = response.content.decode()
+        self.assertIn(f'walle_turns_total{{simulation="{first}"}} 1', text)
+        self.assertIn("# TYPE walle_phase_seconds histogram", text)
+
+        text = self.client.get("/api/simulations/prometheus/").content.decode()
+        self.assertIn("walle_registry_engines 2", text)
+        self.assertIn(f'walle_robots{{simulation="{second}"}} 4', text)
+        self.assertIn(f'walle_profiled_ticks_total{{simulation="{first}"}} 1', text)
+        self.assertNotIn(f'walle_profiled_ticks_total{{simulation="{second}"}}', text)
+
+
+class WebSocketTests(TransactionTestCase):
+    # Les pas et les trames s'exécutent dans des threads : la base doit voir les écritures validées
+
+    def setUp(self):
+        self.simulation = Simulation.objects.create(num_robots=4, num_trash=20, grid_size=16, seed=5)
+        self.registry, self.store = EngineRegistry(), KeyValueStateStore(LocalKeyValueClient())
+        for patcher in (patch("simulation.engines.get_registry", return_value=self.registry),
+                        patch("simulation.engines.get_state_store", return_value=self.store),
+                        patch.dict("simulation.streaming._broadcasters", clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        register_engine(self.simulation.pk, SimulationEngine(16, 4, 20, (0, 0), seed=5))
+
+    def stream(self, path: str, query: bytes = b"tick_rate=50", during=None):
+        # Messages envoyés au client pendant la connexion ; during() s'exécute connexion ouverte
+        async def session():
+            incoming, sent = asyncio.Queue(), []
+            await incoming.put({"type": "websocket.connect"})
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {"type": "websocket", "path": path, "query_string": query}
+            consumer = asyncio.ensure_future(websocket_application(scope, incoming.get, send))
+            await asyncio.sleep(0.3)
+            if during is not None:
+                during()
+                await asyncio.sleep(0.3)
+            await incoming.put({"type": "websocket.disconnect"})
+            await consumer
+            return sent
+        return asyncio.run(session())
+
+    def frames(self, sent):
+        return [json.loads(message["text"]) for message in sent if message["type"] == "websocket.send"]
+
+    def test_keyframe_then_deltas(self):
+        sent = self.stream(f"/ws/simulations/{self.simulation.pk}/")
+        self.assertEqual(sent[0]["type"], "websocket.accept")
+        frames = self.frames(sent)
+        self.assertGreater(len(frames), 2)
+        self.assertEqual(frames[0]["type"], "keyframe")
+        self.assertEqual({frame["type"] for frame in frames[1:]}, {"delta"})
+        turns = [frame["turns_elapsed"] for frame in frames]
+        self.assertEqual(turns, sorted(turns))
+        self.assertEqual(self.registry.get_entry(self.simulation.pk).engine.turns_elapsed, turns[-1])
+
+    def test_other_shard_only_relays(self):
+        # Simulation d'une autre tranche : ce processus ne la fait pas avancer mais relaie les tours enregistrés
+        # par le processus qui la possède (simulé en écrivant directement dans le stockage)
+        simulation_id = self.simulation.pk
+        scheduler = TickScheduler(shard=(simulation_id + 1) % 2, shards=2)
+
+        def owner_steps():
+            version, blob = self.store.load(simulation_id)
+            engine = SimulationEngine.restore(verify_blob(blob))
+            for _ in range(3):
+                engine.step()
+                version = self.store.save(simulation_id, sign_blob(engine.snapshot()), version)
+
+        with patch("simulation.streaming.get_scheduler", return_value=scheduler):
+            frames = self.frames(self.stream(f"/ws/simulations/{simulation_id}/", during=owner_steps))
+        self.assertEqual(frames[0]["turns_elapsed"], 0)
+        self.assertEqual(frames[-1]["turns_elapsed"], 3)
+        self.assertEqual(self.store.version(simulation_id), 4)
+
+    def test_unknown_simulation_is_closed(self):
+        sent = self.stream("/ws/simulations/999999/")
+        self.assertEqual(sent, [{"type": "websocket.close", "code": 4404}])
+
+
+class CodecTests(SimpleTestCase):
+    # Format binaire de l'état : images complètes (brutes ou RLE) et deltas relus à l'identique
+
+    def test_run_length_encode(self):
+        cells = np.array([[0, 0, 3], [3, 3, 2]], dtype=np.uint8)
+        lengths, codes = run_length_encode(cells)
+        self.assertEqual(lengths.tolist(), [2, 3, 1])
+        self.assertEqual(codes.tolist(), [0, 3, 2])
+        self.assertEqual(np.repeat(codes, lengths).reshape(2, 3).tolist(), cells.tolist())
+        lengths, codes = run_length_encode(np.zeros((0, 0), dtype=np.uint8))
+        self.assertEqual((len(lengths), len(codes)), (0, 0))
+
+    def test_keyframe_round_trip(self):
+        engine = SimulationEngine(20, 5, 30, (4, 4), seed=3, storage="numpy")
+        engine.step()
+        packed = engine.get_packed_state()
+        for rle in (True, False):
+            frame = encode_keyframe({**packed, "turns_elapsed": 1, "is_finished": False}, rle=rle)
+            decoded = decode_frame(frame)
+            self.assertEqual(decoded["kind"], KIND_KEYFRAME)
+            self.assertEqual((decoded["version"], decoded["grid_size"], decoded["turns_elapsed"]),
+                             (engine.version, 20, 1))
+            self.assertEqual(decoded["trash_remaining"], packed["trash_remaining"])
+            self.assertEqual(decoded["cells"].tolist(), packed["cells"].tolist())
+            self.assertEqual(decoded["robots"].tolist(), packed["robots"].tolist())
+        # Grille presque vide : l'image RLE est bien plus petite que l'image brute
+        sparse = SimulationEngine(64, 5, 10, (0, 0), seed=3, storage="numpy").get_packed_state()
+        self.assertLess(len(encode_keyframe(sparse)), len(encode_keyframe(sparse, rle=False)) // 4)
+        # Blocs d'entiers alignés sur 4 octets (lus en Int32Array côté client)
+        self.assertEqual(HEADER.size % 4, 0)
+
+    def test_delta_applies_to_previous_keyframe(self):
+        engine = SimulationEngine(20, 5, 30, (4, 4), seed=3, storage="numpy")
+        before = engine.get_packed_state()
+        cells = before["cells"].copy()
+        for _ in range(3):
+            engine.step()
+        decoded = decode_frame(encode_delta({**engine.get_packed_delta(before["version"]), "is_finished": True}))
+        self.assertEqual(decoded["kind"], KIND_DELTA)
+        self.assertTrue(decoded["is_finished"])
+        self.assertEqual(decoded["version"], engine.version)
+        for (x, y), code in zip(decoded["cell_positions"].tolist(), decoded["cell_codes"].tolist()):
+            cells[x, y] = code
+        self.assertEqual(cells.tolist(), engine.get_packed_state()["cells"].tolist())
+
+
+class TrashAllocatorTests(SimpleTestCase):
+    # Au plus un robot par déchet et un déchet par robot, le plus proche d'abord
+
+    def test_greedy_assignment_by_distance(self):
+        allocator = TrashAllocator()
+        assigned = allocator.assign([
+            (1, 0, 0, [(1, 0), (5, 5)]),
+            (2, 2, 0, [(1, 0), (3, 0)]),
+            (3, 9, 9, [(5, 5)]),
+        ])
+        self.assertEqual(assigned, 3)
+        # Égalité de distance sur (1, 0) : le plus petit id l'emporte, le robot 2 se rabat sur (3, 0)
+        self.assertEqual(allocator.target_of, {1: (1, 0), 2: (3, 0), 3: (5, 5)})
+        self.assertEqual(allocator.claimant_of, {(1, 0): 1, (3, 0): 2, (5, 5): 3})
+
+    def test_claimed_trash_and_busy_robots_are_skipped(self):
+        allocator = TrashAllocator()
+        allocator.claim(1, (1, 0))
+        self.assertEqual(allocator.assign([(1, 0, 0, [(2, 0)]), (2, 0, 1, [(1, 0)])]), 0)
+        self.assertEqual(len(allocator), 1)
+        self.assertIsNone(allocator.target(2))
+        # Une nouvelle réservation remplace l'ancienne
+        allocator.claim(1, (2, 0))
+        self.assertEqual(allocator.claimant_of, {(2, 0): 1})
+
+    def test_pickup_releases_claim_and_returns_watchers(self):
+        allocator = TrashAllocator()
+        allocator.observe(1, [(4, 4), (6, 6)])
+        allocator.observe(2, [(4, 4)])
+        allocator.claim(1, (4, 4))
+        self.assertEqual(allocator.release_trash((4, 4)), {1, 2})
+        self.assertIsNone(allocator.target(1))
+        self.assertEqual(len(allocator), 0)
+        self.assertEqual(allocator.release_trash((5, 5)), set())
+        allocator.release_robot(3)
+
+    def test_engine_never_shares_a_target(self):
+        engine = SimulationEngine(32, 12, 60, (16, 16), seed=9)
+        for _ in range(40):
+            engine.step()
+            targets = list(engine.allocator.target_of.values())
+            self.assertEqual(len(targets), len(set(targets)))
+            self.assertTrue(set(targets) <= set(engine.trash_positions))
+        self.assertGreater(engine.allocator.assignments, 0)
+
+
+def walled_map(size: int) -> set:
+    # Murs verticaux tous les 10 rangs, percés de deux portes décalées d'un mur à l'autre
+    walls = set()
+    for index, x in enumerate(range(5, size, 10)):
+        doors = {(index * 13) % size, (index * 13 + size // 2) % size}
+        walls.update((x, y) for y in range(size) if y not in doors)
+    return walls
+
+
+def shelf_map(size: int) -> set:
+    # Rayonnages d'entrepôt : colonnes d'étagères coupées par des allées transversales tous les 10 rangs
+    return {(x, y) for x in range(4, size - 4, 6) for y in range(3, size - 3) if y % 10 not in (0, 1)}
+
+
+class HierarchicalPathFinderTests(SimpleTestCase):
+    # HPA* : chemins valides, proches de l'optimum d'A* plat, et mis à jour quand un obstacle change
+
+    def setUp(self):
+        self.size = 64
+        self.walls = walled_map(self.size)
+        self.flat = PathFinder(self.size, self.size)
+        for x, y in self.walls:
+            self.flat.set_blocked(x, y)
+        self.hierarchy = HierarchicalPathFinder(self.flat)
+
+    def assert_valid_path(self, start, goal, path):
+        self.assertEqual(path[-1], goal)
+        previous = start
+        for cell in path:
+            self.assertEqual(abs(cell[0] - previous[0]) + abs(cell[1] - previous[1]), 1)
+            self.assertNotIn(cell, self.walls)
+            previous = cell
+
+    def free_cell(self, rng: random.Random):
+        while True:
+            cell = (rng.randrange(self.size), rng.randrange(self.size))
+            if cell not in self.walls:
+                return cell
+
+    def test_paths_close_to_flat_astar(self):
+        rng = random.Random(4)
+        for _ in range(60):
+            start, goal = self.free_cell(rng), self.free_cell(rng)
+            if start == goal:
+                continue
+            flat = self.flat.find(start, goal)
+            path = self.hierarchy.find(start, goal)
+            self.assert_valid_path(start, goal, path)
+            self.assertLessEqual(len(path), len(flat) * 1.3 + 4)
+        self.assertGreater(self.hierarchy.clusters_built, 0)
+
+    def test_enclosed_goal_is_unreachable(self):
+        goal = (30, 60)
+        for x, y in ((29, 60), (31, 60), (30, 59), (30, 61)):
+            self.flat.set_blocked(x, y)
+            self.hierarchy.invalidate(x, y)
+        self.assertIsNone(self.hierarchy.find((0, 0), goal))
+
+    def test_wall_change_invalidates_clusters(self):
+        start, goal = (0, 0), (40, 40)
+        path = self.hierarchy.find(start, goal)
+        blocked = path[len(path) // 2]
+        self.flat.set_blocked(*blocked)
+        self.hierarchy.invalidate(*blocked)
+        self.walls.add(blocked)
+        detour = self.hierarchy.find(start, goal)
+        self.assert_valid_path(start, goal, detour)
+
+    def test_field_leads_to_source(self):
+        field = self.hierarchy.field((2, 2))
+        position = (60, 50)
+        self.assertGreaterEqual(field.distance(*position), len(self.flat.find(position, (2, 2))))
+        for _ in range(field.distance(*position)):
+            dx, dy = field.next_step(*position)
+            position = (position[0] + dx, position[1] + dy)
+            self.assertNotIn(position, self.walls)
+        self.assertEqual(position, (2, 2))
+
+    def test_engine_with_walls_finishes(self):
+        walls = shelf_map(48)
+        engine = SimulationEngine(48, 6, 30, (0, 0), seed=2, walls=sorted(walls))
+        self.assertIsNotNone(engine.hierarchy)
+        run_to_completion(engine, 5000)
+        self.assertTrue(engine.is_finished)
+        for robot in engine.robots:
+            self.assertNotIn((robot.x, robot.y), walls)
+
+    def test_engine_path_follows_wall_edits(self):
+        engine = SimulationEngine(64, 1, 1, (63, 63), seed=2, walls=sorted(self.walls))
+        start, goal = (0, 0), (40, 40)
+        path = engine.find_path(start, goal)
+        blocked = next(cell for cell in path[:-1] if cell not in engine.trash_positions)
+        engine.set_walls(add=[blocked])
+        self.assertNotIn(blocked, engine.find_path(start, goal))
+
+
+class ReplayTests(SimpleTestCase):
+    # Journal en ajout seul relu par mmap : chaque tour se reconstitue depuis l'image complète la plus proche
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f"{directory.name}/1.replay"
+
+    def recorded_engine(self, turns: int, keyframe_every: int = 4) -> SimulationEngine:
+        engine = SimulationEngine(24, 5, 40, (2, 2), seed=8, storage="numpy")
+        engine.enable_recording(self.path, keyframe_every)
+        engine.flush_recording()
+        for _ in range(turns):
+            engine.step()
+            engine.flush_recording()
+        return engine
+
+    def test_state_at_every_turn(self):
+        self.recorded_engine(10)
+        reference = SimulationEngine(24, 5, 40, (2, 2), seed=8, storage="numpy")
+        with ReplayReader(self.path) as reader:
+            self.assertEqual((len(reader), reader.first_turn, reader.last_turn), (11, 0, 10))
+            for turn in range(11):
+                if turn:
+                    reference.step()
+                state, expected = reader.state_at(turn), reference.get_packed_state()
+                self.assertEqual(state["version"], expected["version"])
+                self.assertEqual(state["cells"].tolist(), expected["cells"].tolist())
+                self.assertEqual(state["robots"].tolist(), expected["robots"].tolist())
+            with self.assertRaises(KeyError):
+                reader.locate(-1)
+
+    def test_index_points_to_periodic_keyframes(self):
+        self.recorded_engine(10)
+        index = np.fromfile(self.path + ".idx", dtype=INDEX_DTYPE)
+        self.assertEqual(index["turns"].tolist(), list(range(11)))
+        self.assertEqual(index["keyframe"].tolist(), [0] * 4 + [4] * 4 + [8] * 3)
+        self.assertTrue((np.diff(index["offset"].astype(np.int64)) > 0).all())
+        with ReplayReader(self.path) as reader:
+            kinds = [decode_frame(reader.frame(record))["kind"] for record in range(len(reader))]
+        self.assertEqual([record for record, kind in enumerate(kinds) if kind == KIND_KEYFRAME], [0, 4, 8])
+
+    def test_reader_ignores_frames_written_after_opening(self):
+        engine = self.recorded_engine(3)
+        reader = ReplayReader(self.path)
+        engine.step()
+        engine.flush_recording()
+        self.assertEqual(reader.last_turn, 3)
+        self.assertEqual(reader.state_at(3)["turns_elapsed"], 3)
+        reader.close()
+        with ReplayReader(self.path) as reader:
+            self.assertEqual(reader.last_turn, 4)
+
+    def test_frames_start_with_a_keyframe(self):
+        self.recorded_engine(10)
+        with ReplayReader(self.path) as reader:
+            frames = [decode_frame(frame) for frame in reader.frames(5, 9)]
+        self.assertEqual(frames[0]["kind"], KIND_KEYFRAME)
+        self.assertEqual([frame["turns_elapsed"] for frame in frames], [5, 6, 7, 8, 9])
+
+    def test_new_recording_rewinds_the_log(self):
+        # Partie réinitialisée : un nouveau moteur repart de la version 0, les anciennes trames sortent de l'index
+        self.recorded_engine(6)
+        engine = SimulationEngine(24, 5, 40, (2, 2), seed=9, storage="numpy")
+        engine.enable_recording(self.path, 4)
+        engine.step()
+        engine.flush_recording()
+        with ReplayReader(self.path) as reader:
+            self.assertEqual((len(reader), reader.last_turn), (2, 1))
+            self.assertEqual(reader.state_at(1)["cells"].tolist(), engine.get_packed_state()["cells"].tolist())
+
+
+class ReplayApiTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SIMULATION_REPLAY={"ENABLED": True, "PATH": directory.name, "KEYFRAME_EVERY": 4})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def read_frames(self, response) -> list:
+        body = b"".join(response.streaming_content)
+        frames, offset = [], 0
+        while offset < len(body):
+            (length,) = COUNT.unpack_from(body, offset)
+            frames.append(decode_frame(body[offset + COUNT.size:offset + COUNT.size + length]))
+            offset += COUNT.size + length
+        return frames
+
+    def test_frames_endpoint(self):
+        pk = self.create_simulation()
+        for _ in range(6):
+            self.client.post(f"/api/simulations/{pk}/step/")
+        response = self.client.get(f"/api/simulations/{pk}/frames/", {"from": 2, "to": 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-walle-frames")
+        frames = self.read_frames(response)
+        self.assertEqual(frames[0]["kind"], KIND_KEYFRAME)
+        self.assertEqual([frame["turns_elapsed"] for frame in frames], [2, 3, 4])
+        self.assertEqual(len(self.read_frames(self.client.get(f"/api/simulations/{pk}/frames/"))), 7)
+        self.assertEqual(self.client.get(f"/api/simulations/{pk}/frames/", {"from": 9}).status_code, 400)
+        self.assertEqual(self.client.get(f"/api/simulations/{pk}/frames/", {"from": -1}).status_code, 400)
+
+    def test_missing_replay(self):
+        with override_settings(SIMULATION_REPLAY={"ENABLED": False}):
+            pk = self.create_simulation()
+        self.assertEqual(self.client.get(f"/api/simulations/{pk}/frames/").status_code, 404)
+        self.assertEqual(self.client.get("/api/simulations/999999/frames/").status_code, 404)
+
+
+class ScheduleApiTests(ApiTestCase):
+    # resume / pause / speed ne font que modifier la ligne Simulation lue par le planificateur
+
+    def test_resume_speed_pause(self):
+        pk = self.create_simulation()
+        data = self.client.post(f"/api/simulations/{pk}/resume/", {"tick_rate": 25}, format="json").data
+        self.assertEqual((data["scheduled"], data["tick_rate"]), (True, 25))
+        # Planificateur arrêté dans ce processus : pas de description
+        self.assertIsNone(data["scheduler"])
+        data = self.client.post(f"/api/simulations/{pk}/speed/", {"tick_rate": 5}, format="json").data
+        self.assertEqual((data["scheduled"], data["tick_rate"]), (True, 5))
+        data = self.client.post(f"/api/simulations/{pk}/pause/", {}, format="json").data
+        self.assertEqual((data["scheduled"], data["tick_rate"]), (False, 5))
+        simulation = Simulation.objects.get(pk=pk)
+        self.assertEqual((simulation.scheduled, simulation.tick_rate), (False, 5))
+
+    def test_invalid_requests(self):
+        pk = self.create_simulation()
+        self.assertEqual(self.client.post(f"/api/simulations/{pk}/speed/", {}, format="json").status_code, 400)
+        for tick_rate in (0, -1, 10 ** 6, "fast"):
+            response = self.client.post(f"/api/simulations/{pk}/resume/", {"tick_rate": tick_rate}, format="json")
+            self.assertEqual(response.status_code, 400, tick_rate)
+        self.assertFalse(Simulation.objects.get(pk=pk).scheduled)
+        self.assertEqual(self.client.post("/api/simulations/999999/resume/", {}, format="json").status_code, 404)
+
+    def test_scheduler_status(self):
+        first, second = self.create_simulation(), self.create_simulation()
+        self.client.post(f"/api/simulations/{first}/resume/", {}, format="json")
+        self.client.post(f"/api/simulations/{second}/resume/", {}, format="json")
+        self.client.post(f"/api/simulations/{second}/pause/", {}, format="json")
+        data = self.client.get("/api/simulations/scheduler/").data
+        self.assertEqual(data["scheduled_simulations"], 1)
+        self.assertFalse(data["running"])
+        self.assertEqual(data["simulations"], [])
+
+
+class TickSchedulerTests(TransactionTestCase):
+    # Planificateur démarré dans une boucle d'événements : les tours s'exécutent dans son pool de threads
+
+    def setUp(self):
+        registry, store = EngineRegistry(), KeyValueStateStore(LocalKeyValueClient())
+        for patcher in (patch("simulation.engines.get_registry", return_value=registry),
+                        patch("simulation.engines.get_state_store", return_value=store)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.registry = registry
+
+    def scheduled_simulation(self, **fields) -> Simulation:
+        fields = {"scheduled": True, **fields}
+        simulation = Simulation.objects.create(grid_size=16, num_robots=3, num_trash=200, seed=1, **fields)
+        register_engine(simulation.pk, SimulationEngine(16, 3, 200, (0, 0), seed=1))
+        return simulation
+
+    def turns(self, simulation: Simulation) -> int:
+        return self.registry.get_entry(simulation.pk).engine.turns_elapsed
+
+    def run_scheduler(self, scheduler: TickScheduler, seconds: float, during=None):
+        async def session():
+            scheduler.start()
+            await asyncio.sleep(seconds)
+            if during is not None:
+                await sync_to_async(during, thread_sensitive=False)()
+                await asyncio.sleep(seconds)
+            await scheduler.stop()
+        asyncio.run(session())
+
+    def test_runs_scheduled_simulations_at_their_rate(self):
+        fast = self.scheduled_simulation(tick_rate=100)
+        slow = self.scheduled_simulation(tick_rate=5)
+        paused = self.scheduled_simulation(tick_rate=100, scheduled=False)
+        scheduler = TickScheduler(workers=2, poll_interval=0.05)
+        described = {}
+
+        def describe():
+            described.update(scheduler.status())
+
+        self.run_scheduler(scheduler, 0.5, describe)
+        self.assertGreater(self.turns(fast), 5 * self.turns(slow))
+        self.assertGreater(self.turns(slow), 0)
+        self.assertEqual(self.turns(paused), 0)
+        self.assertTrue(described["running"])
+        self.assertEqual({entry["simulation"] for entry in described["simulations"]}, {fast.pk, slow.pk})
+        self.assertFalse(scheduler.is_running)
+
+    def test_pause_stops_ticks(self):
+        simulation = self.scheduled_simulation(tick_rate=100)
+        scheduler = TickScheduler(poll_interval=0.05)
+        turns = []
+
+        def pause():
+            Simulation.objects.filter(pk=simulation.pk).update(scheduled=False)
+            scheduler.request_sync(simulation.pk)
+            turns.append(self.turns(simulation))
+
+        self.run_scheduler(scheduler, 0.3, pause)
+        self.assertGreater(turns[0], 0)
+        # Au plus le tour en cours au moment de la pause
+        self.assertLessEqual(self.turns(simulation), turns[0] + 1)
+
+    def test_shard_only_runs_its_simulations(self):
+        simulations = [self.scheduled_simulation(tick_rate=100) for _ in range(2)]
+        scheduler = TickScheduler(poll_interval=0.05, shard=simulations[0].pk % 2, shards=2)
+        self.run_scheduler(scheduler, 0.3)
+        self.assertGreater(self.turns(simulations[0]), 0)
+        self.assertEqual(self.turns(simulations[1]), 0)
+
+
+class ConditionalStateTests(ApiTestCase):
+    # ETag par version d'état (et par format) : un client à jour reçoit 304 sans corps
+
+    def state(self, pk: int, **headers):
+        return self.client.get(f"/api/simulations/{pk}/state/", **headers)
+
+    def test_not_modified_until_next_step(self):
+        pk = self.create_simulation()
+        response = self.state(pk)
+        etag = response["ETag"]
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn("Accept", response["Vary"])
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        cached = self.state(pk, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b"")
+        self.assertEqual(cached["ETag"], etag)
+        # Même version : le rendu mis en cache est resservi à l'identique
+        self.assertEqual(self.state(pk).content, response.content)
+
+        self.client.post(f"/api/simulations/{pk}/step/")
+        response = self.state(pk, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_formats_have_distinct_etags(self):
+        pk = self.create_simulation()
+        json_etag = self.state(pk)["ETag"]
+        response = self.state(pk, HTTP_ACCEPT="application/x-walle-state", HTTP_IF_NONE_MATCH=json_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-walle-state")
+        self.assertNotEqual(response["ETag"], json_etag)
+        self.assertEqual(decode_frame(response.content)["kind"], KIND_KEYFRAME)
+        cached = self.state(pk, HTTP_ACCEPT="application/x-walle-state", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_reset_changes_etag_at_same_version(self):
+        # Après une réinitialisation, la version repart de zéro : l'ancien ETag ne doit plus correspondre
+        pk = self.create_simulation()
+        etag = self.state(pk)["ETag"]
+        self.client.post(f"/api/simulations/{pk}/reset/", {}, format="json")
+        self.assertEqual(self.state(pk, HTTP_IF_NONE_MATCH=etag).status_code, 200)
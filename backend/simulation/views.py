@@ -2,23 +2,174 @@
 
 # Create your views here.
 
+import time
+from functools import partial
+from typing import Optional
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from .models import Simulation
-from .serializers import SimulationSerializer, SimulationConfigSerializer, GridStateSerializer
+from .serializers import (SimulationSerializer, SimulationConfigSerializer, GridStateSerializer, AdvanceSerializer,
+                          ObstacleEditSerializer, ScheduleSerializer, ViewportSerializer)
+from .codec import COUNT, encode_delta, encode_keyframe
+from .engines import forget_engine, get_engine_entry, mutate_engine, register_engine, replay_path
+from .obstacle_maps import parse_obstacle_map
+from .profiling import engine_sample, prometheus_text
+from .registry import get_registry
+from .renderers import PrometheusTextRenderer
+from .replay import ReplayReader
+from .scheduler import get_scheduler
 from .simulation_engine import SimulationEngine
 
-# Etat du jeu actuel
-global_engine = None
+NO_SIMULATION_ERROR = {"error": "Aucune simulation n'est en cours"}
+NO_REPLAY_ERROR = {"error": "Aucun enregistrement pour cette simulation"}
+# Grandes grilles : pas d'image complète en JSON
+STATE_HINT = "demander une fenêtre (bbox, downsample), un delta (since) ou le format binaire"
+RESYNC_ERROR = {"error": "Version trop ancienne pour un delta et grille trop grande pour une image complète : "
+                         "recharger l'état par fenêtres (state?bbox=...) ou au format binaire"}
+# Suite de trames application/x-walle-state, chacune précédée de sa longueur (uint32)
+FRAMES_MEDIA_TYPE = 'application/x-walle-frames'
+
+
+def engine_id(pk) -> int:
+    # Les actions du moteur n'interrogent pas la table Simulation sur le chemin nominal
+    if not str(pk).isdigit():
+        raise Http404
+    return int(pk)
+
+
+def missing_engine_response(pk: int) -> Response:
+    # Chemin rare : distingue une simulation inexistante (404) d'un moteur absent (400)
+    if not Simulation.objects.filter(pk=pk).exists():
+        raise Http404
+    return Response(NO_SIMULATION_ERROR, status=status.HTTP_400_BAD_REQUEST)
+
+
+def parse_since(request):
+    # Version connue du client (?since=N), None si le client veut la réponse complète historique
+    since = request.query_params.get('since')
+    if since is None and hasattr(request.data, 'get'):
+        since = request.data.get('since')
+    if since is None or since == '':
+        return None
+    return int(since)
+
+
+def parse_turn(request, name: str):
+    value = request.query_params.get(name)
+    if value is None or value == '':
+        return None
+    turn = int(value)
+    if turn < 0:
+        raise ValueError(value)
+    return turn
+
+
+def stream_frames(reader: ReplayReader, first_turn: int, last_turn: int):
+    # Le journal reste projeté en mémoire le temps du flux, puis est fermé (fin ou déconnexion du client)
+    try:
+        for frame in reader.frames(first_turn, last_turn):
+            yield COUNT.pack(len(frame)) + frame
+    finally:
+        reader.close()
+
+
+def max_response_cells() -> int:
+    return getattr(settings, 'SIMULATION_MAX_VIEWPORT_CELLS', 1 << 20)
+
+
+def oversized_grid_response(grid_size: int, hint: str) -> Optional[Response]:
+    # Les réponses JSON d'une valeur par case (état complet, couverture, distances) sont bornées comme les
+    # fenêtres de state : au-delà de SIMULATION_MAX_VIEWPORT_CELLS, le client passe par une fenêtre ou un delta
+    cells = grid_size * grid_size
+    limit = max_response_cells()
+    if cells <= limit:
+        return None
+    return Response({"error": f"Grille trop grande ({cells} cases, maximum {limit}) : {hint}"},
+                    status=status.HTTP_400_BAD_REQUEST)
+
+
+def wants_keyframe(request) -> bool:
+    return request.query_params.get('keyframe') in ('1', 'true')
+
+
+def wants_binary(request) -> bool:
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is not None and renderer.format == 'bin'
+
+
+def binary_payload(engine, since, force_keyframe: bool, **extra) -> bytes:
+    # Encodage compact directement depuis les tableaux du moteur (pas de grille de chaînes)
+    if since is not None and not force_keyframe:
+        delta = engine.get_packed_delta(since)
+        if delta is not None:
+            return encode_delta({**delta, **extra})
+    return encode_keyframe({**engine.get_packed_state(), **extra})
+
+
+def delta_payload(engine, since: int, force_keyframe: bool) -> Optional[dict]:
+    # Delta si la version du client est encore dans l'historique, image complète sinon (None si la grille est
+    # trop grande pour une image complète en JSON)
+    delta = None if force_keyframe else engine.get_delta(since)
+    if delta is not None:
+        delta["type"] = "delta"
+        return delta
+    if engine.grid_size * engine.grid_size > max_response_cells():
+        return None
+    grid_state = engine.get_grid_state()
+    grid_state["type"] = "keyframe"
+    return grid_state
+
+
+def with_validators(response, engine, renderer_format: str):
+    # L'état d'une version ne change plus : le client revalide à chaque fois (no-cache) et reçoit un 304 tant
+    # que la version n'a pas bougé. Les formats (JSON, binaire) d'une même URL ont des ETag distincts
+    response['ETag'] = f'"{engine.etag}-{renderer_format}"'
+    response['Last-Modified'] = http_date(engine.modified_at)
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def build_engine(simulation: Simulation, profile: bool = False) -> SimulationEngine:
+    # profile : instrumentation forcée même sans SIMULATION_PROFILING (réinitialisation d'un moteur instrumenté)
+    storage = getattr(settings, 'SIMULATION_STORAGE', 'list')
+    step_mode = getattr(settings, 'SIMULATION_STEP_MODE', 'sequential')
+    if simulation.grid_size >= getattr(settings, 'SIMULATION_CHUNKED_FROM', 256):
+        # Grande grille : monde par blocs creux (le mode batch travaille sur des couches denses)
+        storage = 'chunked'
+        if step_mode == 'batch':
+            step_mode = 'sequential'
+    engine = SimulationEngine(
+        grid_size=simulation.grid_size,
+        num_robots=simulation.num_robots,
+        num_trash=simulation.num_trash,
+        base_position=(simulation.base_x, simulation.base_y),
+        storage=storage,
+        step_mode=step_mode,
+        seed=simulation.seed,
+        profile=profile or getattr(settings, 'SIMULATION_PROFILING', False),
+        walls=parse_obstacle_map(simulation.obstacle_map) if simulation.obstacle_map else ()
+    )
+    path = replay_path(simulation.pk)
+    if path is not None:
+        engine.enable_recording(path, getattr(settings, 'SIMULATION_REPLAY', {}).get('KEYFRAME_EVERY', 128))
+    return engine
 
 class SimulationViewSet(viewsets.ModelViewSet):
 
     queryset = Simulation.objects.all()
     serializer_class = SimulationSerializer
 
-    # Variable pour stocker l'instance du moteur de simulation
-    simulation_engine = None
+    def perform_destroy(self, instance):
+        forget_engine(instance.pk)
+        instance.delete()
+        get_scheduler().request_sync()
 
     @action(detail=False, methods=['post'])
     def create_simulation(self, request):
@@ -26,78 +177,390 @@ class SimulationViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             # Créer une nouvelle simulation dans la base de données
             simulation = Simulation.objects.create(
+                grid_size=serializer.validated_data['grid_size'],
                 num_robots=serializer.validated_data['num_robots'],
                 num_trash=serializer.validated_data['num_trash'],
                 base_x=serializer.validated_data['base_x'],
-                base_y=serializer.validated_data['base_y']
-            )
-            global global_engine
-            # Initialiser le moteur de simulation
-            global_engine = SimulationEngine(
-                grid_size=simulation.grid_size,
-                num_robots=simulation.num_robots,
-                num_trash=simulation.num_trash,
-                base_position=(simulation.base_x, simulation.base_y)
+                base_y=serializer.validated_data['base_y'],
+                seed=serializer.validated_data.get('seed'),
+                obstacle_map=serializer.validated_data.get('obstacle_map', '')
             )
+            # Initialiser le moteur de simulation (registre du processus + stockage partagé)
+            register_engine(simulation.pk, build_engine(simulation))
 
             return Response(SimulationSerializer(simulation).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=False, methods=['post'])
-    def step(self, request):
-        global global_engine
-        if not global_engine:
-            return Response({"error": "Aucune simulation n'est en cours"}, status=status.HTTP_400_BAD_REQUEST)
-        # Exécuter un tour de simulation
-        is_finished = global_engine.step()
-
-        # Mettre à jour la simulation en base de données
-        simulation = Simulation.objects.latest('created_at')
-        simulation.turns_elapsed += 1
-        simulation.is_running = not is_finished
-        simulation.is_finished = is_finished
-        simulation.save()
-
-        # Retourner l'état actuel de la grille
-        grid_state = global_engine.get_grid_state()
+    @action(detail=True, methods=['post'])
+    def step(self, request, pk=None):
+        try:
+            since = parse_since(request)
+        except ValueError:
+            return Response({"error": "Paramètre since invalide"}, status=status.HTTP_400_BAD_REQUEST)
+        pk = engine_id(pk)
+        binary = wants_binary(request)
+        keyframe = wants_keyframe(request)
+        if not binary and (since is None or keyframe):
+            # Vérifié avant le pas : la réponse serait une image complète
+            entry = get_engine_entry(pk, fresh=False)
+            if entry is None:
+                return missing_engine_response(pk)
+            oversized = oversized_grid_response(entry.engine.grid_size, STATE_HINT)
+            if oversized is not None:
+                return oversized
+
+        def run_step(engine):
+            # Exécuter un tour de simulation (rejoué si un autre processus a avancé entre-temps).
+            # Le moteur tient le compteur de tours, écrit en base par lots (voir engines.mutate_engine)
+            is_finished = engine.step()
+            if binary:
+                return binary_payload(engine, since, keyframe,
+                                      turns_elapsed=engine.turns_elapsed, is_finished=is_finished)
+            if since is not None:
+                # Seules les cases et robots modifiés depuis la version du client sont renvoyés
+                data = delta_payload(engine, since, keyframe)
+                if data is None:
+                    return RESYNC_ERROR
+                data["turns_elapsed"] = engine.turns_elapsed
+                data["is_finished"] = is_finished
+                return data
+            # Retourner l'état actuel de la grille
+            return self._grid_state_data(engine.get_grid_state(), engine.turns_elapsed, is_finished)
+
+        data = mutate_engine(pk, run_step)
+        if data is None:
+            return missing_engine_response(pk)
+        if data is RESYNC_ERROR:
+            # Le tour a bien été joué, mais le client doit se resynchroniser
+            return Response(RESYNC_ERROR, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data, status=status.HTTP_200_OK)
+
+    def _grid_state_data(self, grid_state, turns_elapsed, is_finished):
         serializer = GridStateSerializer(data={
             "grid": grid_state["grid"],
             "robots": grid_state["robots"],
             "trash_remaining": grid_state["trash_remaining"],
-            "turns_elapsed": simulation.turns_elapsed,
-            "is_finished": is_finished
+            "turns_elapsed": turns_elapsed,
+            "is_finished": is_finished,
+            "version": grid_state["version"]
         })
         serializer.is_valid()  # On suppose que les données sont valides
+        return serializer.data
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    @action(detail=True, methods=['post'])
+    def advance(self, request, pk=None):
+        # Avance de N tours (ou jusqu'à la fin / l'épuisement du budget de temps) en une seule requête
+        params = AdvanceSerializer(data=request.data)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+        options = params.validated_data
 
+        pk = engine_id(pk)
+        entry = get_engine_entry(pk, fresh=False)
+        if entry is None:
+            return missing_engine_response(pk)
+        # La réponse contient l'image complète (et les trames échantillonnées) : vérifié avant d'avancer
+        oversized = oversized_grid_response(entry.engine.grid_size, "avancer avec step (since), état par fenêtres")
+        if oversized is not None:
+            return oversized
+        max_steps = None if options['until_finished'] else options['steps']
+        sample_every = options.get('sample_every')
+
+        def run_steps(engine):
+            deadline = None
+            if 'time_budget_ms' in options:
+                deadline = time.perf_counter() + options['time_budget_ms'] / 1000
+            frames = []
+            steps_run = 0
+            is_finished = engine.is_finished
+            while max_steps is None or steps_run < max_steps:
+                is_finished = engine.step()
+                steps_run += 1
+                if is_finished:
+                    break
+                if sample_every and steps_run % sample_every == 0 and len(frames) < options['max_frames']:
+                    frame = engine.get_grid_state()
+                    frame["turns_elapsed"] = engine.turns_elapsed
+                    frames.append(frame)
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+            return steps_run, is_finished, frames, engine.get_grid_state(), engine.turns_elapsed
+
+        result = mutate_engine(pk, run_steps)
+        if result is None:
+            return missing_engine_response(pk)
+        steps_run, is_finished, frames, grid_state, turns_elapsed = result
+
+        data = dict(self._grid_state_data(grid_state, turns_elapsed, is_finished))
+        data["steps_run"] = steps_run
+        if sample_every:
+            data["frames"] = frames
+        return Response(data, status=status.HTTP_200_OK)
+
+
+    @action(detail=True, methods=['get'])
+    def state(self, request, pk=None):
+        try:
+            since = parse_since(request)
+        except ValueError:
+            return Response({"error": "Paramètre since invalide"}, status=status.HTTP_400_BAD_REQUEST)
+        viewport = None
+        if 'bbox' in request.query_params or 'downsample' in request.query_params:
+            params = ViewportSerializer(data=request.query_params)
+            if not params.is_valid():
+                return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+            viewport = params.validated_data
+        pk = engine_id(pk)
+        entry = get_engine_entry(pk)
+        if entry is None:
+            return missing_engine_response(pk)
+        renderer_format = request.accepted_renderer.format
+        with entry.lock:
+            engine = entry.engine
+            # If-None-Match seul : Last-Modified est à la seconde près, plusieurs tours tiennent dans une seconde
+            not_modified = get_conditional_response(request, etag=f'"{engine.etag}-{renderer_format}"')
+            if not_modified is not None:
+                return with_validators(not_modified, engine, renderer_format)
+            if viewport is not None:
+                response = self._region_response(engine, viewport)
+            elif wants_binary(request):
+                keyframe = since is None or wants_keyframe(request)
+                render = partial(binary_payload, engine, since, keyframe, turns_elapsed=engine.turns_elapsed,
+                                 is_finished=engine.is_finished)
+                # Image complète partagée entre clients ; les deltas dépendent de la version de chacun
+                response = Response(engine.rendered('bin', render) if keyframe else render())
+            elif since is not None:
+                data = delta_payload(engine, since, wants_keyframe(request))
+                if data is None:
+                    return Response(RESYNC_ERROR, status=status.HTTP_400_BAD_REQUEST)
+                response = Response(data)
+            else:
+                response = oversized_grid_response(engine.grid_size, STATE_HINT) or \
+                    self._grid_state_response(engine, request.accepted_renderer)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            return with_validators(response, engine, renderer_format)
+
+    def _grid_state_response(self, engine, renderer):
+        # État complet en JSON : rendu une fois par version, puis resservi à tous les clients qui interrogent
+        if renderer.format != 'json':
+            return Response(engine.get_grid_state())
+        body = engine.rendered('json', lambda: renderer.render(engine.get_grid_state(), renderer.media_type,
+                                                              self.get_renderer_context()))
+        return HttpResponse(body, content_type=renderer.media_type)
+
+    def _region_response(self, engine, viewport):
+        # Fenêtre ou tuile de densité ; la taille de la réponse est bornée (SIMULATION_MAX_VIEWPORT_CELLS)
+        bbox = viewport.get('bbox', (0, 0, engine.grid_size, engine.grid_size))
+        downsample = viewport['downsample']
+        x0, y0, x1, y1 = engine.clip_box(bbox)
+        cells = -(-max(0, x1 - x0) // downsample) * -(-max(0, y1 - y0) // downsample)
+        limit = max_response_cells()
+        if cells > limit:
+            return Response({"error": f"Fenêtre trop grande ({cells} cases, maximum {limit}) : "
+                                      f"réduire bbox ou augmenter downsample"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(engine.get_region(bbox, downsample))
+
+    @action(detail=True, methods=['get'])
+    def frames(self, request, pk=None):
+        # Relecture d'une partie enregistrée (SIMULATION_REPLAY), sans charger le moteur : trames des tours from
+        # à to inclus (par défaut tout le journal), la première étant l'image complète du tour from
+        try:
+            first_turn = parse_turn(request, 'from')
+            last_turn = parse_turn(request, 'to')
+        except ValueError:
+            return Response({"error": "Paramètres from / to invalides"}, status=status.HTTP_400_BAD_REQUEST)
+        pk = engine_id(pk)
+        path = replay_path(pk)
+        try:
+            reader = ReplayReader(path) if path is not None else None
+        except (OSError, ValueError):
+            reader = None
+        if reader is None or not len(reader):
+            if reader is not None:
+                reader.close()
+            if not Simulation.objects.filter(pk=pk).exists():
+                raise Http404
+            return Response(NO_REPLAY_ERROR, status=status.HTTP_404_NOT_FOUND)
+
+        if first_turn is None:
+            first_turn = reader.first_turn
+        last_turn = reader.last_turn if last_turn is None else min(last_turn, reader.last_turn)
+        if not reader.first_turn <= first_turn <= last_turn:
+            error = {"error": f"Tours enregistrés : {reader.first_turn} à {reader.last_turn}"}
+            reader.close()
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        return StreamingHttpResponse(stream_frames(reader, first_turn, last_turn), content_type=FRAMES_MEDIA_TYPE)
+
+    @action(detail=True, methods=['post'])
+    def obstacles(self, request, pk=None):
+        # Ajout / retrait d'obstacles en cours de simulation ({"add": [[x, y], ...], "remove": [...]}).
+        # La carte d'origine (obstacle_map) est rechargée par reset
+        params = ObstacleEditSerializer(data=request.data)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+        add = [tuple(position) for position in params.validated_data['add']]
+        remove = [tuple(position) for position in params.validated_data['remove']]
+        pk = engine_id(pk)
+        data = mutate_engine(pk, lambda engine: engine.set_walls(add, remove))
+        if data is None:
+            return missing_engine_response(pk)
+        return Response(data)
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        # Avance en tâche de fond par le planificateur ({"tick_rate": N} optionnel, tours par seconde)
+        return self._schedule(request, scheduled=True)
+
+    @action(detail=True, methods=['post'])
+    def pause(self, request, pk=None):
+        return self._schedule(request, scheduled=False)
+
+    @action(detail=True, methods=['post'])
+    def speed(self, request, pk=None):
+        # Nouvelle fréquence cible ({"tick_rate": N}), sans changer l'état pause / en cours
+        return self._schedule(request, scheduled=None, rate_required=True)
+
+    def _schedule(self, request, scheduled, rate_required=False):
+        params = ScheduleSerializer(data=request.data)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
+        tick_rate = params.validated_data.get('tick_rate')
+        if rate_required and tick_rate is None:
+            return Response({"tick_rate": ["Ce champ est obligatoire."]}, status=status.HTTP_400_BAD_REQUEST)
+        simulation = self.get_object()
+        fields = []
+        if scheduled is not None:
+            simulation.scheduled = scheduled
+            fields.append('scheduled')
+        if tick_rate is not None:
+            simulation.tick_rate = tick_rate
+            fields.append('tick_rate')
+        simulation.save(update_fields=[*fields, 'updated_at'])
+        # Le planificateur de ce processus relit la base tout de suite (les processus dédiés au prochain passage)
+        scheduler = get_scheduler()
+        scheduler.request_sync(simulation.pk)
+        return Response({
+            "id": simulation.pk,
+            "scheduled": simulation.scheduled,
+            "tick_rate": simulation.tick_rate,
+            "turns_elapsed": simulation.turns_elapsed,
+            "is_finished": simulation.is_finished,
+            "scheduler": scheduler.describe(simulation.pk),
+        })
 
     @action(detail=False, methods=['get'])
-    def state(self, request):
-        global global_engine
-        if not global_engine:
-            return Response({"error": "Aucune simulation n'est en cours"}, status=status.HTTP_400_BAD_REQUEST)
-        return Response(global_engine.get_grid_state())
+    def scheduler(self, request):
+        # État du planificateur de ce processus : fréquences cibles et mesurées, temps CPU par simulation
+        data = get_scheduler().status()
+        data["scheduled_simulations"] = Simulation.objects.filter(scheduled=True, is_finished=False).count()
+        return Response(data)
 
-    @action(detail=False, methods=['post'])
-    def reset(self, request):
-        serializer = SimulationConfigSerializer(data=request.data)
+    @action(detail=True, methods=['get'])
+    def distance_field(self, request, pk=None):
+        # Champ de distances à la base (débogage) : -1 pour les cases inaccessibles
+        pk = engine_id(pk)
+        entry = get_engine_entry(pk)
+        if entry is None:
+            return missing_engine_response(pk)
+        oversized = oversized_grid_response(entry.engine.grid_size, "champ de distances non disponible")
+        if oversized is not None:
+            return oversized
+        with entry.lock:
+            return Response({"base": entry.engine.base_position, "distances": entry.engine.get_distance_field()})
+
+    @action(detail=True, methods=['get'])
+    def coverage(self, request, pk=None):
+        # Couverture de la flotte : cases déjà visitées (1) ou non (0), ligne par ligne
+        pk = engine_id(pk)
+        entry = get_engine_entry(pk)
+        if entry is None:
+            return missing_engine_response(pk)
+        oversized = oversized_grid_response(entry.engine.grid_size, "couverture par case non disponible")
+        if oversized is not None:
+            return oversized
+        with entry.lock:
+            data = entry.engine.get_coverage()
+            data["explored"] = entry.engine.get_explored().astype(int).tolist()
+            return Response(data)
+
+    @action(detail=True, methods=['get', 'post'])
+    def metrics(self, request, pk=None):
+        # GET : compteurs du moteur et, si l'instrumentation est active, temps par phase.
+        # POST {"enabled": true|false} : active ou coupe l'instrumentation de cette simulation
+        pk = engine_id(pk)
+        if request.method == 'POST':
+            enabled = request.data.get('enabled', True)
+            if not isinstance(enabled, bool):
+                return Response({"enabled": ["Booléen attendu"]}, status=status.HTTP_400_BAD_REQUEST)
+
+            def toggle(engine):
+                engine.enable_profiling(enabled)
+                return enabled
+
+            if mutate_engine(pk, toggle) is None:
+                return missing_engine_response(pk)
+        entry = get_engine_entry(pk)
+        if entry is None:
+            return missing_engine_response(pk)
+        with entry.lock:
+            engine = entry.engine
+            return Response({
+                "turns_elapsed": engine.turns_elapsed,
+                "version": engine.version,
+                "astar_expansions": engine.pathfinder.expansions,
+                "path_cache": {"hits": engine.path_cache.hits, "misses": engine.path_cache.misses},
+                "trash_assignments": engine.allocator.assignments,
+                "coverage": engine.get_coverage(),
+                "profiling": engine.profiler is not None,
+                "profile": engine.profiler.to_dict() if engine.profiler is not None else None,
+            })
+
+    @action(detail=True, methods=['get'], url_path='metrics/prometheus', renderer_classes=[PrometheusTextRenderer])
+    def metrics_prometheus(self, request, pk=None):
+        pk = engine_id(pk)
+        entry = get_engine_entry(pk)
+        if entry is None:
+            return missing_engine_response(pk)
+        with entry.lock:
+            sample = engine_sample(entry.engine)
+        return Response(prometheus_text([({"simulation": str(pk)}, sample)]))
+
+    @action(detail=False, methods=['get'], renderer_classes=[PrometheusTextRenderer])
+    def prometheus(self, request):
+        # Point de collecte Prometheus : tous les moteurs chargés dans ce processus
+        registry = get_registry()
+        entries = registry.items()
+        gauges = [("walle_registry_engines", "Moteurs chargés dans ce processus", len(entries)),
+                  ("walle_registry_memory_bytes", "Mémoire estimée des moteurs chargés", registry.memory_used)]
+        samples = []
+        for simulation_id, entry in entries:
+            with entry.lock:
+                samples.append(({"simulation": str(simulation_id)}, engine_sample(entry.engine)))
+        return Response(prometheus_text(samples, gauges))
+
+    @action(detail=True, methods=['post'])
+    def reset(self, request, pk=None):
+        simulation = self.get_object()
+        # Les champs absents gardent la configuration actuelle de la simulation
+        serializer = SimulationConfigSerializer(simulation, data=request.data, partial=True)
         if serializer.is_valid():
-            # Créer une nouvelle simulation
-            simulation = Simulation.objects.create(
-                num_robots=serializer.validated_data['num_robots'],
-                num_trash=serializer.validated_data['num_trash'],
-                base_x=serializer.validated_data['base_x'],
-                base_y=serializer.validated_data['base_y']
-            )
+            for field, value in serializer.validated_data.items():
+                setattr(simulation, field, value)
+            simulation.turns_elapsed = 0
+            simulation.is_running = False
+            simulation.is_finished = False
+            # Une simulation réinitialisée repart en pause
+            simulation.scheduled = False
+            simulation.save(update_fields=[*serializer.validated_data, 'turns_elapsed', 'is_running',
+                                           'is_finished', 'scheduled', 'updated_at'])
 
-            # Réinitialiser le moteur de simulation
-            self.simulation_engine = SimulationEngine(
-                grid_size=simulation.grid_size,
-                num_robots=simulation.num_robots,
-                num_trash=simulation.num_trash,
-                base_position=(simulation.base_x, simulation.base_y)
-            )
+            # Réinitialiser le moteur de simulation (l'instrumentation activée par POST metrics/ est conservée)
+            current = get_engine_entry(simulation.pk)
+            profile = current is not None and current.engine.profiler is not None
+            register_engine(simulation.pk, build_engine(simulation, profile))
+            get_scheduler().request_sync(simulation.pk)
 
             return Response(SimulationSerializer(simulation).data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,420 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Codes des types de cases (couche uint8)
+EMPTY = 0
+BASE = 1
+ROBOT = 2
+TRASH = 3
+ROBOT_TRASH = 4
+# Obstacle statique (mur, zone interdite)
+OBSTACLE = 5
+
+CELL_NAMES = (".", "B", "R", "T", "RT", "#")
+CELL_CODES = {name: code for code, name in enumerate(CELL_NAMES)}
+
+# Côté d'un bloc des mondes creux (64 x 64 cases)
+CHUNK_SIZE = 64
+
+# Au-delà de cette taille de grille, les ensembles de cases sont découpés en blocs (bitset dense trop coûteux)
+SPARSE_FROM = 256
+
+
+class _RowView:
+    # Accès grid[x][y] compatible avec la grille de chaînes, sans copie de la ligne. L'écriture passe par
+    # set_cell pour garder les couches (occupation, déchets, murs) cohérentes avec les codes
+    __slots__ = ("_world", "_x")
+
+    def __init__(self, world: "NumpyWorld", x: int):
+        self._world = world
+        self._x = x
+
+    def __len__(self) -> int:
+        return self._world.grid_size
+
+    def __getitem__(self, y: int) -> str:
+        return CELL_NAMES[self._world.cells[self._x, y]]
+
+    def __setitem__(self, y: int, value: str):
+        self._world.set_cell(self._x, y, value)
+
+
+class NumpyWorld:
+    def __init__(self, grid_size: int):
+        self.grid_size = grid_size
+        # Type de chaque case (".", "B", "R", "T", "RT" encodés sur un octet)
+        self.cells = np.zeros((grid_size, grid_size), dtype=np.uint8)
+        # Cases occupées par un robot
+        self.occupancy = np.zeros((grid_size, grid_size), dtype=np.bool_)
+        # Cases contenant un déchet
+        self.trash = np.zeros((grid_size, grid_size), dtype=np.bool_)
+        # Obstacles statiques
+        self.walls = np.zeros((grid_size, grid_size), dtype=np.bool_)
+
+    def __len__(self) -> int:
+        return self.grid_size
+
+    def __getitem__(self, x: int) -> _RowView:
+        return _RowView(self, x)
+
+    def set_cell(self, x: int, y: int, value: str):
+        code = CELL_CODES[value]
+        self.cells[x, y] = code
+        self.occupancy[x, y] = code == ROBOT or code == ROBOT_TRASH
+        self.trash[x, y] = code == TRASH or code == ROBOT_TRASH
+        self.walls[x, y] = code == OBSTACLE
+
+    def occupied_positions(self) -> "OccupancyView":
+        return OccupancyView(self.occupancy)
+
+    def to_strings(self) -> List[List[str]]:
+        # La grille de chaînes n'est construite que lorsque l'API la demande
+        lookup = np.array(CELL_NAMES, dtype=object)
+        return lookup[self.cells].tolist()
+
+
+class OccupancyView:
+    # Ensemble de positions de robots adossé à la couche d'occupation (pas de set de tuples)
+    __slots__ = ("_occupancy",)
+
+    def __init__(self, occupancy: np.ndarray):
+        self._occupancy = occupancy
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+        x, y = position
+        size_x, size_y = self._occupancy.shape
+        return 0 <= x < size_x and 0 <= y < size_y and bool(self._occupancy[x, y])
+
+    def add(self, position: Tuple[int, int]):
+        self._occupancy[position] = True
+
+    def remove(self, position: Tuple[int, int]):
+        self._occupancy[position] = False
+
+    def __iter__(self):
+        xs, ys = np.nonzero(self._occupancy)
+        return iter(zip(xs.tolist(), ys.tolist()))
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._occupancy))
+
+
+class BlockedView:
+    # Cases interdites pendant un tour : positions des robots (tenues à jour par add/remove) et obstacles statiques
+    __slots__ = ("robots", "walls")
+
+    def __init__(self, robots, walls):
+        self.robots = robots
+        self.walls = walls
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+        return position in self.walls or position in self.robots
+
+    def add(self, position: Tuple[int, int]):
+        self.robots.add(position)
+
+    def remove(self, position: Tuple[int, int]):
+        self.robots.remove(position)
+
+    def __iter__(self):
+        return iter(self.robots)
+
+    def __len__(self) -> int:
+        return len(self.robots)
+
+
+class CellBitset:
+    # Ensemble de cases d'une grille carrée sur un bit par case (taille fixe : grid_size² / 8 octets)
+    __slots__ = ("grid_size", "_bits", "_count")
+
+    def __init__(self, grid_size: int, data: bytes = b""):
+        self.grid_size = grid_size
+        self._bits = bytearray((grid_size * grid_size + 7) // 8)
+        self._count = 0
+        if data:
+            self._bits[:] = data
+            self._count = sum(bin(byte).count("1") for byte in self._bits)
+
+    def _index(self, position: Tuple[int, int]) -> int:
+        x, y = position
+        return x * self.grid_size + y
+
+    def add(self, position: Tuple[int, int]):
+        index = self._index(position)
+        mask = 1 << (index & 7)
+        if not self._bits[index >> 3] & mask:
+            self._bits[index >> 3] |= mask
+            self._count += 1
+
+    def discard(self, position: Tuple[int, int]):
+        index = self._index(position)
+        mask = 1 << (index & 7)
+        if self._bits[index >> 3] & mask:
+            self._bits[index >> 3] &= ~mask
+            self._count -= 1
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+        x, y = position
+        if not (0 <= x < self.grid_size and 0 <= y < self.grid_size):
+            return False
+        index = x * self.grid_size + y
+        return bool(self._bits[index >> 3] & (1 << (index & 7)))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        flat = np.flatnonzero(self.to_array().reshape(-1))
+        return iter(zip((flat // self.grid_size).tolist(), (flat % self.grid_size).tolist()))
+
+    def to_array(self) -> np.ndarray:
+        bits = np.unpackbits(np.frombuffer(bytes(self._bits), dtype=np.uint8), bitorder="little")
+        return bits[:self.grid_size * self.grid_size].astype(np.bool_).reshape(self.grid_size, self.grid_size)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+
+class ChunkedBitset:
+    # Ensemble de cases découpé en blocs de CHUNK_SIZE² bits alloués à la demande : seules les régions
+    # touchées coûtent de la mémoire. Indexable par (x, y) pour servir aussi de couche de couverture
+    __slots__ = ("grid_size", "chunk_size", "_chunks", "_count")
+
+    def __init__(self, grid_size: int, chunk_size: int = CHUNK_SIZE):
+        self.grid_size = grid_size
+        self.chunk_size = chunk_size
+        self._chunks: Dict[Tuple[int, int], bytearray] = {}
+        self._count = 0
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.grid_size, self.grid_size
+
+    def _locate(self, position: Tuple[int, int]):
+        x, y = position
+        size = self.chunk_size
+        index = (x % size) * size + y % size
+        return (x // size, y // size), index >> 3, 1 << (index & 7)
+
+    def add(self, position: Tuple[int, int]):
+        key, offset, mask = self._locate(position)
+        bits = self._chunks.get(key)
+        if bits is None:
+            bits = self._chunks[key] = bytearray(self.chunk_size * self.chunk_size // 8)
+        if not bits[offset] & mask:
+            bits[offset] |= mask
+            self._count += 1
+
+    def discard(self, position: Tuple[int, int]):
+        key, offset, mask = self._locate(position)
+        bits = self._chunks.get(key)
+        if bits is not None and bits[offset] & mask:
+            bits[offset] &= ~mask
+            self._count -= 1
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+        x, y = position
+        if not (0 <= x < self.grid_size and 0 <= y < self.grid_size):
+            return False
+        key, offset, mask = self._locate(position)
+        bits = self._chunks.get(key)
+        return bits is not None and bool(bits[offset] & mask)
+
+    def __getitem__(self, position: Tuple[int, int]) -> bool:
+        return position in self
+
+    def __setitem__(self, position: Tuple[int, int], value: bool):
+        if value:
+            self.add(position)
+        else:
+            self.discard(position)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        size = self.chunk_size
+        for (chunk_x, chunk_y), bits in self._chunks.items():
+            flat = np.flatnonzero(np.unpackbits(np.frombuffer(bytes(bits), dtype=np.uint8), bitorder="little"))
+            for index in flat.tolist():
+                yield chunk_x * size + index // size, chunk_y * size + index % size
+
+    def to_array(self) -> np.ndarray:
+        size = self.chunk_size
+        dense = np.zeros((self.grid_size, self.grid_size), dtype=np.bool_)
+        for (chunk_x, chunk_y), bits in self._chunks.items():
+            block = dense[chunk_x * size:(chunk_x + 1) * size, chunk_y * size:(chunk_y + 1) * size]
+            unpacked = np.unpackbits(np.frombuffer(bytes(bits), dtype=np.uint8), bitorder="little")
+            block[:] = unpacked.astype(np.bool_).reshape(size, size)[:block.shape[0], :block.shape[1]]
+        return dense
+
+    def window(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        # Sous-rectangle [x0, x1) × [y0, y1) en tableau dense ; seuls les blocs qui le recouvrent sont lus
+        size = self.chunk_size
+        dense = np.zeros((x1 - x0, y1 - y0), dtype=np.bool_)
+        for chunk_x in range(x0 // size, (x1 - 1) // size + 1):
+            for chunk_y in range(y0 // size, (y1 - 1) // size + 1):
+                bits = self._chunks.get((chunk_x, chunk_y))
+                if bits is None:
+                    continue
+                unpacked = np.unpackbits(np.frombuffer(bytes(bits), dtype=np.uint8), bitorder="little")
+                block = unpacked.astype(np.bool_).reshape(size, size)
+                left, top = chunk_x * size, chunk_y * size
+                ax, ay = max(x0, left), max(y0, top)
+                bx, by = min(x1, left + size), min(y1, top + size)
+                dense[ax - x0:bx - x0, ay - y0:by - y0] = block[ax - left:bx - left, ay - top:by - top]
+        return dense
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(bits) + 100 for bits in self._chunks.values())
+
+
+def new_cell_set(grid_size: int):
+    # Bitset dense pour les grilles courantes, par blocs pour les très grandes
+    if grid_size >= SPARSE_FROM:
+        return ChunkedBitset(grid_size)
+    return CellBitset(grid_size)
+
+
+class _ChunkedRowView:
+    __slots__ = ("_world", "_x")
+
+    def __init__(self, world: "ChunkedWorld", x: int):
+        self._world = world
+        self._x = x
+
+    def __len__(self) -> int:
+        return self._world.grid_size
+
+    def __getitem__(self, y: int) -> str:
+        return CELL_NAMES[self._world.code(self._x, y)]
+
+    def __setitem__(self, y: int, value: str):
+        self._world.set_cell(self._x, y, value)
+
+
+class ChunkedWorld:
+    # Monde creux : codes de cases par blocs de CHUNK_SIZE² octets, créés quand une case non vide y apparaît
+    # et libérés quand le bloc redevient vide. Seuls les blocs actifs (base, robots, déchets) existent ;
+    # occupation et déchets se lisent directement sur les codes
+    def __init__(self, grid_size: int, chunk_size: int = CHUNK_SIZE):
+        self.grid_size = grid_size
+        self.chunk_size = chunk_size
+        self.chunks: Dict[Tuple[int, int], bytearray] = {}
+        # Cases non vides par bloc (un bloc à zéro est supprimé)
+        self._filled: Dict[Tuple[int, int], int] = {}
+        # Cases occupées par un robot (taille de ChunkedOccupancy sans parcourir les blocs)
+        self.robot_count = 0
+
+    def __len__(self) -> int:
+        return self.grid_size
+
+    def __getitem__(self, x: int) -> _ChunkedRowView:
+        return _ChunkedRowView(self, x)
+
+    def code(self, x: int, y: int) -> int:
+        size = self.chunk_size
+        chunk = self.chunks.get((x // size, y // size))
+        if chunk is None:
+            return EMPTY
+        return chunk[(x % size) * size + y % size]
+
+    def set_cell(self, x: int, y: int, value: str):
+        code = CELL_CODES[value]
+        size = self.chunk_size
+        key = (x // size, y // size)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if code == EMPTY:
+                return
+            chunk = self.chunks[key] = bytearray(size * size)
+            self._filled[key] = 0
+        index = (x % size) * size + y % size
+        previous = chunk[index]
+        chunk[index] = code
+        self._filled[key] += (code != EMPTY) - (previous != EMPTY)
+        self.robot_count += (code == ROBOT or code == ROBOT_TRASH) - (previous == ROBOT or previous == ROBOT_TRASH)
+        if not self._filled[key]:
+            del self.chunks[key]
+            del self._filled[key]
+
+    def occupied_positions(self) -> "ChunkedOccupancy":
+        return ChunkedOccupancy(self)
+
+    @property
+    def active_chunks(self) -> int:
+        return len(self.chunks)
+
+    def to_chunks(self) -> Dict[Tuple[int, int], bytes]:
+        return {key: bytes(chunk) for key, chunk in self.chunks.items()}
+
+    def load_chunks(self, chunks: Dict[Tuple[int, int], bytes]):
+        self.chunks = {key: bytearray(chunk) for key, chunk in chunks.items()}
+        self._filled = {key: len(chunk) - chunk.count(0) for key, chunk in self.chunks.items()}
+        self.robot_count = sum(chunk.count(ROBOT) + chunk.count(ROBOT_TRASH) for chunk in self.chunks.values())
+
+    def to_dense(self) -> np.ndarray:
+        # Couche uint8 complète (état binaire, vues d'ensemble) : construite seulement à la demande
+        return self.window(0, 0, self.grid_size, self.grid_size)
+
+    def window(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        # Codes de la fenêtre [x0, x1) x [y0, y1), recopiés depuis les seuls blocs qui la recouvrent
+        size = self.chunk_size
+        codes = np.zeros((max(0, x1 - x0), max(0, y1 - y0)), dtype=np.uint8)
+        if not codes.size:
+            return codes
+        for chunk_x in range(x0 // size, (x1 - 1) // size + 1):
+            for chunk_y in range(y0 // size, (y1 - 1) // size + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if chunk is None:
+                    continue
+                block = np.frombuffer(bytes(chunk), dtype=np.uint8).reshape(size, size)
+                left, top = chunk_x * size, chunk_y * size
+                from_x, to_x = max(x0, left), min(x1, left + size)
+                from_y, to_y = max(y0, top), min(y1, top + size)
+                codes[from_x - x0:to_x - x0, from_y - y0:to_y - y0] = \
+                    block[from_x - left:to_x - left, from_y - top:to_y - top]
+        return codes
+
+    def to_strings(self) -> List[List[str]]:
+        lookup = np.array(CELL_NAMES, dtype=object)
+        return lookup[self.to_dense()].tolist()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(chunk) + 100 for chunk in self.chunks.values())
+
+
+class ChunkedOccupancy:
+    # Positions des robots lues sur les codes du monde par blocs : add/remove n'ont rien à tenir à jour
+    __slots__ = ("_world",)
+
+    def __init__(self, world: ChunkedWorld):
+        self._world = world
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+        x, y = position
+        size = self._world.grid_size
+        return 0 <= x < size and 0 <= y < size and self._world.code(x, y) in (ROBOT, ROBOT_TRASH)
+
+    def add(self, position: Tuple[int, int]):
+        pass
+
+    def remove(self, position: Tuple[int, int]):
+        pass
+
+    def __iter__(self):
+        size = self._world.chunk_size
+        for (chunk_x, chunk_y), chunk in self._world.chunks.items():
+            for index, code in enumerate(chunk):
+                if code == ROBOT or code == ROBOT_TRASH:
+                    yield chunk_x * size + index // size, chunk_y * size + index % size
+
+    def __len__(self) -> int:
+        return self._world.robot_count
@@ -5,7 +5,7 @@ import Grid from '@/components/Grid';
 import ConfigForm from '@/components/ConfigForm';
 import SimulationControls from '@/components/SimulationControls';
 import SimulationStats from '@/components/SimulationStats';
-import API, { GridState, SimulationConfig } from '@/lib/api';
+import API, { GridState, SimulationConfig, applyGridUpdate } from '@/lib/api';
 
 export default function Home() {
   // États pour gérer la simulation
@@ -13,6 +13,7 @@ export default function Home() {
   const [isRunning, setIsRunning] = useState(false);
   const [autoRunInterval, setAutoRunInterval] = useState<NodeJS.Timeout | null>(null);
   const [totalTrash, setTotalTrash] = useState(0);
+  const [simulationId, setSimulationId] = useState<number | null>(null);
 
   // Référence pour stocker la configuration actuelle
   const currentConfigRef = useRef<SimulationConfig>({
@@ -32,11 +33,12 @@ export default function Home() {
       setTotalTrash(config.num_trash);
       // console.log("test 3");
       // Créer une nouvelle simulation
-      await API.createSimulation(config);
+      const simulation = await API.createSimulation(config);
+      setSimulationId(simulation.id);
       // console.log("test 4");
 
       // Obtenir l'état initial de la grille
-      const initialState = await API.getGridState();
+      const initialState = await API.getGridState(simulation.id);
       // console.log("test 5");
       setGridState(initialState);
       // console.log("test 6");
@@ -55,10 +57,10 @@ export default function Home() {
 
   // Avancer d'un pas dans la simulation  
   const stepSimulation = async () => {
-    if (!gridState || gridState.is_finished) return;
+    if (!gridState || gridState.is_finished || simulationId === null) return;
 
     try {
-      const newState = await API.stepSimulation();
+      const newState = await API.stepSimulation(simulationId);
       setGridState(newState);
     } catch (error) {
       console.error('Erreur lors de l\'avancement de la simulation:', error);
@@ -67,12 +69,16 @@ export default function Home() {
 
   // Démarrer l'exécution automatique
   const startAutoRun = () => {
-    if (autoRunInterval || !gridState || gridState.is_finished) return;
+    if (autoRunInterval || !gridState || gridState.is_finished || simulationId === null) return;
 
     setIsRunning(true);
+    // État local mis à jour par deltas pendant l'auto-run
+    let localState: GridState = gridState;
     const interval = setInterval(async () => {
       try {
-        const newState = await API.stepSimulation();
+        const update = await API.stepSimulationDelta(simulationId, localState.version ?? -1);
+        const newState = applyGridUpdate(localState, update);
+        localState = newState;
         setGridState(newState);
 
         // Arrêter l'auto-run si la simulation est terminée
@@ -8,6 +8,7 @@ interface ConfigFormProps {
 
 const ConfigForm: React.FC<ConfigFormProps> = ({ onSubmit, isRunning }) => {
   const [config, setConfig] = useState<SimulationConfig>({
+    grid_size: 32,
     num_robots: 4,
     num_trash: 20,
     base_x: 0,
@@ -31,6 +32,22 @@ const ConfigForm: React.FC<ConfigFormProps> = ({ onSubmit, isRunning }) => {
     <form onSubmit={handleSubmit} className="p-4 bg-white rounded shadow">
       <h2 className="mb-4 text-xl font-bold text-gray-500">Configuration de la simulation</h2>
 
+      <div className="mb-4">
+        <label className="block mb-2 text-sm font-medium text-gray-500">
+          Taille de la grille:
+          <input
+            type="number"
+            name="grid_size"
+            min="2"
+            max="4096"
+            value={config.grid_size}
+            onChange={handleChange}
+            className="w-full p-2 mt-1 border rounded"
+            disabled={isRunning}
+          />
+        </label>
+      </div>
+
       <div className="mb-4">
         <label className="block mb-2 text-sm font-medium text-gray-500">
           Nombre de robots:
@@ -38,7 +55,7 @@ const ConfigForm: React.FC<ConfigFormProps> = ({ onSubmit, isRunning }) => {
             type="number"
             name="num_robots"
             min="1"
-            max="20"
+            max="1000"
             value={config.num_robots}
             onChange={handleChange}
             className="w-full p-2 mt-1 border rounded"
@@ -54,7 +71,6 @@ const ConfigForm: React.FC<ConfigFormProps> = ({ onSubmit, isRunning }) => {
             type="number"
             name="num_trash"
             min="1"
-            max="400"
             value={config.num_trash}
             onChange={handleChange}
             className="w-full p-2 mt-1 border rounded"
@@ -70,7 +86,7 @@ const ConfigForm: React.FC<ConfigFormProps> = ({ onSubmit, isRunning }) => {
             type="number"
             name="base_x"
             min="0"
-            max="31"
+            max={(config.grid_size || 32) - 1}
             value={config.base_x}
             onChange={handleChange}
             className="w-full p-2 mt-1 border rounded"
@@ -84,7 +100,7 @@ const ConfigForm: React.FC<ConfigFormProps> = ({ onSubmit, isRunning }) => {
             type="number"
             name="base_y"
             min="0"
-            max="31"
+            max={(config.grid_size || 32) - 1}
             value={config.base_y}
             onChange={handleChange}
             className="w-full p-2 mt-1 border rounded"
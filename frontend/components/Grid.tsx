@@ -23,6 +23,7 @@ const Grid: React.FC<GridProps> = ({ grid, robots }) => {
       // case 'R': return 'bg-blue-500'; // Robot
       case 'T': return 'bg-yellow-500'; // Déchet
       case 'B': return 'bg-green-500'; // Base
+      case '#': return 'bg-gray-700'; // Obstacle
       // case 'RT': return 'bg-orange-500'; // Robot qui prend un déchet
       default: return 'bg-gray-200'; // Cellule vide
     }
@@ -6,12 +6,31 @@ const API = axios.create({
   baseURL: 'http://localhost:8000/api'
 });
 
+const WS_BASE_URL = 'ws://localhost:8000/ws';
+
 // Types pour les données de l'API
 export interface SimulationConfig {
+  grid_size?: number;
   num_robots: number;
   num_trash: number;
   base_x: number;
   base_y: number;
+  seed?: number | null;
+  obstacle_map?: string;
+}
+
+export interface GridRegion {
+  version: number;
+  bbox: [number, number, number, number];
+  trash_remaining: number;
+  turns_elapsed: number;
+  // Fenêtre brute
+  cells?: string[][];
+  // Robots de la fenêtre (brute) ou nombre de robots par bloc (downsample > 1)
+  robots: Robot[] | number[][];
+  // Nombre de déchets par bloc (downsample > 1)
+  downsample?: number;
+  trash?: number[][];
 }
 
 export interface Robot {
@@ -27,6 +46,151 @@ export interface GridState {
   trash_remaining: number;
   turns_elapsed: number;
   is_finished: boolean;
+  version?: number;
+}
+
+// Réponse incrémentale : seules les cases et robots modifiés depuis `since`
+export interface GridDelta {
+  type: 'delta';
+  version: number;
+  since: number;
+  cells: [number, number, string][];
+  robots: Robot[];
+  trash_remaining: number;
+  turns_elapsed?: number;
+  is_finished?: boolean;
+}
+
+export type GridUpdate = GridDelta | (GridState & { type: 'keyframe' });
+
+// Applique une mise à jour (delta ou image complète) à l'état local
+export const applyGridUpdate = (state: GridState | null, update: GridUpdate): GridState => {
+  if (update.type === 'keyframe' || !state) {
+    return update as GridState;
+  }
+  const grid = state.grid.map(row => row.slice());
+  update.cells.forEach(([x, y, value]) => {
+    grid[x][y] = value;
+  });
+  const robots = state.robots.slice();
+  update.robots.forEach(robot => {
+    robots[robot.id] = robot;
+  });
+  return {
+    grid,
+    robots,
+    trash_remaining: update.trash_remaining,
+    turns_elapsed: update.turns_elapsed ?? state.turns_elapsed,
+    is_finished: update.is_finished ?? state.is_finished,
+    version: update.version,
+  };
+};
+
+// Décodage du format binaire compact (application/x-walle-state)
+const CELL_NAMES = ['.', 'B', 'R', 'T', 'RT', '#'];
+const HEADER_SIZE = 24;
+const KIND_KEYFRAME = 0;
+const KIND_DELTA = 1;
+const FLAG_FINISHED = 1;
+const FLAG_RLE = 2;
+
+export const decodeBinaryState = (buffer: ArrayBuffer): GridUpdate => {
+  const view = new DataView(buffer);
+  const kind = view.getUint8(5);
+  const flags = view.getUint16(6, true);
+  const version = view.getUint32(8, true);
+  const gridSize = view.getUint32(12, true);
+  const trashRemaining = view.getInt32(16, true);
+  const turnsElapsed = view.getInt32(20, true);
+  let offset = HEADER_SIZE;
+
+  if (kind !== KIND_KEYFRAME && kind !== KIND_DELTA) {
+    throw new Error(new TextDecoder().decode(new Uint8Array(buffer, offset)));
+  }
+
+  const robotCount = view.getUint32(offset, true);
+  offset += 4;
+  const robotData = new Int32Array(buffer, offset, robotCount * 4);
+  offset += robotCount * 16;
+  const robots: Robot[] = [];
+  for (let i = 0; i < robotCount; i++) {
+    robots.push({
+      id: robotData[i * 4],
+      x: robotData[i * 4 + 1],
+      y: robotData[i * 4 + 2],
+      carrying_trash: robotData[i * 4 + 3] !== 0,
+    });
+  }
+  const common = {
+    version,
+    robots,
+    trash_remaining: trashRemaining,
+    turns_elapsed: turnsElapsed >= 0 ? turnsElapsed : 0,
+    is_finished: (flags & FLAG_FINISHED) !== 0,
+  };
+
+  if (kind === KIND_DELTA) {
+    const cellCount = view.getUint32(offset, true);
+    offset += 4;
+    const positions = new Int32Array(buffer, offset, cellCount * 2);
+    const codes = new Uint8Array(buffer, offset + cellCount * 8, cellCount);
+    const cells: [number, number, string][] = [];
+    for (let i = 0; i < cellCount; i++) {
+      cells.push([positions[i * 2], positions[i * 2 + 1], CELL_NAMES[codes[i]]]);
+    }
+    return { type: 'delta', since: -1, cells, ...common };
+  }
+
+  const flat = new Uint8Array(gridSize * gridSize);
+  if (flags & FLAG_RLE) {
+    const runCount = view.getUint32(offset, true);
+    offset += 4;
+    const lengths = new Uint32Array(buffer, offset, runCount);
+    const codes = new Uint8Array(buffer, offset + runCount * 4, runCount);
+    let position = 0;
+    for (let i = 0; i < runCount; i++) {
+      flat.fill(codes[i], position, position + lengths[i]);
+      position += lengths[i];
+    }
+  } else {
+    flat.set(new Uint8Array(buffer, offset, gridSize * gridSize));
+  }
+  const grid: string[][] = [];
+  for (let x = 0; x < gridSize; x++) {
+    const row: string[] = [];
+    for (let y = 0; y < gridSize; y++) {
+      row.push(CELL_NAMES[flat[x * gridSize + y]]);
+    }
+    grid.push(row);
+  }
+  return { type: 'keyframe', grid, ...common };
+};
+
+// Découpe une suite de trames préfixées par leur longueur (application/x-walle-frames)
+export const decodeBinaryFrames = (buffer: ArrayBuffer): GridUpdate[] => {
+  const view = new DataView(buffer);
+  const updates: GridUpdate[] = [];
+  let offset = 0;
+  while (offset + 4 <= buffer.byteLength) {
+    const length = view.getUint32(offset, true);
+    offset += 4;
+    updates.push(decodeBinaryState(buffer.slice(offset, offset + length)));
+    offset += length;
+  }
+  return updates;
+};
+
+export interface AdvanceOptions {
+  steps?: number;
+  until_finished?: boolean;
+  time_budget_ms?: number;
+  sample_every?: number;
+  max_frames?: number;
+}
+
+export interface AdvanceResult extends GridState {
+  steps_run: number;
+  frames?: GridState[];
 }
 
 export interface Simulation {
@@ -36,13 +200,33 @@ export interface Simulation {
   grid_size: number;
   base_x: number;
   base_y: number;
+  seed: number | null;
   turns_elapsed: number;
+  scheduled: boolean;
+  tick_rate: number;
   is_running: boolean;
   is_finished: boolean;
   created_at: string;
   updated_at: string;
 }
 
+// Simulation avancée en tâche de fond par le planificateur du serveur
+export interface ScheduleState {
+  id: number;
+  scheduled: boolean;
+  tick_rate: number;
+  turns_elapsed: number;
+  is_finished: boolean;
+  scheduler: {
+    simulation: number;
+    state: 'waiting' | 'ready' | 'running';
+    tick_rate: number;
+    achieved_rate: number | null;
+    ticks: number;
+    cpu_seconds: number;
+  } | null;
+}
+
 // Service API
 export default {
   // Créer une nouvelle simulation
@@ -52,22 +236,93 @@ export default {
   },
 
   // Avancer d'un pas dans la simulation
-  stepSimulation: async (): Promise<GridState> => {
-    const response = await API.post('/simulations/step/');
+  stepSimulation: async (simulationId: number): Promise<GridState> => {
+    const response = await API.post(`/simulations/${simulationId}/step/`);
+    return response.data;
+  },
+
+  // Avancer d'un pas en ne recevant que les changements depuis la version connue
+  stepSimulationDelta: async (simulationId: number, since: number): Promise<GridUpdate> => {
+    const response = await API.post(`/simulations/${simulationId}/step/`, null, { params: { since } });
+    return response.data;
+  },
+
+  // S'abonner aux trames diffusées par le serveur (WebSocket) ; retourne la fonction de désabonnement
+  subscribeSimulation: (simulationId: number, onUpdate: (update: GridUpdate) => void, tickRate?: number): (() => void) => {
+    const query = tickRate ? `?tick_rate=${tickRate}` : '';
+    const socket = new WebSocket(`${WS_BASE_URL}/simulations/${simulationId}/${query}`);
+    socket.onmessage = (event) => onUpdate(JSON.parse(event.data));
+    return () => socket.close();
+  },
+
+  // Avancer de plusieurs pas côté serveur en une seule requête
+  advanceSimulation: async (simulationId: number, options: AdvanceOptions): Promise<AdvanceResult> => {
+    const response = await API.post(`/simulations/${simulationId}/advance/`, options);
     return response.data;
   },
 
+  // Obtenir l'état actuel au format binaire compact
+  getGridStateBinary: async (simulationId: number, since?: number): Promise<GridUpdate> => {
+    const response = await API.get(`/simulations/${simulationId}/state/`, {
+      params: since !== undefined ? { since } : {},
+      headers: { Accept: 'application/x-walle-state' },
+      responseType: 'arraybuffer',
+    });
+    return decodeBinaryState(response.data);
+  },
+
+  // Relire une partie enregistrée : image complète du tour `from` puis une mise à jour par version jusqu'à `to`
+  getReplayFrames: async (simulationId: number, from?: number, to?: number): Promise<GridUpdate[]> => {
+    const response = await API.get(`/simulations/${simulationId}/frames/`, {
+      params: { ...(from !== undefined && { from }), ...(to !== undefined && { to }) },
+      responseType: 'arraybuffer',
+    });
+    return decodeBinaryFrames(response.data);
+  },
+
   // Obtenir l'état actuel de la grille
-  getGridState: async (): Promise<GridState> => {
-    const response = await API.get('/simulations/state/');
+  // Fenêtre [x0, x1) x [y0, y1) de la grille, ou tuiles de densité si downsample > 1
+  getGridRegion: async (simulationId: number, bbox: [number, number, number, number],
+                        downsample = 1): Promise<GridRegion> => {
+    const response = await API.get(`/simulations/${simulationId}/state/`, {
+      params: { bbox: bbox.join(','), downsample },
+    });
+    return response.data;
+  },
+
+  // Ajouter / retirer des obstacles statiques ([x, y]) en cours de simulation
+  editObstacles: async (simulationId: number, add: [number, number][],
+                        remove: [number, number][] = []): Promise<{ added: number; removed: number; walls: number; version: number }> => {
+    const response = await API.post(`/simulations/${simulationId}/obstacles/`, { add, remove });
+    return response.data;
+  },
+
+  getGridState: async (simulationId: number): Promise<GridState> => {
+    const response = await API.get(`/simulations/${simulationId}/state/`);
     // console.log('Response', response);
     return response.data;
   },
-  /*
+
+  // Faire avancer la simulation en tâche de fond côté serveur (tours par seconde)
+  resumeSimulation: async (simulationId: number, tickRate?: number): Promise<ScheduleState> => {
+    const response = await API.post(`/simulations/${simulationId}/resume/`,
+      tickRate !== undefined ? { tick_rate: tickRate } : {});
+    return response.data;
+  },
+
+  pauseSimulation: async (simulationId: number): Promise<ScheduleState> => {
+    const response = await API.post(`/simulations/${simulationId}/pause/`);
+    return response.data;
+  },
+
+  setSimulationSpeed: async (simulationId: number, tickRate: number): Promise<ScheduleState> => {
+    const response = await API.post(`/simulations/${simulationId}/speed/`, { tick_rate: tickRate });
+    return response.data;
+  },
+
   // Réinitialiser la simulation
-  resetSimulation: async (config: SimulationConfig): Promise<Simulation> => {
-    const response = await API.post('/simulations/reset/', config);
+  resetSimulation: async (simulationId: number, config: SimulationConfig): Promise<Simulation> => {
+    const response = await API.post(`/simulations/${simulationId}/reset/`, config);
     return response.data;
   }
-   */
 };